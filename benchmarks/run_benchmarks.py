@@ -0,0 +1,787 @@
+#!/usr/bin/python
+#
+# Copyright 2016 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Benchmarks the library's hot paths against a local ReplayServer.
+
+Each benchmark is run at every scale given, on synthetic data, and its results
+are written as one JSON object per line, preceded by a line describing the
+environment. For example:
+
+  python benchmarks/run_benchmarks.py --scales 100,1000 --output results.jsonl
+
+On Unix, each measurement is taken in a process forked for it, and includes the
+growth of that process' peak memory. The ReplayServer runs in a process of its
+own, so that the forked processes never inherit its threads.
+
+The get_service, soap_round_trip and batch_job benchmarks call a minimal
+CampaignService, whose WSDL and responses are synthesized by the benchmark. To
+benchmark them with the WSDLs of the AdWords API, record those, and the
+responses to the benchmarks' calls, once:
+
+  python benchmarks/run_benchmarks.py --fixture_dir fixtures \\
+      --record_from https://adwords.google.com --googleads_yaml googleads.yaml
+
+and replay them in later runs with the same --fixture_dir. Benchmarks making
+requests with no recorded response are reported as skipped. Report downloads
+and batch job uploads are synthesized by the ReplayServer, and PQL result sets
+by the benchmark.
+"""
+
+
+import argparse
+import gc
+import json
+import multiprocessing.managers
+import os
+import platform
+import re
+import sys
+import tempfile
+import time
+import traceback
+import urlparse
+
+try:
+  import resource
+except ImportError:
+  # resource is only available on Unix; peak memory isn't reported without it.
+  resource = None
+
+import suds.cache
+import suds.sudsobject
+
+import googleads.adwords
+import googleads.common
+import googleads.dfp
+import googleads.oauth2
+import googleads.replay
+
+
+ADWORDS_VERSION = sorted(googleads.adwords._SERVICE_MAP.keys())[-1]
+DFP_VERSION = sorted(googleads.dfp._SERVICE_MAP.keys())[-1]
+
+# The benchmarks run by default, in order.
+BENCHMARKS = ('pack_for_suds', 'pql_conversion', 'report_download',
+              'get_service', 'soap_round_trip', 'batch_job')
+# The path the report definition schema is served from.
+REPORT_SCHEMA_PATH = '/api/adwords/reportdownload/%s/reportDefinition.xsd'
+# A minimal report definition schema. AWQL report downloads don't use it, but
+# ReportDownloaders load it when they are created.
+REPORT_SCHEMA = """<?xml version="1.0" encoding="UTF-8"?>
+<schema xmlns="http://www.w3.org/2001/XMLSchema"
+    xmlns:tns="https://adwords.google.com/api/adwords/cm/%(version)s"
+    targetNamespace="https://adwords.google.com/api/adwords/cm/%(version)s"
+    elementFormDefault="qualified">
+  <element name="reportDefinition" type="tns:ReportDefinition"/>
+  <complexType name="ReportDefinition">
+    <sequence>
+      <element name="reportName" type="string" minOccurs="0"/>
+    </sequence>
+  </complexType>
+</schema>
+"""
+# The path the CampaignService WSDL is served from.
+CAMPAIGN_SERVICE_WSDL_PATH = '/api/adwords/cm/%s/CampaignService?wsdl'
+# A minimal CampaignService WSDL, holding the fields used by the benchmarks. It
+# is served when no WSDL was recorded, so that the benchmarks calling the
+# service can run without recording first.
+CAMPAIGN_SERVICE_WSDL = """<?xml version="1.0" encoding="UTF-8"?>
+<wsdl:definitions xmlns:wsdl="http://schemas.xmlsoap.org/wsdl/"
+    xmlns:soap="http://schemas.xmlsoap.org/wsdl/soap/"
+    xmlns:xsd="http://www.w3.org/2001/XMLSchema"
+    xmlns:tns="https://adwords.google.com/api/adwords/cm/%(version)s"
+    targetNamespace="https://adwords.google.com/api/adwords/cm/%(version)s">
+  <wsdl:types>
+    <xsd:schema elementFormDefault="qualified"
+        targetNamespace="https://adwords.google.com/api/adwords/cm/%(version)s">
+      <xsd:complexType name="SoapHeader">
+        <xsd:sequence>
+          <xsd:element name="clientCustomerId" type="xsd:string"
+              minOccurs="0"/>
+          <xsd:element name="developerToken" type="xsd:string" minOccurs="0"/>
+          <xsd:element name="userAgent" type="xsd:string" minOccurs="0"/>
+          <xsd:element name="validateOnly" type="xsd:boolean" minOccurs="0"/>
+          <xsd:element name="partialFailure" type="xsd:boolean"
+              minOccurs="0"/>
+        </xsd:sequence>
+      </xsd:complexType>
+      <xsd:complexType name="Paging">
+        <xsd:sequence>
+          <xsd:element name="startIndex" type="xsd:int" minOccurs="0"/>
+          <xsd:element name="numberResults" type="xsd:int" minOccurs="0"/>
+        </xsd:sequence>
+      </xsd:complexType>
+      <xsd:complexType name="Selector">
+        <xsd:sequence>
+          <xsd:element name="fields" type="xsd:string" minOccurs="0"
+              maxOccurs="unbounded"/>
+          <xsd:element name="paging" type="tns:Paging" minOccurs="0"/>
+        </xsd:sequence>
+      </xsd:complexType>
+      <xsd:complexType name="Money">
+        <xsd:sequence>
+          <xsd:element name="microAmount" type="xsd:long" minOccurs="0"/>
+        </xsd:sequence>
+      </xsd:complexType>
+      <xsd:complexType name="Bids">
+        <xsd:sequence>
+          <xsd:element name="bid" type="tns:Money" minOccurs="0"/>
+        </xsd:sequence>
+      </xsd:complexType>
+      <xsd:complexType name="BiddingStrategyConfiguration">
+        <xsd:sequence>
+          <xsd:element name="biddingStrategyType" type="xsd:string"
+              minOccurs="0"/>
+          <xsd:element name="bids" type="tns:Bids" minOccurs="0"
+              maxOccurs="unbounded"/>
+        </xsd:sequence>
+      </xsd:complexType>
+      <xsd:complexType name="Budget">
+        <xsd:sequence>
+          <xsd:element name="budgetId" type="xsd:long" minOccurs="0"/>
+        </xsd:sequence>
+      </xsd:complexType>
+      <xsd:complexType name="NetworkSetting">
+        <xsd:sequence>
+          <xsd:element name="targetGoogleSearch" type="xsd:boolean"
+              minOccurs="0"/>
+          <xsd:element name="targetSearchNetwork" type="xsd:boolean"
+              minOccurs="0"/>
+        </xsd:sequence>
+      </xsd:complexType>
+      <xsd:complexType name="Campaign">
+        <xsd:sequence>
+          <xsd:element name="id" type="xsd:long" minOccurs="0"/>
+          <xsd:element name="name" type="xsd:string" minOccurs="0"/>
+          <xsd:element name="status" type="xsd:string" minOccurs="0"/>
+          <xsd:element name="budget" type="tns:Budget" minOccurs="0"/>
+          <xsd:element name="biddingStrategyConfiguration"
+              type="tns:BiddingStrategyConfiguration" minOccurs="0"/>
+          <xsd:element name="advertisingChannelType" type="xsd:string"
+              minOccurs="0"/>
+          <xsd:element name="networkSetting" type="tns:NetworkSetting"
+              minOccurs="0"/>
+        </xsd:sequence>
+      </xsd:complexType>
+      <xsd:complexType name="CampaignPage">
+        <xsd:sequence>
+          <xsd:element name="totalNumEntries" type="xsd:int" minOccurs="0"/>
+          <xsd:element name="entries" type="tns:Campaign" minOccurs="0"
+              maxOccurs="unbounded"/>
+        </xsd:sequence>
+      </xsd:complexType>
+      <xsd:complexType name="Operation" abstract="true">
+        <xsd:sequence>
+          <xsd:element name="operator" type="xsd:string" minOccurs="0"/>
+          <xsd:element name="Operation.Type" type="xsd:string"
+              minOccurs="0"/>
+        </xsd:sequence>
+      </xsd:complexType>
+      <xsd:complexType name="CampaignOperation">
+        <xsd:complexContent>
+          <xsd:extension base="tns:Operation">
+            <xsd:sequence>
+              <xsd:element name="operand" type="tns:Campaign" minOccurs="0"/>
+            </xsd:sequence>
+          </xsd:extension>
+        </xsd:complexContent>
+      </xsd:complexType>
+      <xsd:complexType name="CampaignReturnValue">
+        <xsd:sequence>
+          <xsd:element name="value" type="tns:Campaign" minOccurs="0"
+              maxOccurs="unbounded"/>
+        </xsd:sequence>
+      </xsd:complexType>
+      <xsd:element name="RequestHeader" type="tns:SoapHeader"/>
+      <xsd:element name="get">
+        <xsd:complexType>
+          <xsd:sequence>
+            <xsd:element name="serviceSelector" type="tns:Selector"
+                minOccurs="0"/>
+          </xsd:sequence>
+        </xsd:complexType>
+      </xsd:element>
+      <xsd:element name="getResponse">
+        <xsd:complexType>
+          <xsd:sequence>
+            <xsd:element name="rval" type="tns:CampaignPage" minOccurs="0"/>
+          </xsd:sequence>
+        </xsd:complexType>
+      </xsd:element>
+      <xsd:element name="mutate">
+        <xsd:complexType>
+          <xsd:sequence>
+            <xsd:element name="operations" type="tns:CampaignOperation"
+                minOccurs="0" maxOccurs="unbounded"/>
+          </xsd:sequence>
+        </xsd:complexType>
+      </xsd:element>
+      <xsd:element name="mutateResponse">
+        <xsd:complexType>
+          <xsd:sequence>
+            <xsd:element name="rval" type="tns:CampaignReturnValue"
+                minOccurs="0"/>
+          </xsd:sequence>
+        </xsd:complexType>
+      </xsd:element>
+    </xsd:schema>
+  </wsdl:types>
+  <wsdl:message name="RequestHeader">
+    <wsdl:part name="RequestHeader" element="tns:RequestHeader"/>
+  </wsdl:message>
+  <wsdl:message name="getRequest">
+    <wsdl:part name="parameters" element="tns:get"/>
+  </wsdl:message>
+  <wsdl:message name="getResponse">
+    <wsdl:part name="parameters" element="tns:getResponse"/>
+  </wsdl:message>
+  <wsdl:message name="mutateRequest">
+    <wsdl:part name="parameters" element="tns:mutate"/>
+  </wsdl:message>
+  <wsdl:message name="mutateResponse">
+    <wsdl:part name="parameters" element="tns:mutateResponse"/>
+  </wsdl:message>
+  <wsdl:portType name="CampaignServiceInterface">
+    <wsdl:operation name="get">
+      <wsdl:input message="tns:getRequest"/>
+      <wsdl:output message="tns:getResponse"/>
+    </wsdl:operation>
+    <wsdl:operation name="mutate">
+      <wsdl:input message="tns:mutateRequest"/>
+      <wsdl:output message="tns:mutateResponse"/>
+    </wsdl:operation>
+  </wsdl:portType>
+  <wsdl:binding name="CampaignServiceSoapBinding"
+      type="tns:CampaignServiceInterface">
+    <soap:binding style="document"
+        transport="http://schemas.xmlsoap.org/soap/http"/>
+    <wsdl:operation name="get">
+      <soap:operation soapAction=""/>
+      <wsdl:input>
+        <soap:header message="tns:RequestHeader" part="RequestHeader"
+            use="literal"/>
+        <soap:body use="literal"/>
+      </wsdl:input>
+      <wsdl:output>
+        <soap:body use="literal"/>
+      </wsdl:output>
+    </wsdl:operation>
+    <wsdl:operation name="mutate">
+      <soap:operation soapAction=""/>
+      <wsdl:input>
+        <soap:header message="tns:RequestHeader" part="RequestHeader"
+            use="literal"/>
+        <soap:body use="literal"/>
+      </wsdl:input>
+      <wsdl:output>
+        <soap:body use="literal"/>
+      </wsdl:output>
+    </wsdl:operation>
+  </wsdl:binding>
+  <wsdl:service name="CampaignService">
+    <wsdl:port name="CampaignServiceInterfacePort"
+        binding="tns:CampaignServiceSoapBinding">
+      <soap:address location="https://adwords.google.com/api/adwords/cm/\
+%(version)s/CampaignService"/>
+    </wsdl:port>
+  </wsdl:service>
+</wsdl:definitions>
+"""
+# The response served to the soap_round_trip benchmark's calls when none was
+# recorded.
+CAMPAIGN_SERVICE_GET_RESPONSE = """<?xml version="1.0" encoding="UTF-8"?>
+<soap:Envelope xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/">
+  <soap:Body>
+    <getResponse xmlns="https://adwords.google.com/api/adwords/cm/%(version)s">
+      <rval>
+        <totalNumEntries>1</totalNumEntries>
+        <entries><id>1</id><name>Campaign #1</name><status>PAUSED</status>
+        </entries>
+      </rval>
+    </getResponse>
+  </soap:Body>
+</soap:Envelope>
+"""
+# The selector of the soap_round_trip benchmark's calls.
+CAMPAIGN_SELECTOR = {'fields': ['Id', 'Name', 'Status'],
+                     'paging': {'startIndex': 0, 'numberResults': 1}}
+# Matches the offset of a PQL statement.
+PQL_OFFSET_PATTERN = re.compile(r'OFFSET (\d+)')
+
+parser = argparse.ArgumentParser(
+    description='Benchmarks the googleads library against a local server.')
+parser.add_argument('--benchmarks', default=','.join(BENCHMARKS),
+                    help='A comma separated list of the benchmarks to run.')
+parser.add_argument('--scales', default='100,1000,10000',
+                    help='A comma separated list of the sizes of the '
+                    'synthetic datasets.')
+parser.add_argument('--repeat', type=int, default=3,
+                    help='The number of times each measurement is repeated.')
+parser.add_argument('--fixture_dir', default=None,
+                    help='The directory of the recorded API responses. A '
+                    'temporary directory is used if not set.')
+parser.add_argument('--record_from', default=None,
+                    help='The URL of the API server to record responses from.')
+parser.add_argument('--googleads_yaml', default=None,
+                    help='The googleads.yaml used to authorize requests when '
+                    'recording.')
+parser.add_argument('--latency', type=float, default=0,
+                    help='The number of seconds each response is delayed by.')
+parser.add_argument('--output', default=None,
+                    help='The file to write the results to, instead of stdout.')
+
+
+class StaticOAuth2Client(googleads.oauth2.GoogleOAuth2Client):
+  """Authorizes replayed requests, which don't need real credentials."""
+
+  def CreateHttpHeader(self):
+    return {'Authorization': 'Bearer benchmark'}
+
+  def Refresh(self):
+    pass
+
+
+class RemoteReplayServer(object):
+  """Runs a ReplayServer in a ReplayServerManager's process.
+
+  Forking a process while the ReplayServer's threads run in it could leave a
+  lock they hold locked forever in the child, so the benchmarks only reach the
+  server through a proxy of this class. The functions being measured must only
+  send HTTP requests to the server, and not call the proxy.
+  """
+
+  def __init__(self, *args, **kwargs):
+    """Starts a ReplayServer with the given arguments."""
+    self._server = googleads.replay.ReplayServer(*args, **kwargs).Start()
+
+  def GetUrl(self):
+    return self._server.url
+
+  def GetBatchJobUploadUrl(self, batch_job_id):
+    return self._server.GetBatchJobUploadUrl(batch_job_id)
+
+  def SetReportRows(self, report_rows):
+    self._server.report_rows = report_rows
+
+  def GetUploadSize(self, path):
+    """Returns the size of the data uploaded to a path, or None."""
+    upload = self._server.uploads.get(path)
+    return None if upload is None else len(upload)
+
+  def PopMissedRequests(self):
+    """Returns and forgets the requests which had no recorded response."""
+    missed_requests = list(self._server.missed_requests)
+    del self._server.missed_requests[:]
+    return missed_requests
+
+  def AddFixture(self, method, path, response, body=''):
+    self._server.AddFixture(method, path, response, body)
+
+  def GetFixture(self, method, path, body=''):
+    return self._server.GetFixture(method, path, body)
+
+  def Stop(self):
+    self._server.Stop()
+
+
+class ReplayServerManager(multiprocessing.managers.BaseManager):
+  """Runs RemoteReplayServers in a process of their own."""
+
+
+ReplayServerManager.register('RemoteReplayServer', RemoteReplayServer)
+
+
+class ReplayAdWordsClient(googleads.adwords.AdWordsClient):
+  """Gets services from a ReplayServer unless another server is given.
+
+  The batch job request builder gets the WSDLs of the mutate services from the
+  default server, so they are served by the ReplayServer too.
+  """
+
+  replay_server_url = None
+
+  def GetService(self, service_name, version=None, server=None):
+    return super(ReplayAdWordsClient, self).GetService(
+        service_name, version, server or self.replay_server_url)
+
+
+class SyntheticPqlService(object):
+  """Serves a synthetic PQL result set of the given number of rows."""
+
+  def __init__(self, row_count):
+    self._row_count = row_count
+    self._column_types = [{'labelName': label} for label in
+                          ('Id', 'Name', 'Status', 'Impressions', 'Archived')]
+
+  def select(self, statement):
+    offset = int(PQL_OFFSET_PATTERN.search(statement['query']).group(1))
+    row_ids = xrange(offset, min(offset + googleads.dfp.SUGGESTED_PAGE_LIMIT,
+                                 self._row_count))
+    return {'columnTypes': self._column_types,
+            'rows': [self._CreateRow(row_id) for row_id in row_ids]}
+
+  def _CreateRow(self, row_id):
+    return {'values': [
+        suds.sudsobject.Factory.object('NumberValue', {'value': str(row_id)}),
+        suds.sudsobject.Factory.object('TextValue',
+                                       {'value': 'Line item #%d' % row_id}),
+        suds.sudsobject.Factory.object('TextValue', {'value': 'READY'}),
+        suds.sudsobject.Factory.object('NumberValue',
+                                       {'value': str(row_id * 1000)}),
+        suds.sudsobject.Factory.object('BooleanValue',
+                                       {'value': row_id % 2 == 0})]}
+
+
+def CreateOperations(count):
+  """Creates synthetic campaign operations with nested fields."""
+  return [{
+      'operator': 'ADD',
+      'operand': {
+          'name': 'Campaign #%d' % i,
+          'status': 'PAUSED',
+          'advertisingChannelType': 'SEARCH',
+          'budget': {'budgetId': i},
+          'biddingStrategyConfiguration': {
+              'biddingStrategyType': 'MANUAL_CPC',
+              'bids': [{'bid': {'microAmount': i * 10000}}]
+          },
+          'settings': [{'optimizer': {'enabled': True},
+                        'details': [{'key': 'k%d' % j, 'value': j}
+                                    for j in xrange(5)]}],
+          'networkSetting': {'targetGoogleSearch': True,
+                             'targetSearchNetwork': True}
+      }
+  } for i in xrange(count)]
+
+
+class MeasurementError(Exception):
+  """Raised when a function failed while being measured in a child process."""
+
+
+def Measure(function, repeat):
+  """Times a function.
+
+  Where processes can be forked, the function is called in a child process
+  forked for the measurement, so that the growth of its peak memory is measured
+  on its own rather than after the peaks of earlier benchmarks. Changes the
+  function makes to the benchmark's state are then not seen by the caller.
+
+  Args:
+    function: The function to time.
+    repeat: The number of times to call it.
+
+  Returns:
+    A dict holding the fastest and median durations in seconds, and the growth
+    of the process' peak memory in kilobytes if it can be measured.
+
+  Raises:
+    MeasurementError: If the function raised an exception in the child process.
+  """
+  if not (resource and hasattr(os, 'fork')):
+    return MeasureInProcess(function, repeat)
+
+  read_fd, write_fd = os.pipe()
+  pid = os.fork()
+  if not pid:
+    os.close(read_fd)
+    try:
+      measurement = MeasureInProcess(function, repeat)
+    except BaseException:  # pylint: disable=broad-except
+      measurement = {'error': traceback.format_exc()}
+    with os.fdopen(write_fd, 'w') as pipe:
+      json.dump(measurement, pipe)
+    # Exit without running the parent's cleanup, or flushing its output.
+    os._exit(0)  # pylint: disable=protected-access
+
+  os.close(write_fd)
+  with os.fdopen(read_fd) as pipe:
+    output = pipe.read()
+  _, status = os.waitpid(pid, 0)
+  try:
+    measurement = json.loads(output)
+  except ValueError:
+    raise MeasurementError('The measurement process exited with status %d.'
+                           % status)
+  if 'error' in measurement:
+    raise MeasurementError(measurement['error'])
+  return measurement
+
+
+def MeasureInProcess(function, repeat):
+  """Times a function in the current process. See Measure."""
+  durations = []
+  if resource:
+    peak_memory = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+  for _ in xrange(repeat):
+    gc.collect()
+    start = time.time()
+    function()
+    durations.append(time.time() - start)
+  measurement = {'min_seconds': min(durations),
+                 'median_seconds': sorted(durations)[len(durations) // 2]}
+  if resource:
+    measurement['peak_memory_growth_kb'] = (
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - peak_memory)
+  return measurement
+
+
+def Result(benchmark, scale, unit, count, measurement, size=None, **kwargs):
+  """Creates the result of a benchmark.
+
+  Rates are only included if the fastest call took a measurable time.
+
+  Args:
+    benchmark: A string identifying the benchmark.
+    scale: The size of the benchmark's dataset.
+    unit: A string identifying what the benchmark processed, e.g. "rows".
+    count: The number of units processed in each measured call.
+    measurement: A dict returned by Measure.
+    size: The number of bytes transferred in each measured call, if known.
+    **kwargs: Other values to include in the result.
+
+  Returns:
+    A dict holding the result.
+  """
+  result = {'benchmark': benchmark, 'scale': scale, 'unit': unit,
+            'count': count}
+  result.update(measurement)
+  if size is not None:
+    result['bytes'] = size
+  if measurement['min_seconds']:
+    result['%s_per_second' % unit] = count / measurement['min_seconds']
+    if size is not None:
+      result['bytes_per_second'] = size / measurement['min_seconds']
+  result.update(kwargs)
+  return result
+
+
+def BenchmarkPackForSuds(context, scale):
+  operations = CreateOperations(scale)
+  measurement = Measure(
+      lambda: googleads.common._PackForSuds(operations, None), context.repeat)
+  return [Result('pack_for_suds', scale, 'operations', scale, measurement)]
+
+
+def BenchmarkPqlConversion(context, scale):
+  data_downloader = context.dfp_client.GetDataDownloader(DFP_VERSION)
+  data_downloader._pql_service = SyntheticPqlService(scale)
+  query = 'SELECT Id, Name, Status, Impressions, Archived FROM Line_Item'
+  return [
+      Result('pql_conversion', scale, 'rows', scale,
+             Measure(lambda: data_downloader.DownloadPqlResultToList(query),
+                     context.repeat), output='list'),
+      Result('pql_conversion', scale, 'rows', scale,
+             Measure(lambda: data_downloader.DownloadPqlResultToColumns(query),
+                     context.repeat), output='columns')]
+
+
+def BenchmarkReportDownload(context, scale):
+  context.server.SetReportRows(scale)
+  report_downloader = context.adwords_client.GetReportDownloader(
+      ADWORDS_VERSION, context.server_url)
+  query = ('SELECT CampaignId, CampaignName, Impressions, Clicks, Cost '
+           'FROM CAMPAIGN_PERFORMANCE_REPORT DURING LAST_7_DAYS')
+
+  def Download():
+    stream = report_downloader.DownloadReportAsStreamWithAwql(query, 'CSV')
+    size = 0
+    try:
+      for chunk in iter(lambda: stream.read(64 * 1024), ''):
+        size += len(chunk)
+    finally:
+      stream.close()
+    return size
+
+  measurement = Measure(Download, context.repeat)
+  # The report's size is measured outside of Measure, which may call Download
+  # in another process.
+  return [Result('report_download', scale, 'rows', scale, measurement,
+                 size=Download())]
+
+
+def BenchmarkGetService(context, scale):
+  if scale != context.scales[0]:
+    return []
+
+  def GetService(cache):
+    context.adwords_client.cache = cache
+    context.adwords_client.GetService('CampaignService', ADWORDS_VERSION,
+                                      context.server_url)
+
+  warm_cache = suds.cache.ObjectCache(location=tempfile.mkdtemp())
+  GetService(warm_cache)
+  return [
+      Result('get_service', None, 'calls', 1,
+             Measure(lambda: GetService(suds.cache.NoCache()), context.repeat),
+             cache='cold'),
+      Result('get_service', None, 'calls', 1,
+             Measure(lambda: GetService(warm_cache), context.repeat),
+             cache='warm')]
+
+
+def BenchmarkSoapRoundTrip(context, scale):
+  context.adwords_client.cache = context.suds_cache
+  campaign_service = context.adwords_client.GetService(
+      'CampaignService', ADWORDS_VERSION, context.server_url)
+  calls = min(scale, 1000)
+
+  def Call():
+    for _ in xrange(calls):
+      campaign_service.get(CAMPAIGN_SELECTOR)
+
+  return [Result('soap_round_trip', scale, 'calls', calls,
+                 Measure(Call, context.repeat))]
+
+
+def BenchmarkBatchJob(context, scale):
+  context.adwords_client.cache = context.suds_cache
+  # The request builder uses the server in the namespaces of the operations, so
+  # the API's own server is used, and uploads are sent to the ReplayServer.
+  batch_job_helper = context.adwords_client.GetBatchJobHelper(ADWORDS_VERSION)
+  operations = CreateOperations(scale)
+  for operation in operations:
+    operation['xsi_type'] = 'CampaignOperation'
+    operation['operand']['budget'] = {'budgetId': 1}
+    del operation['operand']['settings']
+
+  upload_url = context.server.GetBatchJobUploadUrl(scale)
+
+  def Upload():
+    upload_helper = batch_job_helper.GetIncrementalUploadHelper(upload_url)
+    upload_helper.UploadOperations([operations], is_last=True)
+
+  measurement = Measure(Upload, context.repeat)
+  upload_size = context.server.GetUploadSize(
+      urlparse.urlparse(upload_url).path)
+  return [Result('batch_job', scale, 'operations', scale, measurement,
+                 size=upload_size)]
+
+
+BENCHMARK_FUNCTIONS = {
+    'batch_job': BenchmarkBatchJob,
+    'get_service': BenchmarkGetService,
+    'pack_for_suds': BenchmarkPackForSuds,
+    'pql_conversion': BenchmarkPqlConversion,
+    'report_download': BenchmarkReportDownload,
+    'soap_round_trip': BenchmarkSoapRoundTrip,
+}
+
+
+class Context(object):
+  """The clients, server and settings shared by the benchmarks."""
+
+  def __init__(self, args, server, fixture_dir):
+    self.server = server
+    self.server_url = server.GetUrl()
+    self.repeat = args.repeat
+    self.scales = [int(scale) for scale in args.scales.split(',')]
+    # The parsed WSDLs are kept with the fixtures, and never expire.
+    self.suds_cache = suds.cache.ObjectCache(
+        location=os.path.join(fixture_dir, 'suds'), days=0)
+    if args.googleads_yaml:
+      self.adwords_client = ReplayAdWordsClient.LoadFromStorage(
+          args.googleads_yaml)
+    else:
+      self.adwords_client = ReplayAdWordsClient(
+          'benchmark', StaticOAuth2Client(), 'benchmark',
+          client_customer_id='123-456-7890')
+    self.adwords_client.replay_server_url = self.server_url
+    self.dfp_client = googleads.dfp.DfpClient(StaticOAuth2Client(), 'benchmark',
+                                              network_code='1234')
+
+
+def AddSynthesizedFixtures(context):
+  """Serves a synthesized CampaignService unless its WSDL was recorded.
+
+  Args:
+    context: The Context of the benchmarks.
+  """
+  server = context.server
+  wsdl_path = CAMPAIGN_SERVICE_WSDL_PATH % ADWORDS_VERSION
+  if server.GetFixture('GET', wsdl_path):
+    return
+  server.AddFixture('GET', wsdl_path,
+                    (200, {'Content-Type': 'text/xml'},
+                     CAMPAIGN_SERVICE_WSDL % {'version': ADWORDS_VERSION}))
+
+  # The response to the soap_round_trip benchmark's calls is recorded for the
+  # request they send, which is built without sending it.
+  campaign_service = context.adwords_client.GetService('CampaignService',
+                                                       ADWORDS_VERSION)
+  campaign_service.suds_client.set_options(nosend=True)
+  request = campaign_service.get(CAMPAIGN_SELECTOR)
+  server.AddFixture(
+      'POST', urlparse.urlparse(request.client.location()).path,
+      (200, {'Content-Type': 'text/xml'},
+       CAMPAIGN_SERVICE_GET_RESPONSE % {'version': ADWORDS_VERSION}),
+      request.envelope)
+
+
+def main(args):
+  """Runs the benchmarks and writes their results."""
+  fixture_dir = args.fixture_dir or tempfile.mkdtemp()
+  output = open(args.output, 'w') if args.output else sys.stdout
+  # The manager's process is started before any thread, so it can be forked.
+  manager = ReplayServerManager()
+  manager.start()
+  server = manager.RemoteReplayServer(
+      fixture_dir, upstream=args.record_from, latency=args.latency, seed=0)
+
+  try:
+    # The report schema is synthesized, as the API serves it for every
+    # version.
+    server.AddFixture('GET', REPORT_SCHEMA_PATH % ADWORDS_VERSION,
+                      (200, {'Content-Type': 'text/xml'},
+                       REPORT_SCHEMA % {'version': ADWORDS_VERSION}))
+    context = Context(args, server, fixture_dir)
+    if not args.record_from:
+      AddSynthesizedFixtures(context)
+
+    output.write(json.dumps({
+        'environment': {
+            'googleads': googleads.common.VERSION,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'recording': bool(args.record_from),
+            'repeat': args.repeat,
+        }}) + '\n')
+    for benchmark in args.benchmarks.split(','):
+      for scale in context.scales:
+        server.PopMissedRequests()
+        try:
+          results = BENCHMARK_FUNCTIONS[benchmark](context, scale)
+        except Exception:  # pylint: disable=broad-except
+          # Only benchmarks failing for lack of a recorded response, such as a
+          # WSDL, are skipped.
+          missed_requests = server.PopMissedRequests()
+          if not missed_requests:
+            raise
+          results = [{'benchmark': benchmark, 'scale': scale,
+                      'skipped': 'No response recorded for %s %s.'
+                                 % tuple(missed_requests[0])}]
+        for result in results:
+          output.write(json.dumps(result, sort_keys=True) + '\n')
+          output.flush()
+  finally:
+    server.Stop()
+    manager.shutdown()
+
+  if output is not sys.stdout:
+    output.close()
+
+
+if __name__ == '__main__':
+  main(parser.parse_args())
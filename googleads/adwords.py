@@ -15,14 +15,27 @@
 """Client library for the AdWords API."""
 
 from collections import namedtuple
+from collections import OrderedDict
+import codecs
+import contextlib
+import csv
+import datetime
+import gzip
+import hashlib
 import io
+import json
 import os
 import re
 import sys
+import threading
+import time
 import urllib
 import urllib2
+import urlparse
 from xml.etree import ElementTree
+import zlib
 
+import suds.cache
 import suds.client
 import suds.mx.literal
 import suds.xsd.doctor
@@ -31,6 +44,7 @@ import yaml
 
 import googleads.common
 import googleads.errors
+import googleads.metrics
 
 # A giant dictionary of AdWords versions, the services they support, and which
 # namespace those services are in.
@@ -183,6 +197,92 @@ _REPORT_HEADER_KWARGS = {'client_customer_id': 'clientCustomerId',
                          'skip_report_summary': 'skipReportSummary',
                          'use_raw_enum_values': 'useRawEnumValues'}
 
+# Maps the fieldType of report fields, as given by
+# ReportDefinitionService.getReportFields, to the column type their values are
+# parsed as. Fields of other types, including enums, are left as strings.
+_REPORT_FIELD_COLUMN_TYPES = {'Bid': 'int',
+                              'Boolean': 'bool',
+                              'Double': 'float',
+                              'Integer': 'int',
+                              'Long': 'int',
+                              'Money': 'int'}
+
+# The placeholders used by reports for values that are not set.
+_REPORT_NULL_VALUES = ('', '--', ' --')
+
+# The number of report types whose fields a ReportFieldCatalog keeps in memory
+# by default.
+_DEFAULT_REPORT_FIELD_CATALOG_SIZE = 64
+# The attributes of ReportDefinitionField stored by ReportFieldCatalog.
+_REPORT_FIELD_ATTRIBUTES = ('fieldName', 'displayFieldName', 'xmlAttributeName',
+                            'fieldType', 'fieldBehavior', 'enumValues',
+                            'canSelect', 'canFilter', 'isEnumType', 'isBeta',
+                            'isZeroRowCompatible')
+
+# The parsed report definition schemas shared by ReportDownloaders, keyed by
+# (server, version).
+_REPORT_SCHEMAS = {}
+_REPORT_SCHEMA_LOCK = threading.Lock()
+
+# The total size in bytes of the reports kept by a ReportCache by default.
+_DEFAULT_REPORT_CACHE_MAX_SIZE = 1024 * 1024 * 1024
+# The suffix of the files ReportCache stores reports in.
+_REPORT_CACHE_SUFFIX = '.report.gz'
+# The report download headers that affect a report's contents, and so are part
+# of its ReportCache key.
+_REPORT_CACHE_KEY_HEADERS = frozenset(_REPORT_HEADER_KWARGS.values())
+# A report is only cached if its date range ended at least this long before
+# today in local time, so that it has also ended in the customer's time zone.
+_REPORT_CACHE_MIN_AGE = datetime.timedelta(days=2)
+# Extracts the end of a fixed date range from an AWQL query.
+_AWQL_DURING_PATTERN = re.compile(
+    r'\bDURING\s+\d{8}\s*,\s*(?P<max>\d{8})\b', re.IGNORECASE)
+
+# The report download formats IterReportRows can parse.
+_REPORT_ROW_FORMATS = ('CSV', 'TSV', 'XML', 'GZIPPED_CSV', 'GZIPPED_XML')
+# The number of bytes read from a report download at a time while parsing it.
+_REPORT_READ_CHUNK_SIZE = 64 * 1024
+
+# Extracts the selected fields and report type from an AWQL query.
+_AWQL_SELECT_PATTERN = re.compile(
+    r'^\s*SELECT\s+(?P<fields>.+?)\s+FROM\s+(?P<report_type>\w+)',
+    re.IGNORECASE | re.DOTALL)
+
+# The number of threads used by default by AdWordsClient.ForEachCustomer.
+_DEFAULT_FOR_EACH_CUSTOMER_WORKERS = 4
+
+# The outcome of running a function for a customer with
+# AdWordsClient.ForEachCustomer. Exactly one of result and error is set.
+CustomerResult = namedtuple('CustomerResult', ['result', 'error'])
+
+# The fields of ManagedCustomer entries stored by AccountHierarchy by default.
+_DEFAULT_ACCOUNT_HIERARCHY_FIELDS = ('CustomerId', 'Name', 'CanManageClients')
+# The number of accounts requested per ManagedCustomerService.get call.
+_MANAGED_CUSTOMER_PAGE_SIZE = 500
+
+# The maximum number of campaign IDs sent in one CustomerSyncService.get call.
+_CUSTOMER_SYNC_CAMPAIGN_BATCH_SIZE = 100
+# How far back ChangeTracker looks for changes for customers it hasn't synced.
+_DEFAULT_CHANGE_LOOKBACK = datetime.timedelta(days=1)
+# CustomerSyncService date time ranges are in the customer's time zone, which
+# may be ahead of local time. The end of each range is padded by this much.
+_CUSTOMER_SYNC_MAX_TIME_PADDING = datetime.timedelta(days=1)
+# The format of the date times in CustomerSyncService date time ranges.
+_CUSTOMER_SYNC_DATE_TIME_FORMAT = '%Y%m%d %H%M%S'
+
+# The changes found by ChangeTracker.GetChanges. The campaigns, ad_groups and
+# feeds dicts map IDs to the CampaignChangeData, AdGroupChangeData and
+# FeedChangeData returned by CustomerSyncService.
+AccountChanges = namedtuple(
+    'AccountChanges',
+    ['campaigns', 'ad_groups', 'feeds', 'last_change_timestamp'])
+
+# The number of operations at which MutateCoalescer sends a batch by default.
+_DEFAULT_COALESCE_OPERATIONS = 500
+# How long, in seconds, MutateCoalescer collects operations for a batch by
+# default.
+_DEFAULT_COALESCE_DELAY = 0.05
+
 # The endpoint used by default when making AdWords API requests.
 _DEFAULT_ENDPOINT = 'https://adwords.google.com'
 # The user-agent used by default when making AdWords API requests.
@@ -199,7 +299,8 @@ class AdWordsClient(object):
     user_agent: An arbitrary string which will be used to identify your
         application
     client_customer_id: A string identifying which AdWords customer you want to
-        act as.
+        act as. Within an AsCustomer block, this is the customer ID given to
+        AsCustomer for the thread running the block.
     validate_only: A boolean indicating if you want your request to be validated
         but not actually executed.
     partial_failure: A boolean indicating if you want your mutate calls
@@ -299,6 +400,10 @@ class AdWordsClient(object):
           this header.
       cache: A subclass of suds.cache.Cache. If not set, this will default to an
           instance of suds.cache.FileCache.
+      response_cache: A googleads.common.ResponseCache used to serve calls to
+          the methods it has TTLs for, or None if responses aren't cached.
+      single_flight: A googleads.common.SingleFlight sharing identical
+          concurrent calls to the methods it was given, or None.
       proxy_config: A googleads.common.ProxyConfig instance or None if a proxy
         isn't being used.
       report_downloader_headers: A dict containing optional headers to be used
@@ -314,6 +419,7 @@ class AdWordsClient(object):
     self.developer_token = developer_token
     self.oauth2_client = oauth2_client
     self.oauth2_client.Refresh()
+    self._customer_scopes = threading.local()
     self.client_customer_id = kwargs.get('client_customer_id')
     self.user_agent = user_agent
     # Verify that the provided user_agent contains only ASCII characters. In
@@ -327,6 +433,8 @@ class AdWordsClient(object):
     self.validate_only = kwargs.get('validate_only', False)
     self.partial_failure = kwargs.get('partial_failure', False)
     self.cache = kwargs.get('cache')
+    self.response_cache = kwargs.get('response_cache')
+    self.single_flight = kwargs.get('single_flight')
     proxy_config = kwargs.get('proxy_config')
     self.proxy_config = (proxy_config if proxy_config else
                          googleads.common.ProxyConfig())
@@ -339,6 +447,143 @@ class AdWordsClient(object):
 
     self.message_plugin = googleads.common.LoggingMessagePlugin()
 
+  @property
+  def client_customer_id(self):
+    """The client customer ID used by requests made from the current thread."""
+    scoped_ids = getattr(self._customer_scopes, 'client_customer_ids', None)
+    return scoped_ids[-1] if scoped_ids else self._client_customer_id
+
+  @client_customer_id.setter
+  def client_customer_id(self, client_customer_id):
+    self._client_customer_id = client_customer_id
+
+  @contextlib.contextmanager
+  def AsCustomer(self, client_customer_id):
+    """Scopes requests made by the current thread to the given customer.
+
+    Within the block, SOAP calls and report downloads made by the current thread
+    with this client's services and ReportDownloaders will use the given client
+    customer ID. Other threads are unaffected, so a single AdWordsClient and its
+    services can be shared by threads acting as different customers. Blocks may
+    be nested.
+
+    Example:
+      with adwords_client.AsCustomer('123-456-7890'):
+        campaign_service.get(selector)
+
+    Args:
+      client_customer_id: A string identifying which AdWords customer to act as.
+
+    Yields:
+      This AdWordsClient.
+    """
+    if not hasattr(self._customer_scopes, 'client_customer_ids'):
+      self._customer_scopes.client_customer_ids = []
+    self._customer_scopes.client_customer_ids.append(client_customer_id)
+    try:
+      yield self
+    finally:
+      self._customer_scopes.client_customer_ids.pop()
+
+  def ForEachCustomer(self, customer_ids, function,
+                      max_workers=_DEFAULT_FOR_EACH_CUSTOMER_WORKERS,
+                      max_requests_per_second=None):
+    """Runs a function for each of the given customers on a pool of threads.
+
+    The function is called with this AdWordsClient inside an AsCustomer block
+    for the customer, so services and ReportDownloaders created from this
+    client, including ones created before calling this method, act as that
+    customer. They share their WSDLs and OAuth2 credentials across all threads.
+
+    Example:
+      def GetCampaigns(client):
+        return campaign_service.get(selector)
+
+      results = adwords_client.ForEachCustomer(customer_ids, GetCampaigns)
+
+    Args:
+      customer_ids: An iterable of strings identifying the customers to run the
+          function for. The function is run once for each distinct customer.
+      function: A callable taking this AdWordsClient as its only argument.
+      [optional]
+      max_workers: The number of threads calling the function concurrently.
+      max_requests_per_second: A number limiting how many SOAP calls and report
+          downloads may be made per second for each customer. If not set,
+          requests are not limited.
+
+    Returns:
+      An OrderedDict mapping each customer ID, in the order first given, to a
+      CustomerResult holding either the value returned by the function or the
+      exception it raised. If the function didn't complete for a customer, e.g.
+      because its thread was stopped by a SystemExit, the error is a
+      GoogleAdsError.
+
+    Raises:
+      GoogleAdsValueError: If max_workers or max_requests_per_second is not
+        positive.
+    """
+    if max_workers < 1:
+      raise googleads.errors.GoogleAdsValueError(
+          'max_workers must be positive. Given: %s' % max_workers)
+
+    customer_ids = list(OrderedDict.fromkeys(customer_ids))
+    rate_limiters = {}
+    if max_requests_per_second is not None:
+      for customer_id in customer_ids:
+        rate_limiters[customer_id] = googleads.common.RateLimiter(
+            max_requests_per_second)
+
+    def RunForCustomer(customer_id):
+      self._customer_scopes.rate_limiter = rate_limiters.get(customer_id)
+      try:
+        with self.AsCustomer(customer_id):
+          return function(self)
+      finally:
+        self._customer_scopes.rate_limiter = None
+
+    outcomes = googleads.common.RunConcurrently(
+        RunForCustomer, customer_ids, max_workers, daemon=True)
+    return OrderedDict(
+        (customer_id, CustomerResult(*outcome) if outcome else CustomerResult(
+            None, googleads.errors.GoogleAdsError(
+                'The function did not complete for customer %s.'
+                % customer_id)))
+        for customer_id, outcome in zip(customer_ids, outcomes))
+
+  def _CopyCustomerScope(self):
+    """Captures the AsCustomer and ForEachCustomer state of the current thread.
+
+    Returns:
+      A context manager which applies the captured state to the thread entering
+      it, so that requests made from that thread act as the same customer.
+    """
+    scoped_ids = getattr(self._customer_scopes, 'client_customer_ids', None)
+    is_scoped = bool(scoped_ids)
+    client_customer_id = scoped_ids[-1] if is_scoped else None
+    rate_limiter = getattr(self._customer_scopes, 'rate_limiter', None)
+
+    @contextlib.contextmanager
+    def CustomerScope():
+      previous_rate_limiter = getattr(self._customer_scopes, 'rate_limiter',
+                                      None)
+      self._customer_scopes.rate_limiter = rate_limiter
+      try:
+        if is_scoped:
+          with self.AsCustomer(client_customer_id):
+            yield
+        else:
+          yield
+      finally:
+        self._customer_scopes.rate_limiter = previous_rate_limiter
+
+    return CustomerScope()
+
+  def _WaitForRequestSlot(self):
+    """Blocks until the current thread may make a request for its customer."""
+    rate_limiter = getattr(self._customer_scopes, 'rate_limiter', None)
+    if rate_limiter:
+      rate_limiter.Wait()
+
   def GetService(self, service_name, version=None, server=None):
     """Creates a service client for the given service.
 
@@ -390,7 +635,8 @@ class AdWordsClient(object):
         **kwargs)
 
     return googleads.common.SudsServiceProxy(
-        client, _AdWordsHeaderHandler(self, version, self.enable_compression))
+        client, _AdWordsHeaderHandler(self, version, self.enable_compression),
+        self.response_cache, self.single_flight)
 
   def GetBatchJobHelper(self, version=sorted(_SERVICE_MAP.keys())[-1],
                         server=None):
@@ -440,9 +686,32 @@ class AdWordsClient(object):
 
     return ReportDownloader(self, version, server)
 
+  def GetAccountHierarchy(self, version=sorted(_SERVICE_MAP.keys())[-1],
+                          server=None, **kwargs):
+    """Loads the hierarchy of accounts managed by the current customer.
+
+    This is a convenience method. It is functionally identical to calling
+    AccountHierarchy(adwords_client, version, server, **kwargs).
+
+    Args:
+      [optional]
+      version: A string identifying the AdWords version to connect to. This
+          defaults to what is currently the latest version. This will be updated
+          in future releases to point to what is then the latest version.
+      server: A string identifying the webserver hosting the AdWords API.
+      **kwargs: Optional keyword arguments passed to AccountHierarchy.
+
+    Returns:
+      An AccountHierarchy of the accounts under the current customer.
+    """
+    return AccountHierarchy(self, version, server, **kwargs)
+
   def SetClientCustomerId(self, client_customer_id):
     """Change the client customer id used by the AdWordsClient instance.
 
+    This changes the customer for all threads. To act as a customer from just
+    one thread, use AsCustomer.
+
     Args:
       client_customer_id: str New Client Customer ID to use.
     """
@@ -484,6 +753,7 @@ class _AdWordsHeaderHandler(googleads.common.HeaderHandler):
     Args:
       suds_client: An initialized suds.client.Client.
     """
+    self._adwords_client._WaitForRequestSlot()
     header = suds_client.factory.create(self._SOAP_HEADER_CLASS % self._version)
     header.clientCustomerId = self._adwords_client.client_customer_id
     header.developerToken = self._adwords_client.developer_token
@@ -499,6 +769,23 @@ class _AdWordsHeaderHandler(googleads.common.HeaderHandler):
         soapheaders=header,
         headers=http_headers)
 
+  def CopyContext(self):
+    """Captures the customer the calling thread is acting as.
+
+    Returns:
+      A context manager which, when entered on another thread, makes requests
+      from that thread act as the same customer.
+    """
+    return self._adwords_client._CopyCustomerScope()
+
+  def GetRequestScope(self):
+    """Identifies the customer the calling thread is acting as.
+
+    Returns:
+      The client customer ID used by requests from the calling thread.
+    """
+    return self._adwords_client.client_customer_id
+
   def GetReportDownloadHeaders(self, **kwargs):
     """Returns a dictionary of headers for a report download request.
 
@@ -532,6 +819,7 @@ class _AdWordsHeaderHandler(googleads.common.HeaderHandler):
       GoogleAdsValueError: If one or more of the report header keyword arguments
         is invalid.
     """
+    self._adwords_client._WaitForRequestSlot()
     headers = self._adwords_client.oauth2_client.CreateHttpHeader()
     headers.update({
         'Content-type': self._CONTENT_TYPE,
@@ -1053,7 +1341,7 @@ class IncrementalUploadHelper(object):
     }
 
     # Send an HTTP POST request to the given upload_url
-    req = urllib2.Request(upload_url, data={}, headers=headers)
+    req = urllib2.Request(upload_url, data='', headers=headers)
     resp = self._url_opener.open(req)
 
     return resp.headers['location']
@@ -1103,23 +1391,939 @@ class IncrementalUploadHelper(object):
         current_content_length=self._current_content_length, is_last=is_last)
     # Make the request, ignoring the urllib2.HTTPError raised due to HTTP status
     # code 308 (for resumable uploads).
-    try:
-      self._url_opener.open(req)
-    except urllib2.HTTPError as e:
-      if e.code != 308:
-        raise
+    with googleads.metrics.MeasureCall(
+        'batch_job_upload', 'IncrementalUploadHelper', 'UploadOperations',
+        operation_count=_CountOperations(operations)) as measurement:
+      measurement.request_bytes = len(req.data)
+      try:
+        self._url_opener.open(req)
+      except urllib2.HTTPError as e:
+        if e.code != 308:
+          raise
     # Update upload status.
     self._current_content_length += len(req.data)
     self._is_last = is_last
 
 
+@googleads.common.RegisterUtility('AccountHierarchy')
+class AccountHierarchy(object):
+  """An index of the accounts managed by a customer.
+
+  The accounts are retrieved from the ManagedCustomerService. They are stored
+  as dicts keyed by the camelCase names of the selected fields, e.g.
+  {'customerId': 1234567890, 'name': 'Account'}. As an account may be linked to
+  more than one manager, the hierarchy is a graph rather than a strict tree;
+  lookups visit each account once.
+
+  If a cache path is given, the hierarchy is saved there after it is crawled,
+  and later AccountHierarchies for the same customer are loaded from the file
+  instead of crawled while it is younger than max_age.
+  """
+
+  def __init__(self, adwords_client, version=sorted(_SERVICE_MAP.keys())[-1],
+               server=None, fields=_DEFAULT_ACCOUNT_HIERARCHY_FIELDS,
+               cache_path=None, max_age=None):
+    """Initializes an AccountHierarchy, loading it from the cache or the API.
+
+    Args:
+      adwords_client: The AdWordsClient used to crawl the hierarchy. Its current
+          client customer ID identifies the root of the hierarchy.
+      [optional]
+      version: A string identifying the AdWords version to connect to. This
+          defaults to what is currently the latest version. This will be updated
+          in future releases to point to what is then the latest version.
+      server: A string identifying the webserver hosting the AdWords API.
+      fields: A sequence of ManagedCustomer field names to store for each
+          account. CustomerId is always included.
+      cache_path: A string containing the path of the file the hierarchy is
+          cached in. If not set, the hierarchy is not cached.
+      max_age: The number of seconds a cached hierarchy is used for. If not set,
+          a cached hierarchy is used regardless of its age.
+    """
+    self._adwords_client = adwords_client
+    self._version = version
+    self._server = server
+    self._fields = ['CustomerId'] + [field for field in fields
+                                     if field != 'CustomerId']
+    self._cache_path = cache_path
+    self._customer_id = adwords_client.client_customer_id
+    self._accounts = {}
+    self._links = set()
+    self._children = {}
+    self._parents = {}
+    self.updated_time = None
+
+    if not self._LoadFromCache(max_age):
+      self.Refresh()
+
+  def __contains__(self, customer_id):
+    return customer_id in self._accounts
+
+  def __len__(self):
+    return len(self._accounts)
+
+  def GetAccount(self, customer_id):
+    """Returns the account with the given customer ID.
+
+    Args:
+      customer_id: A number identifying the account.
+
+    Returns:
+      A dict holding the stored fields of the account.
+
+    Raises:
+      GoogleAdsValueError: If the account is not in the hierarchy.
+    """
+    try:
+      return self._accounts[customer_id]
+    except KeyError:
+      raise googleads.errors.GoogleAdsValueError(
+          'Customer %s is not in the account hierarchy.' % customer_id)
+
+  def GetRoots(self):
+    """Returns the customer IDs of the accounts without a manager."""
+    return [customer_id for customer_id in self._accounts
+            if customer_id not in self._parents]
+
+  def GetChildren(self, customer_id):
+    """Returns the customer IDs of the accounts directly managed by an account.
+
+    Args:
+      customer_id: A number identifying the managing account.
+
+    Returns:
+      A list of customer IDs.
+    """
+    self.GetAccount(customer_id)
+    return list(self._children.get(customer_id, ()))
+
+  def GetParents(self, customer_id):
+    """Returns the customer IDs of the accounts directly managing an account.
+
+    Args:
+      customer_id: A number identifying the managed account.
+
+    Returns:
+      A list of customer IDs.
+    """
+    self.GetAccount(customer_id)
+    return list(self._parents.get(customer_id, ()))
+
+  def GetDescendants(self, customer_id):
+    """Returns the customer IDs of all accounts managed beneath an account.
+
+    Args:
+      customer_id: A number identifying the managing account.
+
+    Returns:
+      A list of customer IDs, in breadth-first order.
+    """
+    self.GetAccount(customer_id)
+    return self._Traverse(customer_id, self._children)
+
+  def GetAncestors(self, customer_id):
+    """Returns the customer IDs of all accounts managing an account.
+
+    Args:
+      customer_id: A number identifying the managed account.
+
+    Returns:
+      A list of customer IDs, nearest managers first.
+    """
+    self.GetAccount(customer_id)
+    return self._Traverse(customer_id, self._parents)
+
+  def GetLeaves(self, customer_id=None):
+    """Returns the customer IDs of accounts that don't manage other accounts.
+
+    Args:
+      [optional]
+      customer_id: A number identifying an account to limit the leaves to the
+          accounts beneath. If not set, all leaves in the hierarchy are given.
+
+    Returns:
+      A list of customer IDs.
+    """
+    if customer_id is None:
+      candidates = self._accounts
+    else:
+      candidates = self.GetDescendants(customer_id)
+    return [candidate for candidate in candidates
+            if candidate not in self._children]
+
+  def Refresh(self, customer_id=None):
+    """Crawls the hierarchy, or the part beneath an account, from the API.
+
+    Refreshing beneath an account only re-crawls the accounts that it manages,
+    which is much faster than re-crawling a large hierarchy. The hierarchy is
+    saved to the cache path afterwards, if one is set.
+
+    Args:
+      [optional]
+      customer_id: A number identifying the account to refresh the accounts
+          beneath. If not set, the whole hierarchy is refreshed.
+    """
+    if customer_id is None:
+      accounts, links = self._Crawl(self._customer_id)
+      self._accounts = accounts
+      self._links = links
+    else:
+      stale_ids = set(self.GetDescendants(customer_id))
+      stale_ids.add(customer_id)
+      accounts, links = self._Crawl(customer_id)
+      self._links = set(link for link in self._links
+                        if link[0] not in stale_ids) | links
+      self._accounts.update(accounts)
+      linked_ids = set(client_id for _, client_id in self._links)
+      for stale_id in stale_ids:
+        if (stale_id not in accounts and stale_id not in linked_ids and
+            stale_id != customer_id):
+          del self._accounts[stale_id]
+
+    self._Index()
+    self.updated_time = time.time()
+    self._SaveToCache()
+
+  def _Crawl(self, customer_id):
+    """Pages through the accounts beneath a customer.
+
+    Args:
+      customer_id: The client customer ID to crawl the accounts beneath.
+
+    Returns:
+      A tuple of a dict mapping customer IDs to accounts, and a set of
+      (manager customer ID, client customer ID) tuples.
+    """
+    managed_customer_service = self._adwords_client.GetService(
+        'ManagedCustomerService', self._version, self._server)
+    attributes = [field[0].lower() + field[1:] for field in self._fields]
+    selector = {
+        'fields': self._fields,
+        'paging': {
+            'startIndex': '0',
+            'numberResults': str(_MANAGED_CUSTOMER_PAGE_SIZE)
+        }
+    }
+    accounts = {}
+    links = set()
+    offset = 0
+
+    with self._adwords_client.AsCustomer(customer_id):
+      while True:
+        page = managed_customer_service.get(selector)
+        for entry in getattr(page, 'entries', None) or []:
+          account = dict((attribute, getattr(entry, attribute, None))
+                         for attribute in attributes)
+          accounts[account['customerId']] = account
+        for link in getattr(page, 'links', None) or []:
+          links.add((link.managerCustomerId, link.clientCustomerId))
+        offset += _MANAGED_CUSTOMER_PAGE_SIZE
+        if offset >= int(page.totalNumEntries):
+          break
+        selector['paging']['startIndex'] = str(offset)
+
+    return accounts, links
+
+  def _Index(self):
+    """Rebuilds the child and parent lookups from the links."""
+    self._children = {}
+    self._parents = {}
+    for manager_id, client_id in sorted(self._links):
+      if manager_id in self._accounts and client_id in self._accounts:
+        self._children.setdefault(manager_id, []).append(client_id)
+        self._parents.setdefault(client_id, []).append(manager_id)
+
+  def _LoadFromCache(self, max_age):
+    """Loads the hierarchy from the cache path, if it is set and fresh.
+
+    Args:
+      max_age: The number of seconds a cached hierarchy is used for, or None.
+
+    Returns:
+      A boolean indicating whether the hierarchy was loaded.
+    """
+    if not self._cache_path or not os.path.exists(self._cache_path):
+      return False
+
+    with open(self._cache_path) as cache_file:
+      cached = json.load(cache_file)
+
+    if (cached['customer_id'] != self._customer_id or
+        cached['fields'] != self._fields or
+        (max_age is not None and
+         time.time() - cached['updated_time'] > max_age)):
+      return False
+
+    self._accounts = dict((account['customerId'], account)
+                          for account in cached['accounts'])
+    self._links = set(tuple(link) for link in cached['links'])
+    self.updated_time = cached['updated_time']
+    self._Index()
+    return True
+
+  def _SaveToCache(self):
+    """Saves the hierarchy to the cache path, if it is set."""
+    if not self._cache_path:
+      return
+
+    cached = {'customer_id': self._customer_id,
+              'fields': self._fields,
+              'updated_time': self.updated_time,
+              'accounts': self._accounts.values(),
+              'links': sorted(self._links)}
+    # A failed write can't corrupt the cache for other threads or processes.
+    with googleads.common.WriteFileAtomically(self._cache_path) as cache_file:
+      json.dump(cached, cache_file)
+
+  @staticmethod
+  def _Traverse(customer_id, edges):
+    """Lists the accounts reachable from an account, visiting each once.
+
+    Args:
+      customer_id: The customer ID to start from, which is not listed.
+      edges: A dict mapping customer IDs to the customer IDs they lead to.
+
+    Returns:
+      A list of customer IDs, in breadth-first order.
+    """
+    visited = set([customer_id])
+    reachable = []
+    frontier = [customer_id]
+    while frontier:
+      next_frontier = []
+      for current_id in frontier:
+        for next_id in edges.get(current_id, ()):
+          if next_id not in visited:
+            visited.add(next_id)
+            reachable.append(next_id)
+            next_frontier.append(next_id)
+      frontier = next_frontier
+    return reachable
+
+
+@googleads.common.RegisterUtility('ChangeTracker')
+class ChangeTracker(object):
+  """Finds what changed in accounts since they were last synced.
+
+  A ChangeTracker keeps a watermark per client customer ID and campaign ID: the
+  time of the last change it returned for that campaign. Each call to
+  GetChanges returns the changes made to the given campaigns since their
+  watermarks and advances them, so a mirror of the account can re-fetch only
+  the campaigns, ad groups and feeds that changed. Each request asks for the
+  changes since the oldest watermark of the campaigns it is sent for, so some
+  changes may be returned more than once.
+
+  The watermarks can be persisted between runs, e.g. with json.dump, by saving
+  the watermarks attribute and passing it back in when creating a
+  ChangeTracker.
+
+  Attributes:
+    watermarks: A dict mapping client customer ID strings to dicts mapping
+        campaign ID strings to the lastChangeTimestamp strings changes were
+        last returned up to.
+  """
+
+  def __init__(self, adwords_client, version=sorted(_SERVICE_MAP.keys())[-1],
+               server=None, watermarks=None,
+               batch_size=_CUSTOMER_SYNC_CAMPAIGN_BATCH_SIZE):
+    """Initializes a ChangeTracker.
+
+    Args:
+      adwords_client: The AdWordsClient used to call CustomerSyncService. Its
+          current client customer ID identifies the account synced by each call
+          to GetChanges, so one ChangeTracker can be used with AsCustomer or
+          ForEachCustomer to track many accounts.
+      [optional]
+      version: A string identifying the AdWords version to connect to. This
+          defaults to what is currently the latest version. This will be updated
+          in future releases to point to what is then the latest version.
+      server: A string identifying the webserver hosting the AdWords API.
+      watermarks: A dict of watermarks from a previous ChangeTracker.
+      batch_size: The maximum number of campaign IDs sent per request.
+    """
+    self._adwords_client = adwords_client
+    self._customer_sync_service = adwords_client.GetService(
+        'CustomerSyncService', version, server)
+    self._batch_size = batch_size
+    self._lock = threading.Lock()
+    self.watermarks = dict(
+        (customer_id, dict(campaign_watermarks))
+        for customer_id, campaign_watermarks in (watermarks or {}).iteritems())
+
+  def GetChanges(self, campaign_ids, since=None):
+    """Returns the changes to the given campaigns since the last sync.
+
+    The campaigns are requested in batches. The watermarks are only advanced
+    once all of the campaigns' changes have been retrieved, so a failed call
+    can be retried. Each campaign's watermark is advanced to the last change
+    timestamp of the batch it was requested in.
+
+    Args:
+      campaign_ids: An iterable of the IDs of the campaigns to get changes for.
+      [optional]
+      since: A datetime.datetime, in the customer's time zone, from which to
+          get changes for campaigns without a watermark. Defaults to a day ago.
+
+    Returns:
+      An AccountChanges holding the changes merged from all requests.
+    """
+    customer_id = self._adwords_client.client_customer_id
+    with self._lock:
+      watermarks = dict(self.watermarks.get(customer_id, {}))
+    default_watermark = (
+        since or datetime.datetime.now() - _DEFAULT_CHANGE_LOOKBACK).strftime(
+            _CUSTOMER_SYNC_DATE_TIME_FORMAT)
+    max_date_time = (datetime.datetime.now() + _CUSTOMER_SYNC_MAX_TIME_PADDING
+                    ).strftime(_CUSTOMER_SYNC_DATE_TIME_FORMAT)
+    # Batch together campaigns with similar watermarks, so that each request
+    # asks for as few changes that were already returned as possible.
+    campaign_ids = sorted(
+        campaign_ids,
+        key=lambda campaign_id: watermarks.get(str(campaign_id), ''))
+
+    changes = AccountChanges({}, {}, {}, None)
+    advanced = {}
+    for start in xrange(0, len(campaign_ids), self._batch_size):
+      batch = campaign_ids[start:start + self._batch_size]
+      watermark = min(watermarks.get(str(campaign_id), default_watermark)
+                      for campaign_id in batch)
+      customer_change_data = self._customer_sync_service.get({
+          'dateTimeRange': {'min': watermark, 'max': max_date_time},
+          'campaignIds': batch
+      })
+      changes = self._MergeChanges(changes, customer_change_data)
+      last_change_timestamp = getattr(customer_change_data,
+                                      'lastChangeTimestamp', None)
+      if last_change_timestamp:
+        for campaign_id in batch:
+          advanced[str(campaign_id)] = last_change_timestamp
+
+    if not advanced:
+      return changes
+    with self._lock:
+      campaign_watermarks = self.watermarks.setdefault(customer_id, {})
+      for campaign_id, last_change_timestamp in advanced.iteritems():
+        current = campaign_watermarks.get(campaign_id)
+        if current is None or last_change_timestamp > current:
+          campaign_watermarks[campaign_id] = last_change_timestamp
+    return changes
+
+  def _MergeChanges(self, changes, customer_change_data):
+    """Merges the CustomerChangeData from one request into AccountChanges.
+
+    Args:
+      changes: The AccountChanges merged so far.
+      customer_change_data: The CustomerChangeData returned by
+          CustomerSyncService.get, or None if nothing changed.
+
+    Returns:
+      An AccountChanges including the given CustomerChangeData.
+    """
+    if not customer_change_data:
+      return changes
+
+    for campaign in getattr(customer_change_data, 'changedCampaigns',
+                            None) or []:
+      changes.campaigns[campaign.campaignId] = campaign
+      for ad_group in getattr(campaign, 'changedAdGroups', None) or []:
+        changes.ad_groups[ad_group.adGroupId] = ad_group
+    for feed in getattr(customer_change_data, 'changedFeeds', None) or []:
+      changes.feeds[feed.feedId] = feed
+
+    last_change_timestamp = getattr(customer_change_data,
+                                    'lastChangeTimestamp', None)
+    if last_change_timestamp and (
+        changes.last_change_timestamp is None or
+        last_change_timestamp > changes.last_change_timestamp):
+      changes = changes._replace(last_change_timestamp=last_change_timestamp)
+    return changes
+
+
+@googleads.common.RegisterUtility('MutateCoalescer')
+class MutateCoalescer(object):
+  """Coalesces small concurrent mutate calls into fewer, larger ones.
+
+  Operations submitted to a MutateCoalescer, from any thread, are collected
+  into a batch per client customer ID. A batch is sent as one call once it holds
+  max_operations operations, or max_delay seconds after its first operation was
+  submitted. Each caller then receives the part of the result for its own
+  operations: the values in the order of its operations and, with partial
+  failure enabled, the partialFailureErrors of its operations, with field paths
+  pointing at the operations' indexes among its own operations.
+
+  A batch is sent as the customer and with the rate limit of the thread which
+  submitted its first operations. Batched operations are applied together, so
+  without partial failure enabled an invalid operation fails the batch, and
+  every caller with operations in it receives the error.
+
+  Example:
+    coalescer = MutateCoalescer(
+        adwords_client, adwords_client.GetService('AdGroupCriterionService'))
+    result = coalescer.Mutate(operations)
+  """
+
+  def __init__(self, adwords_client, service, method_name='mutate',
+               max_operations=_DEFAULT_COALESCE_OPERATIONS,
+               max_delay=_DEFAULT_COALESCE_DELAY):
+    """Initializes a MutateCoalescer.
+
+    Args:
+      adwords_client: The AdWordsClient the service was created with.
+      service: The service to send the batches with, as returned by
+          AdWordsClient.GetService.
+      [optional]
+      method_name: A string identifying the service method to call with each
+          batch of operations.
+      max_operations: The number of operations at which a batch is sent.
+      max_delay: The maximum number of seconds operations wait for a batch to
+          fill up before it is sent.
+    """
+    self._adwords_client = adwords_client
+    self._method = getattr(service, method_name)
+    self._max_operations = max_operations
+    self._max_delay = max_delay
+    self._batches = {}
+    self._lock = threading.Lock()
+
+  def Mutate(self, operations):
+    """Submits operations and waits for their result.
+
+    Args:
+      operations: A list of operations for the service method.
+
+    Returns:
+      The result of the operations.
+    """
+    return self.Submit(operations).Result()
+
+  def Submit(self, operations):
+    """Submits operations to the batch for the current thread's customer.
+
+    Args:
+      operations: A list of operations for the service method.
+
+    Returns:
+      A MutateFuture for the result of the operations.
+    """
+    operations = list(operations)
+    future = MutateFuture()
+    client_customer_id = self._adwords_client.client_customer_id
+    with self._lock:
+      batch = self._batches.get(client_customer_id)
+      if batch is None:
+        batch = _MutateBatch(self._adwords_client._CopyCustomerScope())
+        self._batches[client_customer_id] = batch
+        batch.timer = threading.Timer(self._max_delay, self._SendIfPending,
+                                      (client_customer_id, batch))
+        batch.timer.daemon = True
+        batch.timer.start()
+      batch.callers.append((len(batch.operations), len(operations), future))
+      batch.operations.extend(operations)
+      is_full = len(batch.operations) >= self._max_operations
+      if is_full:
+        del self._batches[client_customer_id]
+        batch.timer.cancel()
+
+    if is_full:
+      self._Send(batch)
+    return future
+
+  def Flush(self):
+    """Sends all pending batches without waiting for them to fill up."""
+    with self._lock:
+      batches = self._batches.values()
+      self._batches = {}
+    for batch in batches:
+      batch.timer.cancel()
+      self._Send(batch)
+
+  def _SendIfPending(self, client_customer_id, batch):
+    """Sends a batch unless it has already been sent.
+
+    Args:
+      client_customer_id: The client customer ID the batch was collected for.
+      batch: The _MutateBatch to send.
+    """
+    with self._lock:
+      if self._batches.get(client_customer_id) is not batch:
+        return
+      del self._batches[client_customer_id]
+    self._Send(batch)
+
+  def _Send(self, batch):
+    """Sends a batch and passes the parts of its result to its callers.
+
+    Args:
+      batch: The _MutateBatch to send.
+    """
+    try:
+      with batch.customer_scope:
+        result = self._method(batch.operations)
+      caller_results = [
+          googleads.common._SplitChunkResult(result, start, count)
+          for start, count, _ in batch.callers]
+    except Exception as e:  # pylint: disable=broad-except
+      for _, _, future in batch.callers:
+        future._SetError(e)
+      return
+
+    for (_, _, future), caller_result in zip(batch.callers, caller_results):
+      future._SetResult(caller_result)
+
+
+class _MutateBatch(object):
+  """Operations collected by a MutateCoalescer to be sent as one call."""
+
+  def __init__(self, customer_scope):
+    """Initializes a _MutateBatch.
+
+    Args:
+      customer_scope: A context manager applying the customer scope of the
+          thread which created the batch.
+    """
+    self.customer_scope = customer_scope
+    self.operations = []
+    # (index of the caller's first operation, number of operations, future)
+    # tuples, in the order the operations were submitted.
+    self.callers = []
+    self.timer = None
+
+
+class MutateFuture(object):
+  """The pending result of operations submitted to a MutateCoalescer."""
+
+  def __init__(self):
+    """Initializes a MutateFuture."""
+    self._done = threading.Event()
+    self._result = None
+    self._error = None
+
+  def Done(self):
+    """Checks whether the result is available.
+
+    Returns:
+      A bool indicating whether the operations' batch has been sent.
+    """
+    return self._done.is_set()
+
+  def Result(self, timeout=None):
+    """Waits for the result of the operations.
+
+    Args:
+      [optional]
+      timeout: The maximum number of seconds to wait.
+
+    Returns:
+      The result of the operations.
+
+    Raises:
+      GoogleAdsError: If the result isn't available within the timeout.
+      Exception: The error raised by the call which sent the operations.
+    """
+    if not self._done.wait(timeout):
+      raise googleads.errors.GoogleAdsError(
+          'Timed out waiting for the result of the operations.')
+    if self._error is not None:
+      raise self._error
+    return self._result
+
+  def _SetResult(self, result):
+    self._result = result
+    self._done.set()
+
+  def _SetError(self, error):
+    self._error = error
+    self._done.set()
+
+
+@googleads.common.RegisterUtility('ReportFieldCatalog')
+class ReportFieldCatalog(object):
+  """A cache of the fields of report types, from ReportDefinitionService.
+
+  The fields of each (version, report type) pair are requested once and kept in
+  a least recently used cache in memory. If a cache directory is given, they
+  are also saved there and read back by later ReportFieldCatalogs, so the fields
+  are only requested once across processes. A ReportFieldCatalog may be shared
+  between threads and ReportDownloaders.
+
+  Each field is described by a dict holding the attributes of its
+  ReportDefinitionField, e.g. {'fieldName': 'Cost', 'fieldType': 'Money',
+  'canFilter': True, ...}.
+  """
+
+  def __init__(self, adwords_client, server=None,
+               max_size=_DEFAULT_REPORT_FIELD_CATALOG_SIZE, cache_dir=None):
+    """Initializes a ReportFieldCatalog.
+
+    Args:
+      adwords_client: The AdWordsClient used to call ReportDefinitionService.
+      [optional]
+      server: A string identifying the webserver hosting the AdWords API.
+      max_size: The number of report types whose fields are kept in memory.
+      cache_dir: A string containing the path of a directory to save fields in.
+          If not set, fields are only cached in memory.
+    """
+    self._adwords_client = adwords_client
+    self._server = server
+    self._max_size = max_size
+    self._cache_dir = cache_dir
+    self._fields = OrderedDict()
+    self._lock = threading.Lock()
+
+  def GetFields(self, report_type, version=sorted(_SERVICE_MAP.keys())[-1]):
+    """Returns the fields of a report type.
+
+    Args:
+      report_type: A string identifying the type of the report.
+      [optional]
+      version: A string identifying the AdWords version of the report type.
+
+    Returns:
+      A dict mapping the name of each field to a dict describing it.
+    """
+    key = (version, report_type)
+    with self._lock:
+      if key in self._fields:
+        fields = self._fields.pop(key)
+        self._fields[key] = fields
+        return fields
+
+    fields = self._LoadFields(version, report_type)
+    if fields is None:
+      report_definition_service = self._adwords_client.GetService(
+          'ReportDefinitionService', version, self._server)
+      fields = dict((field['fieldName'], _GetReportFieldInfo(field)) for field
+                    in report_definition_service.getReportFields(report_type))
+      self._SaveFields(version, report_type, fields)
+
+    with self._lock:
+      self._fields[key] = fields
+      while len(self._fields) > self._max_size:
+        self._fields.popitem(last=False)
+    return fields
+
+  def GetField(self, report_type, field_name,
+               version=sorted(_SERVICE_MAP.keys())[-1]):
+    """Returns the description of a field of a report type.
+
+    Args:
+      report_type: A string identifying the type of the report.
+      field_name: A string containing the name of the field.
+      [optional]
+      version: A string identifying the AdWords version of the report type.
+
+    Returns:
+      A dict describing the field.
+
+    Raises:
+      GoogleAdsValueError: If the report type has no such field.
+    """
+    try:
+      return self.GetFields(report_type, version)[field_name]
+    except KeyError:
+      raise googleads.errors.GoogleAdsValueError(
+          'Report type %s has no field %s.' % (report_type, field_name))
+
+  def GetFieldTypes(self, report_type, version=sorted(_SERVICE_MAP.keys())[-1]):
+    """Returns the fieldType of each field of a report type.
+
+    Args:
+      report_type: A string identifying the type of the report.
+      [optional]
+      version: A string identifying the AdWords version of the report type.
+
+    Returns:
+      A dict mapping the name of each field to its fieldType.
+    """
+    return dict((field_name, field.get('fieldType')) for field_name, field
+                in self.GetFields(report_type, version).items())
+
+  def GetEnumValues(self, report_type, field_name,
+                    version=sorted(_SERVICE_MAP.keys())[-1]):
+    """Returns the values an enum field of a report type can take.
+
+    Args:
+      report_type: A string identifying the type of the report.
+      field_name: A string containing the name of the field.
+      [optional]
+      version: A string identifying the AdWords version of the report type.
+
+    Returns:
+      A list of the enum values, which is empty if the field isn't an enum.
+
+    Raises:
+      GoogleAdsValueError: If the report type has no such field.
+    """
+    return list(self.GetField(report_type, field_name, version).get(
+        'enumValues') or [])
+
+  def CanFilter(self, report_type, field_name,
+                version=sorted(_SERVICE_MAP.keys())[-1]):
+    """Returns whether a field of a report type can be used in predicates.
+
+    Args:
+      report_type: A string identifying the type of the report.
+      field_name: A string containing the name of the field.
+      [optional]
+      version: A string identifying the AdWords version of the report type.
+
+    Returns:
+      A boolean indicating whether the field can be filtered on.
+
+    Raises:
+      GoogleAdsValueError: If the report type has no such field.
+    """
+    return bool(self.GetField(report_type, field_name, version).get(
+        'canFilter'))
+
+  def _GetCachePath(self, version, report_type):
+    return os.path.join(self._cache_dir, '%s_%s.json' % (version, report_type))
+
+  def _LoadFields(self, version, report_type):
+    """Reads the fields of a report type from the cache directory.
+
+    Args:
+      version: A string identifying the AdWords version of the report type.
+      report_type: A string identifying the type of the report.
+
+    Returns:
+      A dict of the report type's fields, or None if they are not saved.
+    """
+    if not self._cache_dir:
+      return None
+
+    try:
+      with open(self._GetCachePath(version, report_type)) as cache_file:
+        return json.load(cache_file)
+    except (IOError, ValueError):
+      return None
+
+  def _SaveFields(self, version, report_type, fields):
+    """Writes the fields of a report type to the cache directory, if set.
+
+    Args:
+      version: A string identifying the AdWords version of the report type.
+      report_type: A string identifying the type of the report.
+      fields: A dict of the report type's fields.
+    """
+    if not self._cache_dir:
+      return
+
+    with googleads.common.WriteFileAtomically(
+        self._GetCachePath(version, report_type)) as cache_file:
+      json.dump(fields, cache_file)
+
+
+class ReportCache(object):
+  """A size bounded cache of downloaded reports on local disk.
+
+  Reports are stored gzipped, one file per report, and the least recently used
+  reports are removed once the files' total size exceeds the maximum size. A
+  ReportCache may be shared between threads and ReportDownloaders, and its
+  directory between processes.
+  """
+
+  def __init__(self, cache_dir, max_size=_DEFAULT_REPORT_CACHE_MAX_SIZE):
+    """Initializes a ReportCache.
+
+    Args:
+      cache_dir: A string containing the path of the directory to store reports
+          in. It is created if it doesn't exist.
+      [optional]
+      max_size: The total size in bytes of the compressed reports to keep.
+    """
+    if not os.path.isdir(cache_dir):
+      os.makedirs(cache_dir)
+    self._cache_dir = cache_dir
+    self._max_size = max_size
+    self._lock = threading.Lock()
+
+  def Open(self, key):
+    """Opens a cached report.
+
+    Args:
+      key: A string identifying the report.
+
+    Returns:
+      A file-like object reading the uncompressed report, or None if the report
+      is not cached.
+    """
+    path = self._GetPath(key)
+    try:
+      # The modification time of a report marks when it was last used.
+      os.utime(path, None)
+      return gzip.open(path, 'rb')
+    except (IOError, OSError):
+      return None
+
+  def Put(self, key, stream):
+    """Reads a report into the cache, evicting old reports if needed.
+
+    The report itself is never evicted by its own Put, even if it is larger than
+    the maximum size, and it is opened before any eviction so that it can be
+    read even if another thread or process evicts it.
+
+    Args:
+      key: A string identifying the report.
+      stream: A file-like object to read the report from.
+
+    Returns:
+      A file-like object reading the uncompressed report. The caller is
+      responsible for closing it.
+    """
+    path = self._GetPath(key)
+    with googleads.common.WriteFileAtomically(path, 'wb') as cache_file:
+      with contextlib.closing(gzip.GzipFile(fileobj=cache_file,
+                                            mode='wb')) as gzip_file:
+        for chunk in _ReadChunks(stream):
+          gzip_file.write(chunk)
+    cached_report = gzip.open(path, 'rb')
+    self._Evict(path)
+    return cached_report
+
+  def _Evict(self, kept_path):
+    """Removes the least recently used reports until under the maximum size.
+
+    Args:
+      kept_path: A string containing the path of a report not to remove.
+    """
+    with self._lock:
+      reports = []
+      for file_name in os.listdir(self._cache_dir):
+        if file_name.endswith(_REPORT_CACHE_SUFFIX):
+          path = os.path.join(self._cache_dir, file_name)
+          try:
+            stat = os.stat(path)
+          except OSError:
+            continue
+          reports.append((stat.st_mtime, stat.st_size, path))
+
+      total_size = sum(size for _, size, _ in reports)
+      for _, size, path in sorted(reports):
+        if total_size <= self._max_size:
+          break
+        if path == kept_path:
+          continue
+        try:
+          os.remove(path)
+        except OSError:
+          pass
+        total_size -= size
+
+  def _GetPath(self, key):
+    return os.path.join(self._cache_dir, key + _REPORT_CACHE_SUFFIX)
+
+
 @googleads.common.RegisterUtility(
     'ReportDownloader', {'DownloadReport': 'File',
+                         'DownloadReportAsColumns': 'Columns',
+                         'DownloadReportAsColumnsWithAwql': 'Columns',
                          'DownloadReportWithAwql': 'File',
                          'DownloadReportAsStream': 'Stream',
                          'DownloadReportAsStreamWithAwql': 'Stream',
                          'DownloadReportAsString': 'String',
-                         'DownloadReportAsStringWithAwql': 'String'})
+                         'DownloadReportAsStringWithAwql': 'String',
+                         'IterReportRows': 'Rows'})
 class ReportDownloader(object):
   """A utility that can be used to download reports from AdWords."""
 
@@ -1136,7 +2340,7 @@ class ReportDownloader(object):
   _REPORT_DEFINITION_NAME = 'reportDefinition'
 
   def __init__(self, adwords_client, version=sorted(_SERVICE_MAP.keys())[-1],
-               server=None):
+               server=None, report_field_catalog=None, report_cache=None):
     """Initializes a ReportDownloader.
 
     Args:
@@ -1147,12 +2351,25 @@ class ReportDownloader(object):
           defaults to what is currently the latest version. This will be updated
           in future releases to point to what is then the latest version.
       server: A string identifying the webserver hosting the AdWords API.
+      report_field_catalog: A ReportFieldCatalog used to look up the types of
+          report fields. Share one between ReportDownloaders to request the
+          fields of each report type only once. If not set, the
+          ReportDownloader will use its own.
+      report_cache: A ReportCache to store downloaded reports in. Only reports
+          over a fixed date range that ended before today, a CUSTOM_DATE range
+          or an AWQL "DURING <min>,<max>" clause, are cached. If not set,
+          reports are never cached.
     """
     if not server:
       server = _DEFAULT_ENDPOINT
 
     server = server.rstrip('/')
     self._adwords_client = adwords_client
+    self._version = version
+    self._server = server
+    self._report_field_catalog = (
+        report_field_catalog or ReportFieldCatalog(adwords_client, server))
+    self._report_cache = report_cache
     self._namespace = self._NAMESPACE_FORMAT % version
     self._end_point = self._END_POINT_FORMAT % (server, version)
     self._header_handler = _AdWordsHeaderHandler(
@@ -1160,17 +2377,41 @@ class ReportDownloader(object):
     self.proxy_config = self._adwords_client.proxy_config
     self.url_opener = urllib2.build_opener(*self.proxy_config.GetHandlers())
 
-    schema_url = self._SCHEMA_FORMAT % (server, version)
-    schema = suds.client.Client(
-        schema_url,
-        doctor=suds.xsd.doctor.ImportDoctor(suds.xsd.doctor.Import(
-            self._namespace, schema_url)),
-        transport=self.proxy_config.GetSudsProxyTransport(),
-        cache=self._adwords_client.cache).wsdl.schema
+    schema = self._GetReportSchema(server, version)
     self._report_definition_type = schema.elements[
         (self._REPORT_DEFINITION_NAME, self._namespace)]
+    # The marshaller keeps state while serializing, so it isn't shared.
     self._marshaller = suds.mx.literal.Literal(schema)
 
+  def _GetReportSchema(self, server, version):
+    """Retrieves the parsed report definition schema for a server and version.
+
+    The schema is downloaded and parsed once per process, and shared by all
+    ReportDownloaders. If the AdWordsClient's cache is a suds.cache.ObjectCache,
+    the parsed schema is also stored in it, so new processes can skip parsing.
+
+    Args:
+      server: A string identifying the webserver hosting the AdWords API.
+      version: A string identifying the AdWords version to connect to.
+
+    Returns:
+      The suds.xsd.schema.Schema describing report definitions.
+    """
+    key = (server, version)
+    with _REPORT_SCHEMA_LOCK:
+      if key not in _REPORT_SCHEMAS:
+        schema_url = self._SCHEMA_FORMAT % (server, version)
+        kwargs = {'cache': self._adwords_client.cache}
+        if isinstance(self._adwords_client.cache, suds.cache.ObjectCache):
+          kwargs['cachingpolicy'] = 1
+        _REPORT_SCHEMAS[key] = suds.client.Client(
+            schema_url,
+            doctor=suds.xsd.doctor.ImportDoctor(suds.xsd.doctor.Import(
+                self._namespace, schema_url)),
+            transport=self.proxy_config.GetSudsProxyTransport(),
+            **kwargs).wsdl.schema
+      return _REPORT_SCHEMAS[key]
+
   def _DownloadReportCheckFormat(self, file_format, output):
     mode = getattr(output, 'mode', 'w')
     is_valid_gzip_mode = 'b' in mode and ('+' in mode or 'w' in mode)
@@ -1224,6 +2465,148 @@ class ReportDownloader(object):
     self._DownloadReport(self._SerializeReportDefinition(report_definition),
                          output, **kwargs)
 
+  def DownloadReportAsColumns(self, report_definition, **kwargs):
+    """Downloads an AdWords report using a report definition.
+
+    The report contents will be returned as typed columns. Numeric and boolean
+    columns are stored as numpy arrays if numpy is installed, or array.array
+    otherwise. See googleads.common.ToColumnArray for details.
+
+    Args:
+      report_definition: A dictionary or instance of the ReportDefinition class
+          generated from the schema. This defines the contents of the report
+          that will be downloaded. The downloadFormat is ignored.
+      **kwargs: Optional keyword arguments.
+
+    Keyword Arguments:
+      client_customer_id: A string containing a client_customer_id intended to
+        override the default value set for the client.
+      include_zero_impressions: A boolean indicating whether the report should
+        show rows with zero impressions.
+      use_raw_enum_values: A boolean indicating whether to return enum field
+          values as enums instead of display values.
+
+    Returns:
+      An OrderedDict mapping each of the report's field names to its values.
+
+    Raises:
+      AdWordsReportBadRequestError: if the report download fails due to
+          improper input.
+      AdWordsReportError: if the request fails for any other reason; e.g. a
+          network error.
+    """
+    report_definition = dict(report_definition)
+    report_definition['downloadFormat'] = 'CSV'
+    return self._DownloadReportAsColumns(
+        self._SerializeReportDefinition(report_definition),
+        report_definition['reportType'],
+        report_definition['selector']['fields'], **kwargs)
+
+  def DownloadReportAsColumnsWithAwql(self, query, **kwargs):
+    """Downloads an AdWords report using an AWQL query.
+
+    The report contents will be returned as typed columns. Numeric and boolean
+    columns are stored as numpy arrays if numpy is installed, or array.array
+    otherwise. See googleads.common.ToColumnArray for details.
+
+    Args:
+      query: A string containing the query which specifies the data you want
+          your report to include.
+      **kwargs: Optional keyword arguments.
+
+    Keyword Arguments:
+      client_customer_id: A string containing a client_customer_id intended to
+        override the default value set for the client.
+      include_zero_impressions: A boolean indicating whether the report should
+        show rows with zero impressions.
+      use_raw_enum_values: A boolean indicating whether to return enum field
+          values as enums instead of display values.
+
+    Returns:
+      An OrderedDict mapping each of the report's field names to its values.
+
+    Raises:
+      AdWordsReportBadRequestError: if the report download fails due to
+          improper input.
+      GoogleAdsValueError: if the query's fields or report type can't be
+          determined.
+      AdWordsReportError: if the request fails for any other reason; e.g. a
+          network error.
+    """
+    report_type, fields = self._ParseAwqlQuery(query)
+    return self._DownloadReportAsColumns(
+        self._SerializeAwql(query, 'CSV'), report_type, fields, **kwargs)
+
+  def IterReportRows(self, report_definition_or_query, file_format=None,
+                     as_namedtuples=False, **kwargs):
+    """Downloads an AdWords report and iterates over its typed rows.
+
+    The report is parsed while it is downloaded, so rows can be processed
+    without holding the whole report in memory. Each value is parsed according
+    to the fieldType of its field, as given by the ReportDefinitionService:
+    numbers, money in micros, percentages and booleans are converted and other
+    fields, such as enums, are returned as unicode strings. Values that are not
+    set are returned as None. The report header, column header and summary rows
+    are omitted by the server.
+
+    Args:
+      report_definition_or_query: A string containing an AWQL query, or a
+          dictionary or instance of the ReportDefinition class generated from
+          the schema, defining the contents of the report.
+      [optional]
+      file_format: A string representing the format to download the report in;
+          one of CSV, TSV, XML, GZIPPED_CSV or GZIPPED_XML. Defaults to the
+          downloadFormat of the report definition, or CSV.
+      as_namedtuples: A boolean indicating whether to yield namedtuples with an
+          attribute per field rather than plain tuples.
+      **kwargs: Optional keyword arguments.
+
+    Keyword Arguments:
+      client_customer_id: A string containing a client_customer_id intended to
+        override the default value set for the client.
+      include_zero_impressions: A boolean indicating whether the report should
+        show rows with zero impressions.
+      use_raw_enum_values: A boolean indicating whether to return enum field
+          values as enums instead of display values.
+
+    Returns:
+      An iterator over the report's rows, each a tuple of its values in the
+      order the fields were selected. The report is downloaded when iteration
+      begins.
+
+    Raises:
+      GoogleAdsValueError: if the file format can't be parsed, or the query's
+          fields or report type can't be determined.
+      AdWordsReportBadRequestError: if the report download fails due to
+          improper input.
+      AdWordsReportError: if the request fails for any other reason; e.g. a
+          network error.
+    """
+    if isinstance(report_definition_or_query, basestring):
+      file_format = file_format or 'CSV'
+      report_type, fields = self._ParseAwqlQuery(report_definition_or_query)
+      post_body = self._SerializeAwql(report_definition_or_query, file_format)
+    else:
+      report_definition = dict(report_definition_or_query)
+      file_format = (file_format or report_definition.get('downloadFormat') or
+                     'CSV')
+      report_definition['downloadFormat'] = file_format
+      report_type = report_definition['reportType']
+      fields = list(report_definition['selector']['fields'])
+      post_body = self._SerializeReportDefinition(report_definition)
+
+    if file_format not in _REPORT_ROW_FORMATS:
+      raise googleads.errors.GoogleAdsValueError(
+          'Unable to parse reports in the %s format. Supported formats: %s'
+          % (file_format, _REPORT_ROW_FORMATS))
+
+    column_types = self._GetReportColumnTypes(report_type, fields)
+    rows = self._IterReportRows(post_body, file_format, column_types, **kwargs)
+    if as_namedtuples:
+      row_class = namedtuple('ReportRow', fields)
+      return (row_class._make(row) for row in rows)
+    return rows
+
   def DownloadReportAsStream(self, report_definition, **kwargs):
     """Downloads an AdWords report using a report definition.
 
@@ -1537,15 +2920,170 @@ class ReportDownloader(object):
       AdWordsReportError: if the request fails for any other reason; e.g. a
           network error.
     """
+    headers = self._header_handler.GetReportDownloadHeaders(**kwargs)
+    cache_key = None
+    if self._report_cache and _IsReportFinal(post_body):
+      cache_key = self._GetReportCacheKey(post_body, headers)
+      cached_report = self._report_cache.Open(cache_key)
+      if cached_report:
+        return cached_report
+
     if sys.version_info[0] == 3:
       post_body = bytes(post_body, 'utf8')
-    request = urllib2.Request(
-        self._end_point, post_body,
-        self._header_handler.GetReportDownloadHeaders(**kwargs))
+    request = urllib2.Request(self._end_point, post_body, headers)
+    # The report is streamed to the caller, so only the time taken for the
+    # server to start responding is measured.
+    with googleads.metrics.MeasureCall(
+        'report_download', 'ReportDownloader', 'DownloadReport',
+        headers.get('clientCustomerId')) as measurement:
+      measurement.request_bytes = len(post_body)
+      try:
+        response = self.url_opener.open(request)
+      except urllib2.HTTPError as e:
+        raise self._ExtractError(e)
+
+    if cache_key:
+      try:
+        return self._report_cache.Put(cache_key, response)
+      finally:
+        response.close()
+    return response
+
+  def _DownloadReportAsColumns(self, post_body, report_type, fields,
+                               **kwargs):
+    """Downloads an AdWords report in CSV format, returning typed columns.
+
+    Args:
+      post_body: The contents of the POST request's body as a URL encoded
+          string. The report must be requested in the CSV format.
+      report_type: A string identifying the type of the report.
+      fields: A list of the names of the fields selected by the report, in the
+          order they were selected.
+      **kwargs: Optional keyword arguments. See DownloadReportAsColumns.
+
+    Returns:
+      An OrderedDict mapping each of the report's field names to its values.
+    """
+    column_types = self._GetReportColumnTypes(report_type, fields)
+    columns = [[] for _ in fields]
+
+    for row in self._IterReportRows(post_body, 'CSV', column_types, **kwargs):
+      for column, value in zip(columns, row):
+        column.append(value)
+
+    return OrderedDict(
+        (field, googleads.common.ToColumnArray(column, column_type))
+        for field, column_type, column in zip(fields, column_types, columns))
+
+  def _GetReportColumnTypes(self, report_type, fields):
+    """Returns the column types of the given fields of a report type.
+
+    Args:
+      report_type: A string identifying the type of the report.
+      fields: A list of the names of the fields selected by the report.
+
+    Returns:
+      A list of column types, as accepted by googleads.common.ToColumnArray, in
+      the order of the given fields.
+    """
+    field_types = self._GetReportFieldTypes(report_type)
+    return [_REPORT_FIELD_COLUMN_TYPES.get(field_types.get(field))
+            for field in fields]
+
+  def _IterReportRows(self, post_body, file_format, column_types, **kwargs):
+    """Downloads an AdWords report, parsing its rows as they are received.
+
+    Args:
+      post_body: The contents of the POST request's body as a URL encoded
+          string.
+      file_format: A string representing the format the report is requested
+          in; one of _REPORT_ROW_FORMATS.
+      column_types: A list of the column types of the fields.
+      **kwargs: Optional keyword arguments. See IterReportRows.
+
+    Yields:
+      A tuple of the parsed values of each row.
+    """
+    kwargs.update({'skip_report_header': True,
+                   'skip_column_header': True,
+                   'skip_report_summary': True})
+    response = self._DownloadReportAsStream(post_body, **kwargs)
     try:
-      return self.url_opener.open(request)
-    except urllib2.HTTPError as e:
-      raise self._ExtractError(e)
+      if file_format.startswith('GZIPPED_'):
+        chunks = _DecompressChunks(_ReadChunks(response))
+      else:
+        chunks = _ReadChunks(response)
+
+      if file_format.endswith('XML'):
+        rows = _ParseReportXmlRows(chunks)
+      else:
+        lines = _SplitLines(chunks)
+        if sys.version_info[0] == 3:
+          lines = codecs.iterdecode(lines, 'utf-8')
+        if file_format == 'TSV':
+          # TSV values are not quoted, so quote characters are kept as is.
+          rows = csv.reader(lines, delimiter='\t', quoting=csv.QUOTE_NONE)
+        else:
+          rows = csv.reader(lines)
+
+      for row in rows:
+        yield tuple(_ParseReportValue(value, column_type)
+                    for value, column_type in zip(row, column_types))
+    finally:
+      response.close()
+
+  def _GetReportCacheKey(self, post_body, headers):
+    """Computes the ReportCache key of a report request.
+
+    Args:
+      post_body: The contents of the POST request's body as a URL encoded
+          string.
+      headers: A dict of the request's headers.
+
+    Returns:
+      A string containing a hash of everything affecting the report's contents.
+    """
+    digest = hashlib.sha256()
+    parts = [self._end_point, post_body] + [
+        '%s=%s' % header for header in sorted(headers.items())
+        if header[0] in _REPORT_CACHE_KEY_HEADERS]
+    for part in parts:
+      digest.update(part.encode('utf-8'))
+      digest.update(b'\0')
+    return digest.hexdigest()
+
+  def _GetReportFieldTypes(self, report_type):
+    """Retrieves the types of the fields available to a report type.
+
+    Args:
+      report_type: A string identifying the type of the report.
+
+    Returns:
+      A dict mapping the name of each of the report type's fields to its
+      fieldType.
+    """
+    return self._report_field_catalog.GetFieldTypes(report_type, self._version)
+
+  def _ParseAwqlQuery(self, query):
+    """Extracts the report type and selected fields from an AWQL query.
+
+    Args:
+      query: A string representing the AWQL query used in the report.
+
+    Returns:
+      A (report_type, fields) tuple, where fields is a list of the names of the
+      selected fields in the order they were selected.
+
+    Raises:
+      GoogleAdsValueError: if the query isn't of the form "SELECT ... FROM ...".
+    """
+    match = _AWQL_SELECT_PATTERN.match(query)
+    if not match:
+      raise googleads.errors.GoogleAdsValueError(
+          'Unable to determine the fields and report type of AWQL query: %s'
+          % query)
+    return (match.group('report_type'),
+            [field.strip() for field in match.group('fields').split(',')])
 
   def _SerializeAwql(self, query, file_format):
     """Serializes an AWQL query and file format for transport.
@@ -1604,3 +3142,203 @@ class ReportDownloader(object):
         pass
     return googleads.errors.AdWordsReportError(
         error.code, error, content)
+
+
+def _ParseReportValue(value, column_type):
+  """Parses a value from a CSV report as the given column type.
+
+  Args:
+    value: A string containing the value as it appears in the report.
+    column_type: A string identifying the type to parse the value as; one of
+        "bool", "float", "int", or None to decode it as a unicode string.
+
+  Returns:
+    The parsed value, or None if the value is not set. Numeric values which
+    can't be parsed, such as "< 10%", are also returned as None.
+  """
+  if value in _REPORT_NULL_VALUES:
+    return None
+  elif column_type is None:
+    return value.decode('utf-8') if isinstance(value, bytes) else value
+  elif column_type == 'bool':
+    return value == 'true'
+
+  value = value.replace(',', '').rstrip('%')
+  try:
+    return int(value) if column_type == 'int' else float(value)
+  except ValueError:
+    return None
+
+
+def _IsReportFinal(post_body):
+  """Checks whether a report request covers a date range that has ended.
+
+  Args:
+    post_body: The contents of the POST request's body as a URL encoded string.
+
+  Returns:
+    True if the report has a fixed date range which ended long enough ago that
+    its contents can no longer change, False otherwise.
+  """
+  params = urlparse.parse_qs(post_body)
+  max_date = None
+  if '__rdquery' in params:
+    match = _AWQL_DURING_PATTERN.search(params['__rdquery'][0])
+    max_date = match and match.group('max')
+  elif '__rdxml' in params:
+    date_range_type = None
+    for element in ElementTree.fromstring(params['__rdxml'][0]).iter():
+      tag = element.tag.rpartition('}')[2]
+      if tag == 'dateRangeType':
+        date_range_type = element.text
+      elif tag == 'max':
+        max_date = element.text
+    if date_range_type != 'CUSTOM_DATE':
+      max_date = None
+
+  if not max_date:
+    return False
+  try:
+    max_date = datetime.datetime.strptime(max_date, '%Y%m%d').date()
+  except ValueError:
+    return False
+  return max_date <= datetime.date.today() - _REPORT_CACHE_MIN_AGE
+
+
+def _CountOperations(operations):
+  """Counts the operations uploaded for a batch job.
+
+  Args:
+    operations: A list where each element is a list of operations.
+
+  Returns:
+    The number of operations, or None if they can't be counted, e.g. because
+    they were given as generators.
+  """
+  try:
+    return sum(len(service_operations) for service_operations in operations)
+  except TypeError:
+    return None
+
+
+def _GetReportFieldInfo(field):
+  """Describes a ReportDefinitionField as a dict.
+
+  Args:
+    field: A ReportDefinitionField returned by ReportDefinitionService.
+
+  Returns:
+    A dict mapping the names of the field's attributes to their values.
+  """
+  info = {}
+  for attribute in _REPORT_FIELD_ATTRIBUTES:
+    try:
+      value = field[attribute]
+    except (AttributeError, KeyError):
+      continue
+    info[attribute] = list(value) if attribute == 'enumValues' else value
+  return info
+
+
+def _ReadChunks(stream):
+  """Reads a stream in chunks of _REPORT_READ_CHUNK_SIZE bytes.
+
+  Args:
+    stream: A file-like object to read from.
+
+  Yields:
+    The non-empty byte strings read from the stream, until it is exhausted.
+  """
+  while True:
+    chunk = stream.read(_REPORT_READ_CHUNK_SIZE)
+    if not chunk:
+      return
+    yield chunk
+
+
+def _DecompressChunks(chunks):
+  """Decompresses gzipped data as it is read.
+
+  Args:
+    chunks: An iterable of byte strings containing gzipped data.
+
+  Yields:
+    Byte strings of the decompressed data.
+  """
+  # Adding 16 to the window size makes zlib expect a gzip header and trailer.
+  decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+  for chunk in chunks:
+    data = decompressor.decompress(chunk)
+    if data:
+      yield data
+  data = decompressor.flush()
+  if data:
+    yield data
+
+
+def _SplitLines(chunks):
+  """Splits chunks of data into lines.
+
+  Args:
+    chunks: An iterable of byte strings.
+
+  Yields:
+    Each line in the data, including its line ending.
+  """
+  remainder = b''
+  for chunk in chunks:
+    lines = (remainder + chunk).split(b'\n')
+    remainder = lines.pop()
+    for line in lines:
+      yield line + b'\n'
+  if remainder:
+    yield remainder
+
+
+def _ParseReportXmlRows(chunks):
+  """Parses the rows of an XML report as it is read.
+
+  Args:
+    chunks: An iterable of byte strings containing the report.
+
+  Yields:
+    A list of the string values of each row, in the order of its columns.
+  """
+  target = _ReportXmlRowTarget()
+  parser = ElementTree.XMLParser(target=target)
+  for chunk in chunks:
+    parser.feed(chunk)
+    for row in target.PopRows():
+      yield row
+  parser.close()
+  for row in target.PopRows():
+    yield row
+
+
+class _ReportXmlRowTarget(object):
+  """An ElementTree parser target collecting the rows of an XML report."""
+
+  def __init__(self):
+    self._columns = []
+    self._rows = []
+
+  def start(self, tag, attrib):
+    if tag == 'column':
+      self._columns.append(attrib['name'])
+    elif tag == 'row':
+      self._rows.append([attrib.get(column, '') for column in self._columns])
+
+  def end(self, tag):
+    pass
+
+  def data(self, data):
+    pass
+
+  def close(self):
+    pass
+
+  def PopRows(self):
+    """Returns and forgets the rows parsed since the last call."""
+    rows = self._rows
+    self._rows = []
+    return rows
@@ -15,13 +15,25 @@
 """Common client library functions and classes used by all products."""
 
 
+import array
+import collections
+import contextlib
+import copy
+import ctypes
+import hashlib
 from functools import wraps
 import inspect
+import io
+import json
 import logging
 import os
+import Queue
+import re
 import ssl
 import sys
+import tempfile
 import threading
+import time
 import urllib2
 import warnings
 
@@ -29,13 +41,25 @@ import warnings
 import httplib2
 import socks
 import suds
+import suds.client
+import suds.options
+import suds.properties
+import suds.servicedefinition
+import suds.sudsobject
 import suds.transport.http
 import yaml
 
 import googleads.errors
+import googleads.metrics
 import googleads.oauth2
 import googleads.util
 
+try:
+  import numpy
+except ImportError:
+  # numpy is optional; typed columns fall back to array.array without it.
+  numpy = None
+
 try:
   import urllib2.HTTPSHandler
 except ImportError:
@@ -83,6 +107,45 @@ _PROXY_KEYS = ('host', 'port')
 # gzip encoded SOAP responses.
 ENABLE_COMPRESSION_KEY = 'enable_compression'
 
+# The array.array typecode of 64-bit ints. Python 2 has no 'q' typecode, and
+# 'l' is only 32 bits wide on some platforms, e.g. Windows; there it is None.
+try:
+  array.array('q')
+  _INT64_TYPECODE = 'q'
+except ValueError:
+  _INT64_TYPECODE = 'l' if array.array('l').itemsize >= 8 else None
+
+# The typecodes used to store typed columns, keyed by column type. The first
+# item is the numpy dtype, the second the array.array typecode used if numpy is
+# not installed, or None if the column is left as a list.
+_COLUMN_TYPECODES = {
+    'bool': ('bool', 'b'),
+    'float': ('float64', 'd'),
+    'int': ('int64', _INT64_TYPECODE)
+}
+
+# The maximum number of operations SudsServiceProxy.CallInChunks sends in one
+# request by default.
+_DEFAULT_CHUNK_OPERATIONS = 500
+# The maximum estimated size in bytes of the operations SudsServiceProxy.
+# CallInChunks sends in one request by default.
+_DEFAULT_CHUNK_BYTES = 4 * 1024 * 1024
+# The number of chunks SudsServiceProxy.CallInChunks sends concurrently by
+# default.
+_DEFAULT_CHUNK_WORKERS = 4
+# Matches the index of the operation at the start of an error's field path,
+# e.g. "operations[12].operand.name".
+_FIELD_PATH_INDEX_PATTERN = re.compile(r'^(?P<field>\w+)\[(?P<index>\d+)\]')
+
+# The flag of the Windows MoveFileEx function making it replace an existing
+# destination file.
+_MOVEFILE_REPLACE_EXISTING = 0x1
+
+# The number of responses a ResponseCache keeps in memory by default.
+_DEFAULT_RESPONSE_CACHE_SIZE = 1000
+# The suffix of the files a ResponseCache stores responses in.
+_RESPONSE_CACHE_SUFFIX = '.response'
+
 # Global variables used to enable and store utility usage stats.
 _utility_registry = googleads.util.UtilityRegistry()
 _UTILITY_REGISTER_YAML_KEY = 'include_utilities_in_user_agent'
@@ -448,6 +511,42 @@ def _IsSudsIterable(obj):
   return (obj and not isinstance(obj, basestring) and hasattr(obj, '__iter__'))
 
 
+def ToColumnArray(values, column_type=None):
+  """Packs a column of values into a compact, typed array.
+
+  If numpy is installed, a numpy.ndarray is returned. Otherwise, typed columns
+  are returned as an array.array and untyped columns as a list. Int columns are
+  also returned as a list where array.array can't hold 64-bit ints.
+
+  Args:
+    values: A list of the values in the column. None marks a missing value.
+    column_type: A string identifying the type of the values; one of "bool",
+      "float", or "int". If not set, the values are left untyped.
+
+  Returns:
+    A numpy.ndarray, array.array, or list containing the given values. Missing
+    values in an int column promote it to a float column in which they are
+    stored as NaN. Bool columns with missing values are left untyped.
+  """
+  if None in values:
+    if column_type in ('float', 'int'):
+      column_type = 'float'
+      values = [float('nan') if value is None else value for value in values]
+    else:
+      column_type = None
+
+  if column_type in _COLUMN_TYPECODES:
+    numpy_dtype, array_typecode = _COLUMN_TYPECODES[column_type]
+    if numpy:
+      return numpy.array(values, dtype=numpy_dtype)
+    elif array_typecode:
+      return array.array(array_typecode, values)
+    else:
+      return list(values)
+  else:
+    return numpy.array(values, dtype=object) if numpy else list(values)
+
+
 def IncludeUtilitiesInUserAgent(value):
   """Configures the logging of utilities in the User-Agent.
 
@@ -502,6 +601,24 @@ def RegisterUtility(utility_name, version_mapping=None):
   return ClassDecorator
 
 
+class _SoapMessageSizes(threading.local):
+  """The sizes of the last SOAP request and reply sent by each thread.
+
+  They are recorded by the transports created by ProxyConfig.
+  """
+
+  def __init__(self):
+    self.Reset()
+
+  def Reset(self):
+    """Forgets the sizes of the calling thread's last messages."""
+    self.request_bytes = None
+    self.response_bytes = None
+
+
+_soap_message_sizes = _SoapMessageSizes()
+
+
 class ProxyConfig(object):
   """A utility for configuring the usage of a proxy."""
 
@@ -644,6 +761,561 @@ class ProxyConfig(object):
 
       return return_handlers
 
+    def send(self, request):
+      """Sends a SOAP request, recording the sizes of the request and reply.
+
+      Args:
+        request: The suds.transport.Request to send.
+
+      Returns:
+        The suds.transport.Reply received, or None if the reply had no content.
+
+      Raises:
+        suds.transport.TransportError: If the request failed, e.g. with a SOAP
+            fault.
+      """
+      _soap_message_sizes.request_bytes = len(request.message)
+      try:
+        reply = suds.transport.http.HttpTransport.send(self, request)
+      except suds.transport.TransportError as e:
+        if e.fp:
+          # The body of the error, e.g. a SOAP fault, is read again by suds.
+          body = e.fp.read()
+          e.fp = io.BytesIO(body)
+          _soap_message_sizes.response_bytes = len(body)
+        raise
+      if reply:
+        _soap_message_sizes.response_bytes = len(reply.message)
+      return reply
+
+    def __deepcopy__(self, memo):
+      """Creates a copy of this transport with its own handlers and options.
+
+      Handlers are attached to the opener they're installed in, so each copy
+      needs its own to be used concurrently with the original.
+
+      Args:
+        memo: The memo dictionary used by copy.deepcopy.
+
+      Returns:
+        A new _SudsProxyTransport configured like this one.
+      """
+      clone = self.__class__([copy.copy(handler) for handler in self.handlers])
+      suds.properties.Unskin(clone.options).update(
+          suds.properties.Unskin(self.options))
+      return clone
+
+
+class RateLimiter(object):
+  """Spaces out requests so that they are made at no more than a given rate.
+
+  A RateLimiter may be shared between threads.
+  """
+
+  def __init__(self, requests_per_second):
+    """Initializes a RateLimiter.
+
+    Args:
+      requests_per_second: A number indicating the maximum number of requests
+          that may be made per second.
+
+    Raises:
+      GoogleAdsValueError: If requests_per_second is not positive.
+    """
+    if requests_per_second <= 0:
+      raise googleads.errors.GoogleAdsValueError(
+          'requests_per_second must be positive. Given: %s'
+          % requests_per_second)
+    self._interval = 1.0 / requests_per_second
+    self._next_request_time = 0
+    self._lock = threading.Lock()
+
+  def Wait(self):
+    """Blocks until a request may be made under the configured rate."""
+    with self._lock:
+      now = time.time()
+      request_time = max(now, self._next_request_time)
+      self._next_request_time = request_time + self._interval
+    if request_time > now:
+      time.sleep(request_time - now)
+
+
+def RunConcurrently(function, items, max_workers, stop_on_error=False,
+                    thread_context=None, on_outcome=None, daemon=False):
+  """Calls a function with each of the given items on a pool of threads.
+
+  Args:
+    function: A callable taking an item as its only argument.
+    items: A list of the items to call the function with.
+    max_workers: The number of threads calling the function concurrently.
+    [optional]
+    stop_on_error: A boolean indicating whether to stop calling the function
+        once a call raised an exception.
+    thread_context: A callable returning a context manager which each thread
+        enters before calling the function. It is called on the calling thread,
+        so it may capture the calling thread's state.
+    on_outcome: A callable taking the index of an item and its outcome, called
+        on the worker thread as soon as the function returned for the item.
+    daemon: A boolean indicating whether the threads are daemon threads.
+
+  Returns:
+    A list holding, for each item, a (result, error) tuple with either the value
+    returned by the function or the exception it raised, or None if the
+    function was not called for the item or didn't complete.
+  """
+  pending_items = Queue.Queue()
+  for index, item in enumerate(items):
+    pending_items.put((index, item))
+  outcomes = [None] * len(items)
+  failed = []
+
+  def CallFunction(context):
+    with context:
+      while not (stop_on_error and failed):
+        try:
+          index, item = pending_items.get_nowait()
+        except Queue.Empty:
+          return
+        try:
+          outcome = (function(item), None)
+        except Exception as e:  # pylint: disable=broad-except
+          outcome = (None, e)
+          failed.append(index)
+        outcomes[index] = outcome
+        if on_outcome:
+          on_outcome(index, outcome)
+
+  threads = [threading.Thread(target=CallFunction,
+                              args=((thread_context or _NoContext)(),))
+             for _ in xrange(min(max_workers, len(items)))]
+  for thread in threads:
+    thread.daemon = daemon
+    thread.start()
+  for thread in threads:
+    thread.join()
+  return outcomes
+
+
+@contextlib.contextmanager
+def WriteFileAtomically(path, mode='w'):
+  """Writes a file so that other threads and processes never see it partially.
+
+  The file is written to a temporary file in the same directory, which replaces
+  the file at the given path once it has been written successfully. If writing
+  fails, the temporary file is removed and the file at the path is left as is.
+
+  Args:
+    path: A string containing the path of the file to write.
+    [optional]
+    mode: The mode to open the temporary file with, 'w' or 'wb'.
+
+  Yields:
+    The temporary file, open for writing.
+  """
+  directory, name = os.path.split(os.path.abspath(path))
+  fd, temp_path = tempfile.mkstemp(suffix='.tmp', prefix=name + '.',
+                                   dir=directory)
+  try:
+    with os.fdopen(fd, mode) as temp_file:
+      yield temp_file
+    _ReplaceFile(temp_path, path)
+  except:
+    try:
+      os.remove(temp_path)
+    except OSError:
+      pass
+    raise
+
+
+def _ReplaceFile(source_path, destination_path):
+  """Renames a file, replacing the destination file if it exists.
+
+  Args:
+    source_path: A string containing the path of the file to rename.
+    destination_path: A string containing the path to rename the file to.
+
+  Raises:
+    OSError: If the file could not be renamed.
+  """
+  if os.name != 'nt':
+    os.rename(source_path, destination_path)
+    return
+
+  # os.rename can't replace an existing file on Windows.
+  if not ctypes.windll.kernel32.MoveFileExW(
+      unicode(source_path), unicode(destination_path),
+      _MOVEFILE_REPLACE_EXISTING):
+    raise ctypes.WinError()
+
+
+class PartialFailureIndex(object):
+  """Indexes the partialFailureErrors of a mutate result by operation.
+
+  With partial failure enabled, the errors of the failed operations are
+  returned in the result's partialFailureErrors, each pointing at its operation
+  through a field path such as "operations[2].operand.name". A
+  PartialFailureIndex parses those field paths once, so that the errors of an
+  operation and whether it failed can be looked up by the operation's position.
+
+  SudsServiceProxy attaches a PartialFailureIndex to the results of SOAP calls
+  made with a list of operations as their partial_failure_index attribute.
+
+  Example:
+    result = campaign_service.mutate(operations)
+    for i, campaign in enumerate(result.value):
+      if result.partial_failure_index.failed[i]:
+        print result.partial_failure_index.GetErrors(i)
+  """
+
+  def __init__(self, partial_failure_errors, operation_count):
+    """Initializes a PartialFailureIndex.
+
+    Args:
+      partial_failure_errors: A list of the ApiErrors returned for the call, or
+          None.
+      operation_count: An int indicating the number of operations in the call.
+    """
+    self.operation_count = operation_count
+    # Errors whose field path doesn't point at an operation.
+    self.unindexed_errors = []
+    self._errors_by_operation = {}
+    # A list of bools indicating whether the operation at each index failed.
+    self.failed = [False] * operation_count
+    for error in partial_failure_errors or []:
+      index = _GetOperationIndex(error)
+      if index is None or index >= operation_count:
+        self.unindexed_errors.append(error)
+      else:
+        self._errors_by_operation.setdefault(index, []).append(error)
+        self.failed[index] = True
+
+  def GetErrors(self, index):
+    """Gets the errors of an operation.
+
+    Args:
+      index: An int indicating the position of the operation in the call.
+
+    Returns:
+      A list of the operation's ApiErrors, empty if it succeeded.
+    """
+    return list(self._errors_by_operation.get(index, []))
+
+  def IsFailed(self, index):
+    """Checks whether an operation failed.
+
+    Args:
+      index: An int indicating the position of the operation in the call.
+
+    Returns:
+      A bool indicating whether the operation failed.
+    """
+    return self.failed[index]
+
+  @property
+  def failed_indexes(self):
+    """A sorted list of the indexes of the failed operations."""
+    return sorted(self._errors_by_operation)
+
+  @property
+  def succeeded_indexes(self):
+    """A list of the indexes of the operations that succeeded."""
+    return [i for i, failed in enumerate(self.failed) if not failed]
+
+
+def _GetOperationIndex(error):
+  """Gets the index of the operation an ApiError points at.
+
+  Args:
+    error: An ApiError.
+
+  Returns:
+    An int indicating the index of the operation, or None if the error's field
+    path doesn't start with an index.
+  """
+  for element in getattr(error, 'fieldPathElements', None) or []:
+    if getattr(element, 'index', None) is not None:
+      return int(element.index)
+  field_path = getattr(error, 'fieldPath', None) or ''
+  match = _FIELD_PATH_INDEX_PATTERN.match(field_path)
+  return int(match.group('index')) if match else None
+
+
+def _AttachPartialFailureIndex(result, operation_count):
+  """Attaches a PartialFailureIndex to the result of a call with operations.
+
+  Args:
+    result: The result of the SOAP call.
+    operation_count: An int indicating the number of operations in the call.
+  """
+  if isinstance(result, suds.sudsobject.Object):
+    # Set through __dict__ so the index isn't added to the suds object's keys,
+    # which would include it when the result is printed or converted.
+    result.__dict__['partial_failure_index'] = PartialFailureIndex(
+        getattr(result, 'partialFailureErrors', None), operation_count)
+
+
+class ResponseCache(object):
+  """A read-through cache for SOAP calls which return slow-changing data.
+
+  Only calls to the methods given TTLs are cached. Responses are keyed by the
+  service's WSDL, which identifies the service and its version, the method, the
+  customer or network the call acts as and the call's arguments. The most
+  recently used responses are kept in memory and, if a cache directory is
+  given, all responses are also stored on disk, where they can be shared with
+  other processes. A ResponseCache may be shared between threads and services.
+
+  Example:
+    response_cache = ResponseCache({'getLanguageCriterion': 24 * 3600,
+                                    'LabelService.get': 600})
+  """
+
+  def __init__(self, ttls, max_size=_DEFAULT_RESPONSE_CACHE_SIZE,
+               cache_dir=None):
+    """Initializes a ResponseCache.
+
+    Args:
+      ttls: A dict mapping method names, optionally prefixed with the service
+          name, e.g. "LabelService.get", to the number of seconds their
+          responses are cached for. A method's entry with its service name takes
+          precedence over its entry without one.
+      [optional]
+      max_size: The number of responses kept in memory.
+      cache_dir: A string containing the path of a directory to also store
+          responses in. It is created if it doesn't exist.
+    """
+    self._ttls = ttls
+    self._max_size = max_size
+    self._cache_dir = cache_dir
+    if cache_dir and not os.path.isdir(cache_dir):
+      os.makedirs(cache_dir)
+    self._responses = collections.OrderedDict()
+    self._lock = threading.Lock()
+
+  def GetTtl(self, service_name, method_name):
+    """Gets how long the responses of a method are cached for.
+
+    Args:
+      service_name: A string identifying the service, e.g. "LabelService".
+      method_name: A string identifying the method, e.g. "get".
+
+    Returns:
+      The number of seconds the method's responses are cached for, or None if
+      they are not cached.
+    """
+    return self._ttls.get('%s.%s' % (service_name, method_name),
+                          self._ttls.get(method_name))
+
+  def Get(self, key):
+    """Gets a cached response.
+
+    Args:
+      key: A string identifying the call.
+
+    Returns:
+      A (bool indicating whether the response was cached, response) tuple. The
+      response is a copy, so it may be modified by the caller.
+    """
+    now = time.time()
+    with self._lock:
+      entry = self._responses.pop(key, None)
+      if entry is not None and entry[0] > now:
+        self._responses[key] = entry
+        return True, copy.deepcopy(entry[1])
+
+    if self._cache_dir:
+      entry = self._Load(key)
+      if entry is not None and entry[0] > now:
+        self._Remember(key, entry)
+        return True, copy.deepcopy(entry[1])
+    return False, None
+
+  def Put(self, key, response, ttl):
+    """Caches a response.
+
+    Args:
+      key: A string identifying the call.
+      response: The response of the call.
+      ttl: The number of seconds to cache the response for.
+    """
+    entry = (time.time() + ttl, copy.deepcopy(response))
+    self._Remember(key, entry)
+    if self._cache_dir:
+      self._Store(key, entry)
+
+  def Clear(self):
+    """Removes all cached responses, including those stored on disk."""
+    with self._lock:
+      self._responses.clear()
+    if self._cache_dir:
+      for file_name in os.listdir(self._cache_dir):
+        if file_name.endswith(_RESPONSE_CACHE_SUFFIX):
+          try:
+            os.remove(os.path.join(self._cache_dir, file_name))
+          except OSError:
+            pass
+
+  def _Remember(self, key, entry):
+    """Keeps a response in memory, evicting the least recently used one."""
+    with self._lock:
+      self._responses.pop(key, None)
+      self._responses[key] = entry
+      while len(self._responses) > self._max_size:
+        self._responses.popitem(last=False)
+
+  def _Load(self, key):
+    """Loads a (expiry time, response) entry from disk, or returns None."""
+    path = self._GetPath(key)
+    try:
+      with open(path) as cache_file:
+        expires, state = json.load(cache_file)
+      response = _FromJsonValue(state)
+    except (IOError, OSError, KeyError, TypeError, ValueError):
+      return None
+    if expires <= time.time():
+      try:
+        os.remove(path)
+      except OSError:
+        pass
+      return None
+    return expires, response
+
+  def _Store(self, key, entry):
+    """Stores a (expiry time, response) entry on disk, if it is serializable."""
+    expires, response = entry
+    try:
+      serialized = json.dumps([expires, _ToJsonValue(response)])
+    except (TypeError, ValueError):
+      _logger.debug('Not storing a response of type %s on disk, as it can\'t '
+                    'be serialized.', type(response).__name__)
+      return
+    with WriteFileAtomically(self._GetPath(key)) as cache_file:
+      cache_file.write(serialized)
+
+  def _GetPath(self, key):
+    return os.path.join(self._cache_dir, key + _RESPONSE_CACHE_SUFFIX)
+
+
+class SingleFlight(object):
+  """Shares one SOAP call between identical concurrent calls.
+
+  A call to one of the given methods made while an identical call is in flight,
+  with the same arguments and as the same customer or network, waits for that
+  call and receives its result instead of being sent. Only idempotent methods,
+  such as get methods, should be given. A SingleFlight may be shared between
+  threads and services.
+
+  The callers sharing a call each receive their own copy of its result. If the
+  call is interrupted by an error which isn't an Exception, such as
+  KeyboardInterrupt, the callers waiting for it make the call again.
+
+  Example:
+    single_flight = SingleFlight(['CampaignService.get',
+                                  'getLineItemsByStatement'])
+  """
+
+  def __init__(self, methods):
+    """Initializes a SingleFlight.
+
+    Args:
+      methods: A list of the names of the methods whose calls are shared,
+          optionally prefixed with the service name, e.g. "CampaignService.get".
+    """
+    self._methods = frozenset(methods)
+    self._calls = {}
+    self._lock = threading.Lock()
+
+  def IsShared(self, service_name, method_name):
+    """Checks whether calls to a method are shared.
+
+    Args:
+      service_name: A string identifying the service, e.g. "CampaignService".
+      method_name: A string identifying the method, e.g. "get".
+
+    Returns:
+      A bool indicating whether identical concurrent calls share one call.
+    """
+    return ('%s.%s' % (service_name, method_name) in self._methods or
+            method_name in self._methods)
+
+  def Do(self, key, function):
+    """Calls a function unless a call with the same key is in flight.
+
+    Args:
+      key: A string identifying the call.
+      function: A function making the call.
+
+    Returns:
+      The result of the call, made by this thread or another.
+
+    Raises:
+      Exception: The error raised by the call.
+    """
+    while True:
+      with self._lock:
+        call = self._calls.get(key)
+        is_leader = call is None
+        if is_leader:
+          call = _InFlightCall()
+          self._calls[key] = call
+
+      if is_leader:
+        break
+      call.done.wait()
+      if call.error is not None:
+        raise call.error
+      if not call.interrupted:
+        return copy.deepcopy(call.result)
+
+    call.interrupted = True
+    try:
+      call.result = function()
+      call.interrupted = False
+      return call.result
+    except Exception as e:
+      call.error = e
+      call.interrupted = False
+      raise
+    finally:
+      with self._lock:
+        del self._calls[key]
+      call.done.set()
+
+
+class _InFlightCall(object):
+  """A call made by SingleFlight, awaited by the callers sharing it."""
+
+  def __init__(self):
+    self.done = threading.Event()
+    self.result = None
+    self.error = None
+    # Whether the call ended with neither a result nor an Exception.
+    self.interrupted = False
+
+
+def _ToJsonValue(obj):
+  """Replaces the suds objects in a response with dicts JSON can store."""
+  # The classes of suds objects are created at runtime, so only their names
+  # are stored, and the classes are created again when the response is loaded.
+  if isinstance(obj, suds.sudsobject.Object):
+    return {'class': obj.__class__.__name__,
+            'items': [[key, _ToJsonValue(value)]
+                      for key, value in suds.sudsobject.items(obj)]}
+  elif isinstance(obj, list):
+    return [_ToJsonValue(item) for item in obj]
+  return obj
+
+
+def _FromJsonValue(obj):
+  """Rebuilds the suds objects of a response converted by _ToJsonValue."""
+  if isinstance(obj, dict):
+    suds_object = suds.sudsobject.Factory.object(str(obj['class']))
+    for key, value in obj['items']:
+      setattr(suds_object, str(key), _FromJsonValue(value))
+    return suds_object
+  elif isinstance(obj, list):
+    return [_FromJsonValue(item) for item in obj]
+  return obj
+
 
 class SudsServiceProxy(object):
   """Wraps a suds service object, allowing custom logic to be injected.
@@ -653,28 +1325,64 @@ class SudsServiceProxy(object):
   transforming SOAP call input parameters, allowing dictionary syntax to be used
   with all SOAP complex types.
 
+  A SudsServiceProxy may be shared between threads. Each thread makes its SOAP
+  calls through its own copy of the suds client, so that the headers set for a
+  call on one thread can't leak into a call on another. Each copy has its own
+  copy of the parsed WSDL, as suds reads the SOAP headers of a request from the
+  options of the WSDL.
+
   Attributes:
     suds_client: The suds.client.Client this service belongs to. If you are
         familiar with suds and want to use autogenerated classes, you can access
-        the client and its factory,
+        the client and its factory. Each thread is given its own client, so
+        options set on it only apply to SOAP calls made by the same thread.
+        Setting it replaces the client of the current thread, and the client
+        the other threads' clients are copied from.
   """
 
-  def __init__(self, suds_client, header_handler):
+  def __init__(self, suds_client, header_handler, response_cache=None,
+               single_flight=None):
     """Initializes a suds service proxy.
 
     Args:
       suds_client: The suds.client.Client whose service will be wrapped. Note
         that this is the client itself, not the client's embedded service
-        object.
+        object. It will be used by the thread creating this proxy, and copied
+        for any other threads using it.
       header_handler: A HeaderHandler responsible for setting the SOAP and HTTP
           headers on the service client.
+      [optional]
+      response_cache: A ResponseCache used to serve calls to the methods it has
+          TTLs for.
+      single_flight: A SingleFlight sharing identical concurrent calls to the
+          methods it was given.
     """
-    self.suds_client = suds_client
+    self._suds_client = suds_client
     self._header_handler = header_handler
+    self._response_cache = response_cache
+    self._single_flight = single_flight
     self._method_proxies = {}
+    self._thread_local = threading.local()
+    self._thread_local.suds_client = suds_client
+
+  @property
+  def suds_client(self):
+    """The suds.client.Client used for SOAP calls made by the current thread."""
+    suds_client = getattr(self._thread_local, 'suds_client', None)
+    if suds_client is None:
+      suds_client = _CloneSudsClient(self._suds_client)
+      self._thread_local.suds_client = suds_client
+    return suds_client
+
+  @suds_client.setter
+  def suds_client(self, suds_client):
+    self._suds_client = suds_client
+    # Drop the copies of the old client made for other threads.
+    self._thread_local = threading.local()
+    self._thread_local.suds_client = suds_client
 
   def __getattr__(self, attr):
-    if attr in self.suds_client.wsdl.services[0].ports[0].methods:
+    if attr in self._suds_client.wsdl.services[0].ports[0].methods:
       if attr not in self._method_proxies:
         self._method_proxies[attr] = self._CreateMethod(attr)
       return self._method_proxies[attr]
@@ -690,14 +1398,59 @@ class SudsServiceProxy(object):
     Returns:
       A callable that can be used to make the desired SOAP request.
     """
-    soap_service_method = getattr(self.suds_client.service, method_name)
+
+    service_name = self._suds_client.wsdl.services[0].name
+    ttl = None
+    if self._response_cache:
+      ttl = self._response_cache.GetTtl(service_name, method_name)
+    is_shared = bool(self._single_flight and
+                     self._single_flight.IsShared(service_name, method_name))
 
     def MakeSoapRequest(*args):
       """Perform a SOAP call."""
-      self._header_handler.SetHeaders(self.suds_client)
+      operation_count = None
+      if args and isinstance(args[0], (list, tuple)):
+        operation_count = len(args[0])
+
+      # Calls answered from the response cache or by SingleFlight are measured
+      # too, marked as cached, so that the metrics count every call made.
+      with googleads.metrics.MeasureCall(
+          'soap', service_name, method_name,
+          self._header_handler.GetRequestScope(),
+          operation_count) as measurement:
+        if ttl is None and not is_shared:
+          return MakeUncachedSoapRequest(measurement, *args)
+
+        key = self._GetRequestKey(method_name, args)
+        if ttl is not None:
+          is_cached, result = self._response_cache.Get(key)
+          if is_cached:
+            measurement.cached = True
+            return result
+        if is_shared:
+          def MakeSharedSoapRequest():
+            measurement.cached = False
+            return MakeUncachedSoapRequest(measurement, *args)
+
+          # Stays set unless this thread makes the call the others share.
+          measurement.cached = True
+          result = self._single_flight.Do(key, MakeSharedSoapRequest)
+        else:
+          result = MakeUncachedSoapRequest(measurement, *args)
+        if ttl is not None:
+          self._response_cache.Put(key, result, ttl)
+        return result
+
+    def MakeUncachedSoapRequest(measurement, *args):
+      """Perform a SOAP call without the response cache or SingleFlight."""
+      suds_client = self.suds_client
+      self._header_handler.SetHeaders(suds_client)
+      soap_service_method = getattr(suds_client.service, method_name)
+
+      _soap_message_sizes.Reset()
       try:
-        return soap_service_method(
-            *[_PackForSuds(arg, self.suds_client.factory) for arg in args])
+        result = soap_service_method(
+            *[_PackForSuds(arg, suds_client.factory) for arg in args])
       except suds.WebFault as e:
         _logger.error('Server raised fault in response.')
         _logger.info('Failure response:\n%s', e.document)
@@ -705,8 +1458,8 @@ class SudsServiceProxy(object):
         if not hasattr(e.fault, 'detail'):
           raise
 
-        # Before re-throwing the WebFault exception, an error object needs to be
-        # wrapped in a list for safe iteration.
+        # Before re-throwing the WebFault exception, an error object needs to
+        # be wrapped in a list for safe iteration.
         fault = e.fault.detail.ApiExceptionFault
         if not hasattr(fault, 'errors') or fault.errors is None:
           e.fault.detail.ApiExceptionFault.errors = []
@@ -717,9 +1470,269 @@ class SudsServiceProxy(object):
           fault.errors = [obj]
 
         raise
+      finally:
+        measurement.request_bytes = _soap_message_sizes.request_bytes
+        measurement.response_bytes = _soap_message_sizes.response_bytes
+
+      if measurement.operation_count is not None:
+        _AttachPartialFailureIndex(result, measurement.operation_count)
+      return result
 
     return MakeSoapRequest
 
+  def _GetRequestKey(self, method_name, args):
+    """Creates a key identifying a call and the responses it may receive.
+
+    Args:
+      method_name: A string identifying the SOAP method called.
+      args: A tuple of the arguments of the call.
+
+    Returns:
+      A string identifying the call.
+    """
+    call = json.dumps(
+        [self._suds_client.wsdl.url, method_name,
+         self._header_handler.GetRequestScope(), args],
+        sort_keys=True, default=repr)
+    return hashlib.sha256(call.encode('utf-8')).hexdigest()
+
+  def CallInChunks(self, method_name, operations,
+                   max_operations=_DEFAULT_CHUNK_OPERATIONS,
+                   max_bytes=_DEFAULT_CHUNK_BYTES,
+                   max_workers=_DEFAULT_CHUNK_WORKERS):
+    """Calls a SOAP method with a long list of operations, split into chunks.
+
+    The operations are split into chunks of at most max_operations operations
+    and max_bytes estimated bytes, in order, and the chunks are sent
+    concurrently. The results are merged back in the order of the operations:
+    lists, as returned by DFP create* and update* methods, are concatenated; for
+    results with a value list, such as AdWords ListReturnValues, the values are
+    concatenated and partialFailureErrors are merged with their field paths
+    pointing at the operations' indexes in the full list, and indexed by a
+    PartialFailureIndex over the full list.
+
+    Chunks are sent as separate requests, so they are not applied atomically.
+    With partial failure enabled, every chunk is sent and failed operations are
+    reported in the merged result. Otherwise, no more chunks are sent once a
+    chunk fails.
+
+    Example:
+      result = campaign_service.CallInChunks('mutate', operations)
+
+    Args:
+      method_name: A string identifying the SOAP method to call with each chunk
+          of operations as its only argument.
+      operations: A list of the operations, or the entities for DFP methods.
+      [optional]
+      max_operations: The maximum number of operations in each chunk.
+      max_bytes: The maximum estimated size of the operations in each chunk. A
+          chunk always holds at least one operation.
+      max_workers: The number of chunks sent concurrently.
+
+    Returns:
+      The merged result of all chunks.
+
+    Raises:
+      GoogleAdsChunkedRequestError: If any chunk failed.
+    """
+    method = getattr(self, method_name)
+    chunks = _SplitOperations(operations, max_operations, max_bytes)
+    # Calls made on the worker threads should be made with the same headers as
+    # calls made from the calling thread.
+    outcomes = RunConcurrently(
+        lambda chunk: method(chunk[1]), chunks, max_workers,
+        stop_on_error=True, thread_context=self._header_handler.CopyContext)
+    results = {}
+    errors = {}
+    for (start, _), outcome in zip(chunks, outcomes):
+      if outcome:
+        result, error = outcome
+        if error:
+          errors[start] = error
+        else:
+          results[start] = result
+
+    if errors:
+      raise googleads.errors.GoogleAdsChunkedRequestError(errors, results)
+    merged = _MergeChunkResults(
+        [(start, results[start]) for start, _ in chunks])
+    _AttachPartialFailureIndex(merged, len(operations))
+    return merged
+
+
+def _SplitOperations(operations, max_operations, max_bytes):
+  """Splits operations into chunks by count and estimated size.
+
+  Args:
+    operations: A list of operations.
+    max_operations: The maximum number of operations in each chunk.
+    max_bytes: The maximum estimated size of the operations in each chunk.
+
+  Returns:
+    A list of (index of the chunk's first operation, chunk) tuples.
+  """
+  chunks = []
+  chunk = []
+  chunk_bytes = 0
+  for operation in operations:
+    # The size of an operation's repr is a cheap proxy for the size of its XML.
+    operation_bytes = len(repr(operation))
+    if chunk and (len(chunk) >= max_operations or
+                  chunk_bytes + operation_bytes > max_bytes):
+      chunks.append(chunk)
+      chunk = []
+      chunk_bytes = 0
+    chunk.append(operation)
+    chunk_bytes += operation_bytes
+  if chunk:
+    chunks.append(chunk)
+
+  indexed_chunks = []
+  start = 0
+  for chunk in chunks:
+    indexed_chunks.append((start, chunk))
+    start += len(chunk)
+  return indexed_chunks
+
+
+def _MergeChunkResults(chunk_results):
+  """Merges the results of chunks of operations into one result.
+
+  Args:
+    chunk_results: A list of (index of the chunk's first operation, result)
+        tuples, in order.
+
+  Returns:
+    A list concatenating the chunks' results if they are lists or None, or the
+    first chunk's result with the value and partialFailureErrors lists of all
+    chunks, for those of the fields any chunk's result has.
+
+  Raises:
+    GoogleAdsValueError: If the results of several chunks have neither a value
+        nor a partialFailureErrors field.
+  """
+  results = [result for _, result in chunk_results]
+  if all(result is None or isinstance(result, list) for result in results):
+    return [item for result in results for item in result or []]
+  if len(results) == 1:
+    return results[0]
+
+  fields = [field for field in ('value', 'partialFailureErrors')
+            if any(hasattr(result, field) for result in results)]
+  if not fields:
+    raise googleads.errors.GoogleAdsValueError(
+        'Unable to merge the results of %d chunks of type %s, as they have no '
+        'value or partialFailureErrors field.'
+        % (len(results), type(results[0]).__name__))
+
+  merged = next(result for result in results if result is not None)
+  if 'value' in fields:
+    merged.value = [value for result in results
+                    for value in getattr(result, 'value', None) or []]
+  if 'partialFailureErrors' in fields:
+    partial_failure_errors = []
+    for start, result in chunk_results:
+      for error in getattr(result, 'partialFailureErrors', None) or []:
+        _OffsetFieldPath(error, start)
+        partial_failure_errors.append(error)
+    merged.partialFailureErrors = partial_failure_errors
+  return merged
+
+
+def _SplitChunkResult(result, start, count):
+  """Takes the part of a result which belongs to a chunk of its operations.
+
+  This is the reverse of _MergeChunkResults.
+
+  Args:
+    result: The result of a call with a list of operations.
+    start: The index of the chunk's first operation.
+    count: The number of operations in the chunk.
+
+  Returns:
+    The chunk's slice of the result if it is a list, None if it is None, or a
+    copy of the result with the chunk's values and the partialFailureErrors of
+    its operations, whose field paths point at the operations' indexes in the
+    chunk. Errors which don't point at an operation are kept in every chunk.
+  """
+  if result is None or isinstance(result, list):
+    return result and result[start:start + count]
+
+  chunk_result = copy.copy(result)
+  chunk_result.value = (getattr(result, 'value', None) or [])[
+      start:start + count]
+  if hasattr(result, 'partialFailureErrors'):
+    partial_failure_errors = []
+    for error in result.partialFailureErrors or []:
+      index = _GetOperationIndex(error)
+      if index is None:
+        partial_failure_errors.append(error)
+      elif start <= index < start + count:
+        # The result's errors are left as they are for the other chunks.
+        error = copy.deepcopy(error)
+        _OffsetFieldPath(error, -start)
+        partial_failure_errors.append(error)
+    chunk_result.partialFailureErrors = partial_failure_errors
+  _AttachPartialFailureIndex(chunk_result, count)
+  return chunk_result
+
+
+def _OffsetFieldPath(error, offset):
+  """Shifts the operation index in an error's field path by an offset.
+
+  Args:
+    error: An ApiError whose field path starts with an operation index, e.g.
+        "operations[2].operand".
+    offset: The number to add to the index.
+  """
+  if not offset:
+    return
+
+  field_path = getattr(error, 'fieldPath', None)
+  if field_path:
+    error.fieldPath = _FIELD_PATH_INDEX_PATTERN.sub(
+        lambda match: '%s[%d]' % (match.group('field'),
+                                  int(match.group('index')) + offset),
+        field_path, count=1)
+  for element in getattr(error, 'fieldPathElements', None) or []:
+    if getattr(element, 'index', None) is not None:
+      element.index = int(element.index) + offset
+      break
+
+
+def _CloneSudsClient(suds_client):
+  """Creates a copy of a suds client with its own options, transport and WSDL.
+
+  Unlike suds.client.Client.clone, the option values other than the transport
+  (e.g. the cache and plugins) are shared with the original client rather than
+  deep copied. The WSDL is deep copied, the way suds copies it out of its
+  object cache, since suds builds requests from the options of the WSDL rather
+  than those of the client.
+
+  Args:
+    suds_client: The suds.client.Client to copy.
+
+  Returns:
+    A suds.client.Client with its own copy of the given client's WSDL.
+  """
+  option_values = dict(suds.properties.Unskin(suds_client.options).defined)
+  option_values['transport'] = copy.deepcopy(suds_client.options.transport)
+  clone = copy.copy(suds_client)
+  clone.options = suds.options.Options()
+  suds.properties.Unskin(clone.options).update(option_values)
+  # The options of a WSDL aren't copied with it, see
+  # suds.wsdl.Definitions.__getstate__.
+  clone.wsdl = copy.deepcopy(suds_client.wsdl)
+  clone.wsdl.options = clone.options
+  for wsdl_import in clone.wsdl.imports:
+    wsdl_import.imported.options = clone.options
+  clone.factory = suds.client.Factory(clone.wsdl)
+  clone.service = suds.client.ServiceSelector(clone, clone.wsdl.services)
+  clone.sd = [suds.servicedefinition.ServiceDefinition(clone.wsdl, service)
+              for service in clone.wsdl.services]
+  clone.messages = dict(tx=None, rx=None)
+  return clone
+
 
 class HeaderHandler(object):
   """A generic header handler interface that must be subclassed by each API."""
@@ -728,6 +1741,29 @@ class HeaderHandler(object):
     """Sets the SOAP and HTTP headers on the given suds client."""
     raise NotImplementedError('You must subclass HeaderHandler.')
 
+  def CopyContext(self):
+    """Captures any per-thread state of the headers of the calling thread.
+
+    Returns:
+      A context manager which, when entered on another thread, makes the
+      headers set on that thread match those of the thread that called this.
+    """
+    return _NoContext()
+
+  def GetRequestScope(self):
+    """Identifies whose data the calling thread's requests act on.
+
+    Returns:
+      A JSON serializable value, such as an account ID, which differs between
+      requests whose responses may differ for the same arguments.
+    """
+    return None
+
+
+@contextlib.contextmanager
+def _NoContext():
+  yield
+
 
 class LoggingMessagePlugin(suds.plugin.MessagePlugin):
   """A MessagePlugin used to log request summaries."""
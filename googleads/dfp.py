@@ -15,10 +15,15 @@
 """Client library for the DoubleClick for Publishers API."""
 
 
+import collections
+import contextlib
 import csv
 import datetime
+import httplib
+import json
 import logging
 import os
+import threading
 import time
 import urllib2
 
@@ -28,6 +33,7 @@ import suds.transport
 
 import googleads.common
 import googleads.errors
+import googleads.metrics
 
 # The default application name.
 DEFAULT_APPLICATION_NAME = 'INSERT_APPLICATION_NAME_HERE'
@@ -37,6 +43,39 @@ DEFAULT_ENDPOINT = 'https://ads.google.com'
 SUGGESTED_PAGE_LIMIT = 500
 # The chunk size used for report downloads.
 _CHUNK_SIZE = 16 * 1024
+# The number of bytes downloaded by each Range request in a parallel download.
+_DOWNLOAD_RANGE_SIZE = 16 * 1024 * 1024
+# The number of concurrent connections used by default in a parallel download.
+_DEFAULT_DOWNLOAD_CONNECTIONS = 4
+# The number of times the download of a range is retried before giving up.
+_DOWNLOAD_MAX_RETRIES = 3
+# The number of seconds to wait before first polling a report job's status.
+# This doubles after every poll, up to _REPORT_POLL_MAX_INTERVAL.
+_REPORT_POLL_INITIAL_INTERVAL = 2
+# The maximum number of seconds to wait between polls of a report job's status.
+_REPORT_POLL_MAX_INTERVAL = 30
+# The number of pages IterByStatement fetches concurrently by default.
+_DEFAULT_PAGE_WORKERS = 4
+# The number of pages IterByStatement fetches ahead of the caller per worker.
+_PAGES_AHEAD_PER_WORKER = 2
+# The service and get*ByStatement method EntitySync uses for each entity type.
+_SYNC_ENTITY_METHODS = {
+    'AdUnit': ('InventoryService', 'getAdUnitsByStatement'),
+    'Company': ('CompanyService', 'getCompaniesByStatement'),
+    'Creative': ('CreativeService', 'getCreativesByStatement'),
+    'LineItem': ('LineItemService', 'getLineItemsByStatement'),
+    'Order': ('OrderService', 'getOrdersByStatement'),
+    'Proposal': ('ProposalService', 'getProposalsByStatement')
+}
+# How far before the watermark EntitySync looks for modified entities, to
+# allow for modifications committed out of order.
+_DEFAULT_SYNC_OVERLAP = datetime.timedelta(minutes=5)
+# The format of lastModifiedDateTime bind values and watermarks.
+_SYNC_DATE_TIME_FORMAT = '%Y-%m-%dT%H:%M:%S'
+# The number of IDs bound into each statement made by a BulkFilterStatement.
+_BULK_STATEMENT_BATCH_SIZE = SUGGESTED_PAGE_LIMIT
+# The number of statements a BulkFilterStatement runs concurrently by default.
+_DEFAULT_BULK_STATEMENT_WORKERS = 4
 # A giant dictionary of DFP versions and the services they support.
 _SERVICE_MAP = {
     'v201605':
@@ -199,7 +238,8 @@ class DfpClient(object):
 
   def __init__(self, oauth2_client, application_name, network_code=None,
                cache=None, proxy_config=None,
-               enable_compression=False):
+               enable_compression=False, response_cache=None,
+               single_flight=None):
     """Initializes a DfpClient.
 
     For more information on these arguments, see our SOAP headers guide:
@@ -221,6 +261,10 @@ class DfpClient(object):
       enable_compression: A boolean indicating if you want to enable compression
         of the SOAP response. If True, the SOAP response will use gzip
         compression, and will be decompressed for you automatically.
+      response_cache: A googleads.common.ResponseCache used to serve calls to
+          the methods it has TTLs for, or None if responses aren't cached.
+      single_flight: A googleads.common.SingleFlight sharing identical
+          concurrent calls to the methods it was given, or None.
     """
     if not application_name or (DEFAULT_APPLICATION_NAME in application_name):
       raise googleads.errors.GoogleAdsValueError(
@@ -231,6 +275,8 @@ class DfpClient(object):
     self.application_name = application_name
     self.network_code = network_code
     self.cache = cache
+    self.response_cache = response_cache
+    self.single_flight = single_flight
     self._header_handler = _DfpHeaderHandler(self, enable_compression)
     self.proxy_config = (proxy_config if proxy_config
                          else googleads.common.ProxyConfig())
@@ -289,7 +335,9 @@ class DfpClient(object):
             'Unrecognized version of the DFP API. Version given: %s Supported '
             'versions: %s' % (version, _SERVICE_MAP.keys()))
 
-    return googleads.common.SudsServiceProxy(client, self._header_handler)
+    return googleads.common.SudsServiceProxy(client, self._header_handler,
+                                             self.response_cache,
+                                             self.single_flight)
 
   def GetDataDownloader(self, version=sorted(_SERVICE_MAP.keys())[-1],
                         server=None):
@@ -351,6 +399,14 @@ class _DfpHeaderHandler(googleads.common.HeaderHandler):
         soapheaders=header,
         headers=http_headers)
 
+  def GetRequestScope(self):
+    """Identifies the network requests are made to.
+
+    Returns:
+      The network code used by requests.
+    """
+    return self._dfp_client.network_code
+
 
 class FilterStatement(object):
   """A statement object for PQL and get*ByStatement queries.
@@ -374,6 +430,237 @@ class FilterStatement(object):
             'values': self.values}
 
 
+class BulkFilterStatement(object):
+  """Selects entities by a large set of IDs, in batches of bind values.
+
+  The IDs are split into batches of at most batch_size. Each batch is selected
+  by its own FilterStatement of the form
+  "WHERE <id_field> IN (:bulkId0, :bulkId1, ...) [AND (<where_clause>)]", with
+  the IDs given as bind values, so that no statement exceeds the server's
+  limits.
+
+  Example:
+    statement = dfp.BulkFilterStatement(line_item_ids,
+                                        where_clause='status = :status',
+                                        values=status_values)
+    line_items = statement.Run(line_item_service.getLineItemsByStatement)
+  """
+
+  def __init__(self, ids, id_field='id', where_clause='', values=None,
+               batch_size=_BULK_STATEMENT_BATCH_SIZE):
+    """Initializes a BulkFilterStatement.
+
+    Args:
+      ids: An iterable of the IDs to select.
+      [optional]
+      id_field: A string containing the name of the field to match the IDs
+          against.
+      where_clause: A string containing a further condition the entities must
+          meet, with or without a leading "WHERE". It may not contain ORDER BY,
+          LIMIT or OFFSET clauses.
+      values: A list of the bind values used by the where clause.
+      batch_size: The maximum number of IDs in each statement.
+    """
+    self.ids = list(ids)
+    self.id_field = id_field
+    self.where_clause = where_clause.strip()
+    if self.where_clause[:6].upper() == 'WHERE ':
+      self.where_clause = self.where_clause[6:].strip()
+    self.values = list(values or [])
+    self.batch_size = batch_size
+
+  def ToFilterStatements(self):
+    """Returns a FilterStatement selecting each batch of IDs.
+
+    Returns:
+      A list of FilterStatements, one per batch of IDs.
+    """
+    statements = []
+    for start in xrange(0, len(self.ids), self.batch_size):
+      batch = self.ids[start:start + self.batch_size]
+      keys = ['bulkId%d' % index for index in xrange(len(batch))]
+      where_clause = 'WHERE %s IN (%s)' % (
+          self.id_field, ', '.join(':' + key for key in keys))
+      if self.where_clause:
+        where_clause = '%s AND (%s)' % (where_clause, self.where_clause)
+      values = self.values + [
+          {'key': key, 'value': {'xsi_type': 'NumberValue', 'value': entity_id}}
+          for key, entity_id in zip(keys, batch)]
+      statements.append(FilterStatement(where_clause, values))
+    return statements
+
+  def Run(self, get_by_statement,
+          max_workers=_DEFAULT_BULK_STATEMENT_WORKERS):
+    """Runs the statements through a get*ByStatement method and merges results.
+
+    Each statement is paged through until all of its results are retrieved.
+
+    Args:
+      get_by_statement: A get*ByStatement method of a DFP service, e.g.
+          line_item_service.getLineItemsByStatement.
+      [optional]
+      max_workers: The number of statements run concurrently.
+
+    Returns:
+      A list of the entities returned for all the statements, in the order of
+      the batches of IDs.
+    """
+    statements = self.ToFilterStatements()
+    outcomes = googleads.common.RunConcurrently(
+        lambda statement: _GetAllByStatement(get_by_statement, statement),
+        statements, max_workers, stop_on_error=True)
+    for outcome in outcomes:
+      if outcome and outcome[1]:
+        raise outcome[1]
+    batch_results = [results for results, _ in outcomes]
+    return [result for results in batch_results for result in results]
+
+
+class EntitySync(object):
+  """Fetches the DFP entities modified since they were last synced.
+
+  An EntitySync keeps a watermark for each network code and entity type: the
+  latest lastModifiedDateTime of the entities it has returned, but no later
+  than the time its last sync started. Each call to Sync passes the entities
+  modified since the watermark, less a small overlap, to a callback and
+  advances the watermark. The first sync of an entity type returns all of its
+  entities. Entities modified within the overlap may be returned again by the
+  next sync, so the callback should be idempotent. The overlap also covers
+  differences between the local clock, which is used to tell when a sync
+  started, and the clock of the DFP servers.
+
+  If a watermark path is given, the watermarks are saved there after each sync
+  and read back by later EntitySyncs.
+
+  Attributes:
+    watermarks: A dict mapping "<network code>:<entity type>" strings to the
+        watermarks, formatted as "YYYY-MM-DDTHH:MM:SS" in the network's time
+        zone.
+  """
+
+  def __init__(self, dfp_client, version=sorted(_SERVICE_MAP.keys())[-1],
+               server=None, watermark_path=None, overlap=_DEFAULT_SYNC_OVERLAP,
+               max_workers=_DEFAULT_PAGE_WORKERS):
+    """Initializes an EntitySync.
+
+    Args:
+      dfp_client: The DfpClient used to fetch entities. Its network code is
+          part of the watermarks' keys.
+      [optional]
+      version: A string identifying the DFP version to connect to. This defaults
+          to what is currently the latest version. This will be updated in
+          future releases to point to what is then the latest version.
+      server: A string identifying the webserver hosting the DFP API.
+      watermark_path: A string containing the path of the file to persist the
+          watermarks in. If not set, the watermarks are kept in memory only.
+      overlap: A datetime.timedelta to look back before the watermark.
+      max_workers: The number of pages of entities fetched concurrently.
+    """
+    self._dfp_client = dfp_client
+    self._version = version
+    self._server = server
+    self._watermark_path = watermark_path
+    self._overlap = overlap
+    self._max_workers = max_workers
+    self._lock = threading.Lock()
+    self._time_zones = {}
+    self.watermarks = {}
+    if watermark_path and os.path.exists(watermark_path):
+      with open(watermark_path) as watermark_file:
+        self.watermarks = json.load(watermark_file)
+
+  def Sync(self, entity_type, callback):
+    """Passes the entities modified since the last sync to a callback.
+
+    The watermark is only advanced once the callback has accepted every
+    entity, so a failed sync can be retried.
+
+    Args:
+      entity_type: A string identifying the type of entity to sync; one of
+          AdUnit, Company, Creative, LineItem, Order or Proposal.
+      callback: A callable taking each modified entity.
+
+    Returns:
+      The number of entities passed to the callback.
+
+    Raises:
+      GoogleAdsValueError: If the entity type can't be synced.
+    """
+    try:
+      service_name, method_name = _SYNC_ENTITY_METHODS[entity_type]
+    except KeyError:
+      raise googleads.errors.GoogleAdsValueError(
+          'Unable to sync entity type %s. Supported types: %s'
+          % (entity_type, sorted(_SYNC_ENTITY_METHODS.keys())))
+
+    key = '%s:%s' % (self._dfp_client.network_code, entity_type)
+    with self._lock:
+      watermark = self.watermarks.get(key)
+    sync_start = self._GetNetworkDateTime()
+
+    # Ordering by ID keeps the offsets of unmodified entities stable while
+    # paging. An entity modified during the sync may be on a page that was
+    # already fetched, so the watermark is never advanced past the start of the
+    # sync, and the next sync fetches it again.
+    if watermark:
+      since = (datetime.datetime.strptime(watermark, _SYNC_DATE_TIME_FORMAT) -
+               self._overlap).strftime(_SYNC_DATE_TIME_FORMAT)
+      statement = FilterStatement(
+          'WHERE lastModifiedDateTime >= :lastModifiedDateTime ORDER BY id ASC',
+          [{'key': 'lastModifiedDateTime',
+            'value': {'xsi_type': 'TextValue', 'value': since}}])
+    else:
+      statement = FilterStatement('ORDER BY id ASC')
+
+    service = self._dfp_client.GetService(service_name, self._version,
+                                          self._server)
+    count = 0
+    last_modified = None
+    for entity in IterByStatement(getattr(service, method_name), statement,
+                                  self._max_workers):
+      callback(entity)
+      count += 1
+      entity_modified = _FormatSyncDateTime(entity.lastModifiedDateTime)
+      if last_modified is None or entity_modified > last_modified:
+        last_modified = entity_modified
+
+    if last_modified:
+      new_watermark = min(last_modified, sync_start)
+      if watermark is None or new_watermark > watermark:
+        with self._lock:
+          self.watermarks[key] = new_watermark
+          self._SaveWatermarks()
+    return count
+
+  def _GetNetworkDateTime(self):
+    """Gets the current time in the time zone of the client's network.
+
+    Returns:
+      A string of the form "YYYY-MM-DDTHH:MM:SS".
+    """
+    network_code = self._dfp_client.network_code
+    with self._lock:
+      time_zone = self._time_zones.get(network_code)
+    if time_zone is None:
+      network = self._dfp_client.GetService(
+          'NetworkService', self._version, self._server).getCurrentNetwork()
+      time_zone = pytz.timezone(network.timeZone)
+      with self._lock:
+        self._time_zones[network_code] = time_zone
+    return datetime.datetime.fromtimestamp(time.time(), time_zone).strftime(
+        _SYNC_DATE_TIME_FORMAT)
+
+  def _SaveWatermarks(self):
+    """Writes the watermarks to the watermark path, if set."""
+    if not self._watermark_path:
+      return
+
+    # A failed write can't lose the previous watermarks.
+    with googleads.common.WriteFileAtomically(
+        self._watermark_path) as watermark_file:
+      json.dump(self.watermarks, watermark_file)
+
+
 class DataDownloader(object):
   """A utility that can be used to download reports and PQL result sets."""
 
@@ -401,6 +688,15 @@ class DataDownloader(object):
     self._pql_service = None
     self.proxy_config = self._dfp_client.proxy_config
     self.url_opener = urllib2.build_opener(*self.proxy_config.GetHandlers())
+    # Converters for PQL Values, keyed by the name of the Value type.
+    self._field_converters = {
+        'TextValue': self._ConvertTextForCsv,
+        'NumberValue': self._ConvertNumberForCsv,
+        'DateTimeValue': self._ConvertDateTimeToOffset,
+        'DateValue': self._ConvertDateForCsv
+    }
+    self._column_converters = {}
+    self._time_zones = {}
 
   def _GetReportService(self):
     """Lazily initializes a report service client."""
@@ -419,6 +715,10 @@ class DataDownloader(object):
   def WaitForReport(self, report_job):
     """Runs a report, then waits (blocks) for the report to finish generating.
 
+    The report job's status is polled at increasing intervals, starting at
+    _REPORT_POLL_INITIAL_INTERVAL seconds and backing off up to
+    _REPORT_POLL_MAX_INTERVAL seconds.
+
     Args:
       report_job: The report job to wait for. This may be a dictionary or an
           instance of the suds-generated ReportJob class.
@@ -429,29 +729,94 @@ class DataDownloader(object):
     Raises:
       A DfpReportError if the report job fails to complete.
     """
+    for report_job_id, status in self.WaitForReports([report_job]):
+      if status == 'FAILED':
+        raise googleads.errors.DfpReportError(report_job_id)
+
+    logging.debug('Report has completed successfully')
+    return report_job_id
+
+  def WaitForReports(self, report_jobs):
+    """Runs several reports, yielding each one as it finishes generating.
+
+    All of the report jobs are run up front, then the statuses of the ones that
+    are still pending are polled together at increasing intervals, starting at
+    _REPORT_POLL_INITIAL_INTERVAL seconds and backing off up to
+    _REPORT_POLL_MAX_INTERVAL seconds.
+
+    Args:
+      report_jobs: An iterable of the report jobs to run. Each may be a
+          dictionary or an instance of the suds-generated ReportJob class.
+
+    Yields:
+      A (report_job_id, status) tuple for each report job in the order they
+      finish, where status is either 'COMPLETED' or 'FAILED'.
+    """
     service = self._GetReportService()
-    report_job_id = service.runReportJob(report_job)['id']
+    pending_ids = [service.runReportJob(report_job)['id']
+                   for report_job in report_jobs]
+    poll_interval = _REPORT_POLL_INITIAL_INTERVAL
 
-    if self._version > 'v201502':
-      status = service.getReportJobStatus(report_job_id)
-    else:
-      status = service.getReportJob(report_job_id)['reportJobStatus']
+    while True:
+      still_pending_ids = []
+      for report_job_id in pending_ids:
+        status = self._GetReportJobStatus(report_job_id)
+        if status == 'COMPLETED' or status == 'FAILED':
+          yield report_job_id, status
+        else:
+          logging.debug('Report job %s status: %s', report_job_id, status)
+          still_pending_ids.append(report_job_id)
 
-    while status != 'COMPLETED' and status != 'FAILED':
-      logging.debug('Report job status: %s', status)
-      time.sleep(30)
-      if self._version > 'v201502':
-        status = service.getReportJobStatus(report_job_id)
+      pending_ids = still_pending_ids
+      if not pending_ids:
+        break
+
+      time.sleep(poll_interval)
+      poll_interval = min(poll_interval * 2, _REPORT_POLL_MAX_INTERVAL)
+
+  def DownloadReportsToFiles(self, report_jobs, export_format, get_outfile):
+    """Runs several reports, downloading each one as soon as it finishes.
+
+    Args:
+      report_jobs: An iterable of the report jobs to run. Each may be a
+          dictionary or an instance of the suds-generated ReportJob class.
+      export_format: The export format for the report files, as a string.
+      get_outfile: A function that accepts the ID of a completed report job and
+          returns a writeable, file-like object to write its report to.
+
+    Returns:
+      A dict mapping each report job's ID to its final status, either
+      'COMPLETED' or 'FAILED'. Failed reports are not downloaded.
+    """
+    statuses = {}
+
+    for report_job_id, status in self.WaitForReports(report_jobs):
+      statuses[report_job_id] = status
+      if status == 'COMPLETED':
+        self.DownloadReportToFile(report_job_id, export_format,
+                                  get_outfile(report_job_id))
       else:
-        status = service.getReportJob(report_job_id)['reportJobStatus']
+        logging.warning('Report job %s failed.', report_job_id)
+
+    return statuses
 
-    if status == 'FAILED':
-      raise googleads.errors.DfpReportError(report_job_id)
+  def _GetReportJobStatus(self, report_job_id):
+    """Retrieves the status of a report job.
+
+    Args:
+      report_job_id: The ID of the report job, as a string.
+
+    Returns:
+      The report job's status as a string, e.g. 'COMPLETED'.
+    """
+    service = self._GetReportService()
+    if self._version > 'v201502':
+      return service.getReportJobStatus(report_job_id)
     else:
-      logging.debug('Report has completed successfully')
-      return report_job_id
+      return service.getReportJob(report_job_id)['reportJobStatus']
 
-  def DownloadReportToFile(self, report_job_id, export_format, outfile):
+  def DownloadReportToFile(self, report_job_id, export_format, outfile,
+                           chunk_size=_CHUNK_SIZE):
     """Downloads report data and writes it to a file.
 
     The report job must be completed before calling this function.
@@ -460,14 +825,220 @@ class DataDownloader(object):
       report_job_id: The ID of the report job to wait for, as a string.
       export_format: The export format for the report file, as a string.
       outfile: A writeable, file-like object to write to.
+      [optional]
+      chunk_size: The number of bytes to read from the response at a time.
+    """
+    service = self._GetReportService()
+    report_url = service.getReportDownloadURL(report_job_id, export_format)
+    with self._MeasureReportDownload() as measurement:
+      response = self.url_opener.open(report_url)
+      measurement.response_bytes = self._CopyResponse(response, outfile,
+                                                      chunk_size)
+
+  def DownloadReportToPath(self, report_job_id, export_format, path,
+                           num_connections=_DEFAULT_DOWNLOAD_CONNECTIONS,
+                           range_size=_DOWNLOAD_RANGE_SIZE,
+                           chunk_size=_CHUNK_SIZE,
+                           max_retries=_DOWNLOAD_MAX_RETRIES):
+    """Downloads report data to a file using parallel HTTP Range requests.
+
+    The report is split into ranges of range_size bytes which are downloaded
+    over num_connections concurrent connections, and written in place into a
+    file preallocated to the size of the report. Each range is retried on its
+    own if its download fails. If the server doesn't support Range requests,
+    the report is downloaded over a single connection instead.
+
+    The report job must be completed before calling this function.
+
+    Args:
+      report_job_id: The ID of the report job to wait for, as a string.
+      export_format: The export format for the report file, as a string.
+      path: The path of the file to write the report to. It will be created or
+          overwritten.
+      [optional]
+      num_connections: The maximum number of ranges to download at once.
+      range_size: The number of bytes in each range.
+      chunk_size: The number of bytes to read from a response at a time.
+      max_retries: The number of times to retry downloading a range.
+
+    Raises:
+      A urllib2.URLError or httplib.HTTPException if a range could not be
+      downloaded after retrying, or any other error raised while downloading a
+      range.
     """
     service = self._GetReportService()
     report_url = service.getReportDownloadURL(report_job_id, export_format)
-    response = self.url_opener.open(report_url)
+    with self._MeasureReportDownload() as measurement:
+      with contextlib.closing(self._OpenReportRange(
+          report_url, 0, range_size - 1, max_retries,
+          measurement)) as response:
+        size = self._GetReportSize(response)
+        partial = response.getcode() == 206
+        if size is not None or not partial:
+          with open(path, 'wb') as outfile:
+            if size is not None:
+              outfile.truncate(size)
+            measurement.response_bytes = self._CopyResponse(
+                response, outfile, chunk_size)
+
+      if size is None:
+        if partial:
+          # The report can't be split into ranges without knowing its size, so
+          # download the whole report over a single connection instead.
+          with contextlib.closing(self.url_opener.open(report_url)) as response:
+            with open(path, 'wb') as outfile:
+              measurement.response_bytes = self._CopyResponse(
+                  response, outfile, chunk_size)
+        return
+
+      ranges = []
+      first_range_end = min(range_size, size) - 1
+      if measurement.response_bytes != first_range_end + 1:
+        # The first range was cut short, so download it again with the others.
+        logging.warning('Failed to download bytes 0-%d of report, retrying.',
+                        first_range_end)
+        ranges.append((0, first_range_end))
+      for start in xrange(range_size, size, range_size):
+        ranges.append((start, min(start + range_size, size) - 1))
+
+      def DownloadRange(report_range):
+        with open(path, 'r+b') as range_outfile:
+          return self._DownloadReportRange(
+              report_url, report_range[0], report_range[1], range_outfile,
+              chunk_size, max_retries)
+
+      outcomes = googleads.common.RunConcurrently(
+          DownloadRange, ranges, num_connections, stop_on_error=True)
+      # The whole report is measured as one download, so the bytes and retries
+      # of its ranges are added up.
+      for outcome in outcomes:
+        if outcome and outcome[0]:
+          range_bytes, range_retries = outcome[0]
+          measurement.response_bytes += range_bytes
+          measurement.retries += range_retries
+      for outcome in outcomes:
+        if outcome and outcome[1]:
+          raise outcome[1]
+
+  def _DownloadReportRange(self, report_url, start, end, outfile, chunk_size,
+                           max_retries):
+    """Downloads a range of a report into the same range of a file.
+
+    The whole range is downloaded again if any part of it fails, including if
+    fewer bytes than the range holds are received.
+
+    Args:
+      report_url: The URL to download the report from.
+      start: The offset of the first byte of the range.
+      end: The offset of the last byte of the range, inclusive.
+      outfile: A writeable, seekable file-like object to write to.
+      chunk_size: The number of bytes to read from the response at a time.
+      max_retries: The number of times to retry downloading the range.
+
+    Returns:
+      A (number of bytes downloaded, number of retries) tuple.
+
+    Raises:
+      A urllib2.URLError or httplib.HTTPException if the range could not be
+      downloaded after retrying.
+    """
+    for attempt in xrange(max_retries + 1):
+      try:
+        with contextlib.closing(self._OpenReportRange(
+            report_url, start, end, 0)) as response:
+          if response.getcode() != 206:
+            raise urllib2.URLError(
+                'Range request for bytes %d-%d of report returned status %s.'
+                % (start, end, response.getcode()))
+          outfile.seek(start)
+          size = self._CopyResponse(response, outfile, chunk_size)
+        if size != end - start + 1:
+          raise urllib2.URLError('Received %d of bytes %d-%d of report.'
+                                 % (size, start, end))
+        return size, attempt
+      except (IOError, httplib.HTTPException):
+        if attempt == max_retries:
+          raise
+        logging.warning('Failed to download bytes %d-%d of report, '
+                        'retrying.', start, end)
+
+  def _GetReportSize(self, response):
+    """Gets the size of a report from the response to a Range request.
+
+    Args:
+      response: The response to a Range request for the report.
+
+    Returns:
+      The size of the report in bytes, or None if the server didn't return a
+      range of the report or doesn't know the size of the report.
+    """
+    content_range = response.info().get('Content-Range')
+    if response.getcode() != 206 or not content_range:
+      return None
+    # Content-Range is of the form "bytes 0-1023/8192", or "bytes 0-1023/*" if
+    # the size of the report is unknown.
+    size = content_range.rsplit('/', 1)[1]
+    return int(size) if size.isdigit() else None
+
+  def _OpenReportRange(self, report_url, start, end, max_retries,
+                       measurement=None):
+    """Opens a download of a range of a report, retrying on failure.
+
+    Args:
+      report_url: The URL to download the report from.
+      start: The offset of the first byte of the range.
+      end: The offset of the last byte of the range, inclusive.
+      max_retries: The number of times to retry opening the range.
+      [optional]
+      measurement: The measurement of the download to count the retries in.
+
+    Returns:
+      The response to the Range request.
+
+    Raises:
+      A urllib2.URLError if the range could not be opened after retrying.
+    """
+    request = urllib2.Request(report_url,
+                              headers={'Range': 'bytes=%d-%d' % (start, end)})
+    for attempt in xrange(max_retries + 1):
+      if measurement:
+        measurement.retries = attempt
+      try:
+        return self.url_opener.open(request)
+      except IOError:
+        if attempt == max_retries:
+          raise
+        logging.warning('Failed to open bytes %d-%d of report, retrying.',
+                        start, end)
+
+  def _CopyResponse(self, response, outfile, chunk_size):
+    """Copies the body of an HTTP response to a file in chunks.
+
+    Args:
+      response: The response to read from.
+      outfile: A writeable, file-like object to write to.
+      chunk_size: The number of bytes to read from the response at a time.
+
+    Returns:
+      The number of bytes copied.
+    """
+    size = 0
     while True:
-      chunk = response.read(_CHUNK_SIZE)
+      chunk = response.read(chunk_size)
       if not chunk: break
       outfile.write(chunk)
+      size += len(chunk)
+    return size
+
+  def _MeasureReportDownload(self):
+    """Measures a report download for the registered MetricsListeners.
+
+    Returns:
+      A context manager yielding the download's measurement.
+    """
+    return googleads.metrics.MeasureCall(
+        'report_download', 'DataDownloader', 'DownloadReport',
+        self._dfp_client.network_code)
 
   def DownloadPqlResultToList(self, pql_query, values=None):
     """Downloads the results of a PQL query to a list.
@@ -486,6 +1057,40 @@ class DataDownloader(object):
     self._PageThroughPqlSet(pql_query, results.append, values)
     return results
 
+  def DownloadPqlResultToColumns(self, pql_query, values=None):
+    """Downloads the results of a PQL query to typed columns.
+
+    BooleanValue and NumberValue columns are stored as typed arrays; numpy
+    arrays if numpy is installed, array.array otherwise. See
+    googleads.common.ToColumnArray for details.
+
+    Args:
+      pql_query: str a statement filter to apply (the query should not include
+                 the limit or the offset)
+      [optional]
+      values: list dict of bind values to use with the pql_query.
+
+    Returns:
+      a collections.OrderedDict mapping each column's label to its values.
+    """
+    labels = []
+    columns = []
+
+    for header, entities in self._PageThroughPqlPages(pql_query, values):
+      if header is not None:
+        labels = [label['labelName'] for label in header]
+        columns = [[] for _ in labels]
+
+      for index, column in enumerate(
+          zip(*[entity['values'] for entity in entities])):
+        columns[index].extend(
+            [self._ConvertPqlValueForColumn(pql_value) for pql_value in column])
+
+    return collections.OrderedDict(
+        (label, googleads.common.ToColumnArray(
+            column, self._GetPqlColumnType(column)))
+        for label, column in zip(labels, columns))
+
   def DownloadPqlResultToCsv(self, pql_query, file_handle, values=None):
     """Downloads the results of a PQL query to CSV.
 
@@ -510,40 +1115,103 @@ class DataDownloader(object):
     Returns:
       str a CSV writer friendly value formatted by Value.Type.
     """
-    if 'value' in pql_value:
-      field = pql_value['value']
-    elif 'values' in pql_value:
-      field = pql_value['values']
-    else:
-      field = None
-
-    if field:
-      if isinstance(field, list):
-        if all(DfpClassType(single_field) == DfpClassType(field[0])
-               for single_field in field):
-          return ','.join([
-              '"%s"' % str(self._ConvertValueForCsv(single_field))
-              for single_field in field])
+    return self._GetPqlColumnConverter(DfpClassType(pql_value))(pql_value)
+
+  def _GetPqlColumnConverter(self, class_type):
+    """Returns a function converting Values of the given type for CSV output.
+
+    Converters are built once per Value type and cached, so that a column of a
+    PQL result set can be converted without re-dispatching on every cell.
+
+    Args:
+      class_type: str the class name of the Value objects to convert, e.g.
+                  'TextValue'.
+
+    Returns:
+      A function that accepts a single Value of the given type and returns a
+      CSV writer friendly value.
+    """
+    if class_type not in self._column_converters:
+      field_converter = self._field_converters.get(class_type)
+
+      def ConvertValue(pql_value):
+        if 'value' in pql_value:
+          field = pql_value['value']
+        elif 'values' in pql_value:
+          field = pql_value['values']
         else:
-          raise googleads.errors.GoogleAdsValueError(
-              'The set value returned contains unsupported mix value types')
-
-      class_type = DfpClassType(pql_value)
-
-      if class_type == 'TextValue':
-        return field.replace('"', '""').encode('UTF8')
-      elif class_type == 'NumberValue':
-        return float(field) if '.' in field else int(field)
-      elif class_type == 'DateTimeValue':
-        return self._ConvertDateTimeToOffset(field)
-      elif class_type == 'DateValue':
-        return datetime.date(int(field['date']['year']),
-                             int(field['date']['month']),
-                             int(field['date']['day'])).isoformat()
-      else:
-        return field
-    else:
-      return '-'
+          field = None
+
+        if not field:
+          return '-'
+        elif isinstance(field, list):
+          return self._ConvertSetForCsv(field)
+        elif field_converter:
+          return field_converter(field)
+        else:
+          return field
+
+      self._column_converters[class_type] = ConvertValue
+    return self._column_converters[class_type]
+
+  def _ConvertSetForCsv(self, fields):
+    """Converts the Values contained in a SetValue to a CSV suitable format.
+
+    Args:
+      fields: list the Value objects contained in a SetValue.
+
+    Returns:
+      str the quoted, comma separated values of the set.
+
+    Raises:
+      GoogleAdsValueError: if the set contains a mix of value types.
+    """
+    class_type = DfpClassType(fields[0])
+    if any(DfpClassType(single_field) != class_type
+           for single_field in fields):
+      raise googleads.errors.GoogleAdsValueError(
+          'The set value returned contains unsupported mix value types')
+
+    converter = self._GetPqlColumnConverter(class_type)
+    return ','.join(['"%s"' % str(converter(single_field))
+                     for single_field in fields])
+
+  def _ConvertPqlRowsForCsv(self, rows, column_converters):
+    """Converts a page of PQL result rows to a CSV suitable format.
+
+    The rows are converted column by column. PQL result set columns hold a
+    single Value type, so the converter for each column is looked up from the
+    first populated cell and then applied to the whole column.
+
+    Args:
+      rows: list the rows of a PQL result set page.
+      column_converters: list the converter found for each column so far, or
+                         None for columns without any populated cell yet. This
+                         is updated in place so it can be reused across pages.
+
+    Returns:
+      list a list of lists, each being a converted row.
+    """
+    columns = zip(*[row['values'] for row in rows])
+    if len(column_converters) < len(columns):
+      column_converters.extend(
+          [None] * (len(columns) - len(column_converters)))
+
+    converted_columns = []
+    for index, column in enumerate(columns):
+      converter = column_converters[index]
+      if converter is None:
+        for pql_value in column:
+          if 'value' in pql_value or 'values' in pql_value:
+            converter = self._GetPqlColumnConverter(DfpClassType(pql_value))
+            column_converters[index] = converter
+            break
+        else:
+          converted_columns.append(['-'] * len(column))
+          continue
+      converted_columns.append([converter(pql_value) for pql_value in column])
+
+    return [list(row) for row in zip(*converted_columns)]
 
   def _PageThroughPqlSet(self, pql_query, output_function, values):
     """Pages through a pql_query and performs an action (output_function).
@@ -555,6 +1223,28 @@ class DataDownloader(object):
                        memory)
       values: list dict of bind values to use with the pql_query.
     """
+    column_converters = []
+
+    for header, entities in self._PageThroughPqlPages(pql_query, values):
+      # Write the header row only on first pull
+      if header is not None:
+        output_function([label['labelName'] for label in header])
+
+      for row in self._ConvertPqlRowsForCsv(entities, column_converters):
+        output_function(row)
+
+  def _PageThroughPqlPages(self, pql_query, values):
+    """Pages through a pql_query, yielding each page of rows.
+
+    Args:
+      pql_query: str a statement filter to apply (the query should not include
+                 the limit or the offset)
+      values: list dict of bind values to use with the pql_query.
+
+    Yields:
+      A (columnTypes, rows) tuple for each page of the result set. The
+      columnTypes are only included with the first page, and are None after.
+    """
     result_set_size = 0
     pql_service = self._GetPqlService()
     filter_statement = FilterStatement(pql_query, values, SUGGESTED_PAGE_LIMIT)
@@ -563,17 +1253,11 @@ class DataDownloader(object):
       response = pql_service.select(filter_statement.ToStatement())
 
       if 'rows' in response:
-        # Write the header row only on first pull
-        if filter_statement.offset == 0:
-          header = response['columnTypes']
-          output_function([label['labelName'] for label in header])
-
         entities = response['rows']
         result_set_size = len(entities)
 
-        for entity in entities:
-          output_function([self._ConvertValueForCsv(value) for value
-                           in entity['values']])
+        yield (response['columnTypes'] if filter_statement.offset == 0
+               else None, entities)
 
         filter_statement.offset += result_set_size
         if result_set_size != SUGGESTED_PAGE_LIMIT:
@@ -581,6 +1265,74 @@ class DataDownloader(object):
       else:
         break
 
+  def _ConvertPqlValueForColumn(self, pql_value):
+    """Converts a field value from a Value object to a native Python value.
+
+    Args:
+      pql_value: dict a dictionary containing the data for a single field of an
+                 entity.
+
+    Returns:
+      The field's value as a bool, int, float or unicode string for
+      BooleanValue, NumberValue and TextValue respectively, or None if the
+      field is not set.
+      Other Value types are formatted as they would be for CSV.
+    """
+    field = pql_value['value'] if 'value' in pql_value else None
+    class_type = DfpClassType(pql_value)
+
+    if class_type == 'BooleanValue':
+      return None if field is None else field in (True, 'true')
+    elif class_type == 'NumberValue':
+      return self._ConvertNumberForCsv(field) if field else None
+    elif class_type == 'TextValue':
+      return field
+    else:
+      return self._ConvertValueForCsv(pql_value)
+
+  def _GetPqlColumnType(self, column):
+    """Determines the column type to store converted PQL values with.
+
+    Args:
+      column: list the values of a column, as converted by
+              _ConvertPqlValueForColumn.
+
+    Returns:
+      str "bool", "int" or "float" if all of the column's values are of that
+      type (ints may be mixed with floats), or None otherwise.
+    """
+    value_types = set(type(value) for value in column if value is not None)
+
+    if value_types == set([bool]):
+      return 'bool'
+    elif value_types and value_types <= set([int, long]):
+      return 'int'
+    elif value_types and value_types <= set([int, long, float]):
+      return 'float'
+    else:
+      return None
+
+  def _ConvertTextForCsv(self, text_value):
+    """Escapes the text of a TextValue for CSV output."""
+    return text_value.replace('"', '""').encode('UTF8')
+
+  def _ConvertNumberForCsv(self, number_value):
+    """Converts the string of a NumberValue to an int or float."""
+    return float(number_value) if '.' in number_value else int(number_value)
+
+  def _ConvertDateForCsv(self, date_value):
+    """Converts the PQL formatted response for a date object.
+
+    Args:
+      date_value: dict The date value from the PQL response.
+
+    Returns:
+      str: A string representation of the date in ISO 8601 format.
+    """
+    return datetime.date(int(date_value['date']['year']),
+                         int(date_value['date']['month']),
+                         int(date_value['date']['day'])).isoformat()
+
   def _ConvertDateTimeToOffset(self, date_time_value):
     """Converts the PQL formatted response for a dateTime object.
 
@@ -599,8 +1351,11 @@ class DataDownloader(object):
                                       int(date_time_value['hour']),
                                       int(date_time_value['minute']),
                                       int(date_time_value['second']))
-    date_time_str = pytz.timezone(
-        date_time_value['timeZoneID']).localize(date_time_obj).isoformat()
+    time_zone_id = date_time_value['timeZoneID']
+    if time_zone_id not in self._time_zones:
+      self._time_zones[time_zone_id] = pytz.timezone(time_zone_id)
+    date_time_str = self._time_zones[time_zone_id].localize(
+        date_time_obj).isoformat()
 
     if date_time_str[-5:] == '00:00':
       return date_time_str[:-6] + 'Z'
@@ -608,6 +1363,156 @@ class DataDownloader(object):
       return date_time_str
 
 
+def IterByStatement(get_by_statement, statement=None,
+                    max_workers=_DEFAULT_PAGE_WORKERS):
+  """Iterates over all results of a statement, fetching pages concurrently.
+
+  The first page is fetched immediately, which gives the total number of
+  results. The remaining pages are then fetched by a pool of threads as the
+  results are iterated over, staying a few pages ahead of the caller.
+
+  Example:
+    line_items = dfp.IterByStatement(
+        line_item_service.getLineItemsByStatement,
+        dfp.FilterStatement('WHERE status = :status', values))
+    print 'Found %d line items.' % line_items.total_result_set_size
+    for line_item in line_items:
+      ...
+
+  Args:
+    get_by_statement: A get*ByStatement method of a DFP service, e.g.
+        line_item_service.getLineItemsByStatement.
+    [optional]
+    statement: The FilterStatement to run. Its limit is used as the page size,
+        and its offset as the first result to fetch. Defaults to selecting
+        everything.
+    max_workers: The number of pages fetched concurrently.
+
+  Returns:
+    An iterator over the results, in order, with a total_result_set_size
+    attribute holding the total number of results reported by the first page.
+  """
+  return _StatementResultIterator(get_by_statement,
+                                  statement or FilterStatement(), max_workers)
+
+
+class _StatementResultIterator(object):
+  """Iterates over the results of a statement. See IterByStatement."""
+
+  def __init__(self, get_by_statement, statement, max_workers):
+    self._get_by_statement = get_by_statement
+    self._statement = statement
+    self._max_workers = max_workers
+    first_page = get_by_statement(statement.ToStatement())
+    self.total_result_set_size = getattr(first_page, 'totalResultSetSize',
+                                         None) or 0
+    self._results = self._IterResults(getattr(first_page, 'results', None)
+                                      or [])
+
+  def __iter__(self):
+    return self
+
+  def next(self):
+    return next(self._results)
+
+  def _IterResults(self, first_results):
+    """Yields the first page's results, then those of the remaining pages."""
+    for result in first_results:
+      yield result
+
+    limit = self._statement.limit
+    offsets = range(self._statement.offset + limit,
+                    self.total_result_set_size, limit)
+    if not offsets:
+      return
+
+    pages = {}
+    pages_ready = threading.Condition()
+    # Limits how many fetched pages may be waiting to be iterated over.
+    pages_ahead = threading.Semaphore(self._max_workers *
+                                      _PAGES_AHEAD_PER_WORKER)
+    stopped = []
+
+    def FetchPage(offset):
+      if not stopped:
+        pages_ahead.acquire()
+      if stopped:
+        raise googleads.errors.GoogleAdsError('The iteration was stopped.')
+      statement = FilterStatement(self._statement.where_clause,
+                                  self._statement.values, limit, offset)
+      return getattr(self._get_by_statement(statement.ToStatement()),
+                     'results', None) or []
+
+    def StorePage(index, page):
+      with pages_ready:
+        pages[offsets[index]] = page
+        pages_ready.notify_all()
+
+    # The pages are fetched in the background while the results are iterated
+    # over.
+    num_workers = min(self._max_workers, len(offsets))
+    fetcher = threading.Thread(
+        target=googleads.common.RunConcurrently,
+        args=(FetchPage, offsets, num_workers),
+        kwargs={'on_outcome': StorePage, 'daemon': True})
+    fetcher.daemon = True
+    fetcher.start()
+
+    try:
+      for offset in offsets:
+        with pages_ready:
+          while offset not in pages:
+            pages_ready.wait()
+          results, error = pages.pop(offset)
+        if error:
+          raise error
+        pages_ahead.release()
+        for result in results:
+          yield result
+    finally:
+      # Wake any threads still waiting to fetch so that they exit.
+      stopped.append(True)
+      for _ in xrange(num_workers):
+        pages_ahead.release()
+
+
+def _FormatSyncDateTime(date_time):
+  """Formats a DFP DateTime as a watermark, ignoring its time zone.
+
+  Args:
+    date_time: A DFP DateTime object.
+
+  Returns:
+    A string of the form "YYYY-MM-DDTHH:MM:SS".
+  """
+  return '%04d-%02d-%02dT%02d:%02d:%02d' % (
+      int(date_time.date.year), int(date_time.date.month),
+      int(date_time.date.day), int(date_time.hour), int(date_time.minute),
+      int(date_time.second))
+
+
+def _GetAllByStatement(get_by_statement, statement):
+  """Pages through all of the results of a statement.
+
+  Args:
+    get_by_statement: A get*ByStatement method of a DFP service.
+    statement: The FilterStatement to run. Its offset is advanced as pages are
+        retrieved.
+
+  Returns:
+    A list of the entities returned.
+  """
+  results = []
+  while True:
+    page = get_by_statement(statement.ToStatement())
+    page_results = getattr(page, 'results', None) or []
+    results.extend(page_results)
+    statement.offset += statement.limit
+    if (len(page_results) < statement.limit or
+        statement.offset >= page.totalResultSetSize):
+      return results
+
+
 def DfpClassType(value):
   """Returns the class type for the Suds object.
 
@@ -94,6 +94,36 @@ class AdWordsBatchJobServiceInvalidOperationError(GoogleAdsError):
   pass
 
 
+class GoogleAdsChunkedRequestError(GoogleAdsError):
+  """Error indicating that chunks of a request split into chunks failed.
+
+  Chunks which had not been sent when the first chunk failed are not sent, so
+  an operation may appear in neither the results nor the errors.
+
+  Attributes:
+    errors: A dict mapping the index of the first operation of each failed chunk
+        to the exception it raised.
+    results: A dict mapping the index of the first operation of each chunk
+        which succeeded to its result.
+  """
+
+  def __init__(self, errors, results):
+    """Initializes a GoogleAdsChunkedRequestError.
+
+    Args:
+      errors: A dict mapping the index of the first operation of each failed
+          chunk to the exception it raised.
+      results: A dict mapping the index of the first operation of each chunk
+          which succeeded to its result.
+    """
+    super(GoogleAdsChunkedRequestError, self).__init__(
+        '%d chunk(s) of the request failed, starting at operation(s) %s. First '
+        'error: %s' % (len(errors), sorted(errors),
+                       errors[min(errors)]))
+    self.errors = errors
+    self.results = results
+
+
 class DfpReportError(GoogleAdsError):
   """Error indicating that a DFP report download request failed.
 
@@ -0,0 +1,372 @@
+# Copyright 2016 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Per-call metrics hooks and an in-process aggregator for the client library.
+
+Each call the library makes, such as a SOAP call, a report download or an
+OAuth2 token refresh, is passed as a CallEvent to the registered
+MetricsListeners.
+"""
+
+import bisect
+import collections
+import contextlib
+import logging
+import threading
+import time
+
+
+import suds
+
+import googleads.errors
+
+
+_logger = logging.getLogger(__name__)
+
+# The upper bounds in seconds of the latency histogram buckets a
+# MetricsAggregator keeps by default. Longer calls are counted in one more
+# overflow bucket.
+_DEFAULT_LATENCY_BOUNDS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+                           30, 60)
+
+# Global variables used to notify listeners of the calls the library makes. The
+# list of listeners is replaced rather than modified, so that it can be read
+# without holding the lock.
+_metrics_listeners = []
+_METRICS_LOCK = threading.Lock()
+
+
+# A call made by the library, passed to each registered MetricsListener.
+# component identifies what made the call, e.g. 'soap', 'report_download',
+# 'batch_job_upload' or 'oauth2', and scope whose data it acted on, e.g. the
+# client customer ID or network code. Byte sizes and operation_count are None
+# where they aren't known, and fault is the type of the error the call failed
+# with, or None if it succeeded. cached is True if the call wasn't sent but was
+# answered from a ResponseCache or with the result of an identical call shared
+# by a SingleFlight.
+CallEvent = collections.namedtuple(
+    'CallEvent',
+    ['component', 'service', 'method', 'scope', 'request_bytes',
+     'response_bytes', 'latency', 'retries', 'fault', 'operation_count',
+     'cached'])
+
+# The metrics a MetricsAggregator collected for the calls to one method. calls
+# includes the cached_calls which weren't sent, faults maps each fault type to
+# the number of calls that failed with it, and latency_histogram counts the
+# calls in each latency bucket of the snapshot.
+CallMetrics = collections.namedtuple(
+    'CallMetrics',
+    ['component', 'service', 'method', 'scope', 'calls', 'cached_calls',
+     'faults', 'retries', 'operations', 'request_bytes', 'response_bytes',
+     'latency_sum', 'latency_histogram'])
+
+# The metrics collected by a MetricsAggregator at a point in time.
+# latency_bounds are the upper bounds of the buckets of each latency_histogram,
+# whose last bucket counts the calls slower than the last bound.
+MetricsSnapshot = collections.namedtuple(
+    'MetricsSnapshot', ['timestamp', 'latency_bounds', 'metrics'])
+
+
+def AddMetricsListener(listener):
+  """Registers a MetricsListener to be notified of each call the library makes.
+
+  Args:
+    listener: The MetricsListener to notify.
+  """
+  global _metrics_listeners
+  with _METRICS_LOCK:
+    _metrics_listeners = _metrics_listeners + [listener]
+
+
+def RemoveMetricsListener(listener):
+  """Stops notifying a MetricsListener of the calls the library makes.
+
+  Args:
+    listener: A MetricsListener registered with AddMetricsListener.
+
+  Raises:
+    GoogleAdsValueError: If the listener isn't registered.
+  """
+  global _metrics_listeners
+  with _METRICS_LOCK:
+    if listener not in _metrics_listeners:
+      raise googleads.errors.GoogleAdsValueError(
+          'The MetricsListener is not registered: %s' % listener)
+    _metrics_listeners = [registered for registered in _metrics_listeners
+                          if registered is not listener]
+
+
+class MetricsListener(object):
+  """An interface for receiving the CallEvents of the calls the library makes.
+
+  Listeners are notified on the thread that made the call, so they must be
+  thread-safe and shouldn't block.
+  """
+
+  def OnCall(self, event):
+    """Handles a call made by the library.
+
+    Args:
+      event: The CallEvent describing the call.
+    """
+    raise NotImplementedError('You must subclass MetricsListener.')
+
+
+class MetricsExporter(object):
+  """An interface for publishing the metrics collected by a MetricsAggregator.
+  """
+
+  def Export(self, snapshot):
+    """Publishes collected metrics.
+
+    Args:
+      snapshot: The MetricsSnapshot to publish.
+    """
+    raise NotImplementedError('You must subclass MetricsExporter.')
+
+
+class LoggingMetricsExporter(MetricsExporter):
+  """A MetricsExporter logging a line for the calls to each method."""
+
+  def __init__(self, logger=None, level=logging.INFO):
+    """Initializes a LoggingMetricsExporter.
+
+    Args:
+      [optional]
+      logger: The logging.Logger to log to. Defaults to this module's logger.
+      level: The level to log at.
+    """
+    self._logger = logger or _logger
+    self._level = level
+
+  def Export(self, snapshot):
+    """Logs each of the CallMetrics in a snapshot.
+
+    Args:
+      snapshot: The MetricsSnapshot to log.
+    """
+    for metrics in snapshot.metrics:
+      self._logger.log(
+          self._level, '%s %s.%s (scope %s): %d calls (%d cached), '
+          '%d faults %s, %d retries, %.3fs mean latency.', metrics.component,
+          metrics.service, metrics.method, metrics.scope, metrics.calls,
+          metrics.cached_calls, sum(metrics.faults.values()), metrics.faults,
+          metrics.retries, metrics.latency_sum / metrics.calls)
+
+
+class MetricsAggregator(MetricsListener):
+  """A MetricsListener collecting counters and latency histograms in process.
+
+  The calls are aggregated by component, service and method, and optionally by
+  scope. A MetricsAggregator may be shared between threads.
+
+  Attributes:
+    latency_bounds: The upper bounds in seconds of the latency buckets.
+  """
+
+  def __init__(self, latency_bounds=_DEFAULT_LATENCY_BOUNDS, by_scope=False):
+    """Initializes a MetricsAggregator.
+
+    Args:
+      [optional]
+      latency_bounds: An ascending sequence of the upper bounds in seconds of
+          the latency histogram buckets.
+      by_scope: A boolean indicating whether to aggregate the calls made for
+          each scope, e.g. each client customer ID, separately.
+
+    Raises:
+      GoogleAdsValueError: If latency_bounds isn't ascending.
+    """
+    if list(latency_bounds) != sorted(set(latency_bounds)):
+      raise googleads.errors.GoogleAdsValueError(
+          'latency_bounds must be ascending. Given: %s' % (latency_bounds,))
+    self.latency_bounds = tuple(latency_bounds)
+    self._by_scope = by_scope
+    self._counters = {}
+    self._lock = threading.Lock()
+
+  def OnCall(self, event):
+    """Adds a call to the counters and histogram of its method.
+
+    Args:
+      event: The CallEvent describing the call.
+    """
+    key = (event.component, event.service, event.method,
+           event.scope if self._by_scope else None)
+    bucket = bisect.bisect_left(self.latency_bounds, event.latency)
+    with self._lock:
+      counters = self._counters.get(key)
+      if counters is None:
+        counters = _CallCounters(len(self.latency_bounds) + 1)
+        self._counters[key] = counters
+      counters.Add(event, bucket)
+
+  def GetSnapshot(self):
+    """Captures the metrics collected so far.
+
+    Returns:
+      A MetricsSnapshot with CallMetrics for each method called.
+    """
+    with self._lock:
+      return self._GetSnapshot()
+
+  def Export(self, exporter, reset=False):
+    """Publishes the metrics collected so far.
+
+    Args:
+      exporter: The MetricsExporter to publish the metrics with.
+      [optional]
+      reset: A boolean indicating whether to start collecting anew, so that
+          each export only covers the calls made since the previous one.
+    """
+    with self._lock:
+      snapshot = self._GetSnapshot()
+      if reset:
+        self._counters = {}
+    exporter.Export(snapshot)
+
+  def Reset(self):
+    """Discards the metrics collected so far."""
+    with self._lock:
+      self._counters = {}
+
+  def _GetSnapshot(self):
+    """Captures the metrics collected so far. The lock must be held."""
+    return MetricsSnapshot(
+        time.time(), self.latency_bounds,
+        [counters.GetMetrics(*key) for key, counters in sorted(
+            self._counters.items(),
+            key=lambda item: [str(part) for part in item[0]])])
+
+
+class _CallCounters(object):
+  """The running totals of the calls to a method kept by MetricsAggregator."""
+
+  def __init__(self, bucket_count):
+    self.calls = 0
+    self.cached_calls = 0
+    self.faults = collections.Counter()
+    self.retries = 0
+    self.operations = 0
+    self.request_bytes = 0
+    self.response_bytes = 0
+    self.latency_sum = 0.0
+    self.latency_histogram = [0] * bucket_count
+
+  def Add(self, event, bucket):
+    """Adds a call to the totals.
+
+    Args:
+      event: The CallEvent describing the call.
+      bucket: The index of the latency bucket the call falls into.
+    """
+    self.calls += 1
+    if event.cached:
+      self.cached_calls += 1
+    if event.fault:
+      self.faults[event.fault] += 1
+    self.retries += event.retries
+    self.operations += event.operation_count or 0
+    self.request_bytes += event.request_bytes or 0
+    self.response_bytes += event.response_bytes or 0
+    self.latency_sum += event.latency
+    self.latency_histogram[bucket] += 1
+
+  def GetMetrics(self, component, service, method, scope):
+    """Returns the totals as CallMetrics."""
+    return CallMetrics(component, service, method, scope, self.calls,
+                       self.cached_calls, dict(self.faults), self.retries,
+                       self.operations, self.request_bytes, self.response_bytes,
+                       self.latency_sum, tuple(self.latency_histogram))
+
+
+class _CallMeasurement(object):
+  """The measurements of a call in progress, filled in by the caller.
+
+  Attributes:
+    request_bytes: The size of the request, or None if unknown.
+    response_bytes: The size of the response, or None if unknown.
+    retries: The number of times the call was retried.
+    operation_count: The number of operations sent, or None if not applicable.
+    cached: Whether the call was answered without being sent.
+  """
+
+  def __init__(self, operation_count):
+    self.request_bytes = None
+    self.response_bytes = None
+    self.retries = 0
+    self.operation_count = operation_count
+    self.cached = False
+
+
+@contextlib.contextmanager
+def MeasureCall(component, service, method, scope=None, operation_count=None):
+  """Times a call and notifies the registered MetricsListeners of it.
+
+  The call's fault type is taken from the exception raised, if any.
+
+  Args:
+    component: A string identifying what makes the call, e.g. 'soap'.
+    service: A string identifying the service called.
+    method: A string identifying the method called.
+    [optional]
+    scope: The account the call acts on, e.g. a client customer ID.
+    operation_count: The number of operations sent with the call.
+
+  Yields:
+    A _CallMeasurement for the caller to record the sizes and retries of the
+    call in.
+  """
+  measurement = _CallMeasurement(operation_count)
+  fault = None
+  start = time.time()
+  try:
+    yield measurement
+  except Exception as e:
+    fault = _GetFaultType(e)
+    raise
+  finally:
+    listeners = _metrics_listeners
+    if listeners:
+      event = CallEvent(component, service, method, scope,
+                        measurement.request_bytes, measurement.response_bytes,
+                        time.time() - start, measurement.retries, fault,
+                        measurement.operation_count, measurement.cached)
+      for listener in listeners:
+        try:
+          listener.OnCall(event)
+        except Exception:
+          _logger.exception('A MetricsListener failed to handle a call.')
+
+
+def _GetFaultType(error):
+  """Gets the type of the fault a call failed with.
+
+  Args:
+    error: The exception raised by the call.
+
+  Returns:
+    A string such as the ApiError type of a SOAP fault, e.g.
+    'RateExceededError.RATE_EXCEEDED', or else the name of the exception's
+    class.
+  """
+  if isinstance(error, suds.WebFault):
+    try:
+      return getattr(error.fault.detail.ApiExceptionFault.errors[0],
+                     'ApiError.Type')
+    except (AttributeError, IndexError, TypeError):
+      pass
+  elif isinstance(error, googleads.errors.AdWordsReportBadRequestError):
+    return error.type
+  return type(error).__name__
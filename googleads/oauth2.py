@@ -27,6 +27,7 @@ import datetime
 
 
 import googleads.errors
+import googleads.metrics
 import httplib2
 import oauth2client.client
 
@@ -151,11 +152,13 @@ class GoogleRefreshTokenClient(GoogleOAuth2Client):
     Raises:
       AccessTokenRefreshError: If the refresh fails.
     """
-    self.oauth2credentials.refresh(httplib2.Http(
-        proxy_info=self.proxy_config.proxy_info,
-        ca_certs=self.proxy_config.cafile,
-        disable_ssl_certificate_validation=(
-            self.proxy_config.disable_certificate_validation)))
+    with googleads.metrics.MeasureCall('oauth2', type(self).__name__,
+                                       'Refresh'):
+      self.oauth2credentials.refresh(httplib2.Http(
+          proxy_info=self.proxy_config.proxy_info,
+          ca_certs=self.proxy_config.cafile,
+          disable_ssl_certificate_validation=(
+              self.proxy_config.disable_certificate_validation)))
 
 
 class GoogleServiceAccountClient(GoogleOAuth2Client):
@@ -237,8 +240,10 @@ class GoogleServiceAccountClient(GoogleOAuth2Client):
     Raises:
       AccessTokenRefreshError: If the refresh fails.
     """
-    self.oauth2credentials.refresh(httplib2.Http(
-        proxy_info=self.proxy_config.proxy_info,
-        ca_certs=self.proxy_config.cafile,
-        disable_ssl_certificate_validation=(
-            self.proxy_config.disable_certificate_validation)))
+    with googleads.metrics.MeasureCall('oauth2', type(self).__name__,
+                                       'Refresh'):
+      self.oauth2credentials.refresh(httplib2.Http(
+          proxy_info=self.proxy_config.proxy_info,
+          ca_certs=self.proxy_config.cafile,
+          disable_ssl_certificate_validation=(
+              self.proxy_config.disable_certificate_validation)))
@@ -0,0 +1,481 @@
+# Copyright 2016 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""A local server recording and replaying AdWords and DFP API traffic.
+
+A ReplayServer stands in for the API servers, so that services, report
+downloads and batch job uploads can be exercised end to end, e.g. to measure
+the library's performance, without reaching Google's servers.
+"""
+
+
+import base64
+import BaseHTTPServer
+import gzip
+import hashlib
+import io
+import json
+import logging
+import os
+import random
+import re
+import SocketServer
+import threading
+import time
+import urllib2
+import urlparse
+
+import googleads.common
+import googleads.errors
+
+
+_logger = logging.getLogger(__name__)
+
+# The API endpoints which are replaced by the server's URL in the locations of
+# the WSDLs and schemas it serves, so that clients keep talking to the server.
+_API_ENDPOINTS = ('https://adwords.google.com', 'https://ads.google.com')
+# Matches the start of a location attribute in a WSDL or schema. Namespaces,
+# which also start with the API endpoints, must be left as they are.
+_LOCATION_ATTRIBUTE_PATTERN = (
+    r'(?P<attribute>\b(?:location|schemaLocation)=["\'])')
+# The request headers which are not forwarded to the upstream server when
+# recording.
+_UNFORWARDED_HEADERS = frozenset(['accept-encoding', 'connection',
+                                  'content-length', 'host'])
+# The response headers which are recorded with the responses.
+_RECORDED_HEADERS = ('Content-Type', 'Content-Disposition')
+# Matches the SOAP header of a request, which holds credentials and other values
+# which don't change the response, e.g. "<SOAP-ENV:Header>...</SOAP-ENV:Header>"
+_SOAP_HEADER_PATTERN = re.compile(
+    r'<(?P<prefix>[\w.-]+:)?Header\b.*?</(?P=prefix)Header>', re.DOTALL)
+# The suffix of the files recorded responses are stored in.
+_FIXTURE_SUFFIX = '.json'
+
+# Matches the path of an AdWords report download request.
+_REPORT_DOWNLOAD_PATH_PATTERN = re.compile(
+    r'^/api/adwords/reportdownload/(?P<version>v\d+)$')
+# Matches the selected fields of an AWQL report query.
+_AWQL_SELECT_PATTERN = re.compile(r'^\s*SELECT\s+(?P<fields>.+?)\s+FROM\s',
+                                  re.IGNORECASE | re.DOTALL)
+# Matches the selected fields of an XML report definition.
+_REPORT_DEFINITION_FIELD_PATTERN = re.compile(r'<fields>\s*(.*?)\s*</fields>')
+# Matches the download format of an XML report definition.
+_REPORT_DEFINITION_FORMAT_PATTERN = re.compile(
+    r'<downloadFormat>\s*(.*?)\s*</downloadFormat>')
+# The column separators of the report formats the server synthesizes.
+_SYNTHESIZED_REPORT_FORMATS = {'CSV': ',', 'GZIPPED_CSV': ',',
+                               'TSV': '\t', 'GZIPPED_TSV': '\t'}
+
+# The path under which the server accepts batch job uploads.
+_BATCH_JOB_UPLOAD_PATH = '/batchjob/upload/'
+# Matches the Content-Range header of a batch job upload request.
+_CONTENT_RANGE_PATTERN = re.compile(
+    r'^bytes (?P<first>\d+)-(?P<last>\d+)/(?P<total>\d+|\*)$')
+
+# The body of the responses to requests the server fails on purpose.
+_INJECTED_FAULT = (
+    '<?xml version="1.0" encoding="UTF-8"?>'
+    '<soap:Envelope xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/">'
+    '<soap:Body><soap:Fault><faultcode>soap:Server</faultcode>'
+    '<faultstring>Injected error.</faultstring></soap:Fault></soap:Body>'
+    '</soap:Envelope>')
+
+
+class ReplayServer(object):
+  """A local HTTP server replaying recorded API responses.
+
+  In record mode, when given an upstream server, requests are forwarded to it
+  and its responses are stored in the fixture directory. Otherwise, requests
+  are answered with the response recorded for the same request. WSDLs, schemas
+  and SOAP requests are all recorded this way, so recording a run of a script
+  once, e.g. one calling AdWordsClient.GetService with the server's URL as its
+  server, lets it be replayed for any version in the library's service map.
+
+  Requests are matched to recordings by their method, path and body. The SOAP
+  header is left out, so that recordings match requests with other credentials.
+  The API endpoints in the locations of the WSDLs and schemas served are
+  replaced by the server's URL.
+
+  Report downloads and batch job uploads which weren't recorded are
+  synthesized: reports hold report_rows rows of the selected fields, and batch
+  job uploads to GetBatchJobUploadUrl are accepted and kept in uploads.
+
+  Each response is delayed by latency seconds, and a share of the requests
+  given by error_rate fail with error_status and a SOAP fault.
+
+  Example:
+    with ReplayServer('fixtures', latency=0.1) as server:
+      campaign_service = adwords_client.GetService(
+          'CampaignService', server=server.url)
+
+  Attributes:
+    uploads: A dict mapping the paths of batch job uploads to their uploaded
+        data.
+    missed_requests: A list of the (method, path) tuples of the requests which
+        had no recorded response, and which couldn't be synthesized.
+  """
+
+  def __init__(self, fixture_dir, upstream=None, port=0, latency=0,
+               error_rate=0, error_status=500, report_rows=100, seed=None):
+    """Initializes a ReplayServer.
+
+    Args:
+      fixture_dir: A string containing the path of the directory the recorded
+          responses are stored in. It is created if it doesn't exist.
+      [optional]
+      upstream: A string containing the URL of the server to record responses
+          from, e.g. "https://adwords.google.com". If not set, responses are
+          replayed.
+      port: The port to listen on. By default, a free port is picked.
+      latency: The number of seconds each response is delayed by.
+      error_rate: A number between 0 and 1 indicating the share of requests
+          which fail.
+      error_status: The HTTP status of the requests which fail.
+      report_rows: The number of rows in synthesized reports.
+      seed: The seed of the random choice of the requests which fail.
+    """
+    if not os.path.isdir(fixture_dir):
+      os.makedirs(fixture_dir)
+    self._fixture_dir = fixture_dir
+    self._upstream = upstream.rstrip('/') if upstream else None
+    self._port = port
+    self.latency = latency
+    self.error_rate = error_rate
+    self.error_status = error_status
+    self.report_rows = report_rows
+    self.uploads = {}
+    self.missed_requests = []
+    self._random = random.Random(seed)
+    endpoints = _API_ENDPOINTS + ((self._upstream,) if self._upstream else ())
+    self._location_pattern = re.compile(
+        _LOCATION_ATTRIBUTE_PATTERN + '(?:%s)' % '|'.join(
+            re.escape(endpoint) for endpoint in endpoints))
+    self._lock = threading.Lock()
+    self._http_server = None
+    self._thread = None
+
+  @property
+  def url(self):
+    """The URL of the server, e.g. "http://127.0.0.1:8080"."""
+    if not self._http_server:
+      raise googleads.errors.GoogleAdsError('The server is not running.')
+    return 'http://%s:%d' % self._http_server.server_address
+
+  def Start(self):
+    """Starts serving requests on a background thread.
+
+    Returns:
+      This ReplayServer.
+    """
+    self._http_server = _ThreadingHTTPServer(('127.0.0.1', self._port),
+                                             _ReplayRequestHandler)
+    self._http_server.replay_server = self
+    self._thread = threading.Thread(target=self._http_server.serve_forever)
+    self._thread.daemon = True
+    self._thread.start()
+    return self
+
+  def Stop(self):
+    """Stops serving requests."""
+    if self._http_server:
+      self._http_server.shutdown()
+      self._http_server.server_close()
+      self._thread.join()
+      self._http_server = None
+
+  def __enter__(self):
+    return self.Start()
+
+  def __exit__(self, exc_type, exc_value, traceback):
+    self.Stop()
+
+  def GetBatchJobUploadUrl(self, batch_job_id):
+    """Gets a URL the server accepts batch job uploads on.
+
+    Args:
+      batch_job_id: A string or int identifying the batch job.
+
+    Returns:
+      A string containing the URL to use as the batch job's upload URL.
+    """
+    return '%s%s%s' % (self.url, _BATCH_JOB_UPLOAD_PATH, batch_job_id)
+
+  def AddFixture(self, method, path, response, body=''):
+    """Stores a response, which is then replayed as if it had been recorded.
+
+    Args:
+      method: A string containing the HTTP method of the request.
+      path: A string containing the path of the request, with its query.
+      response: A (status, headers, body) tuple holding the HTTP status, a dict
+          of the headers and a string containing the body of the response.
+      [optional]
+      body: A string containing the body of the request.
+    """
+    self._SaveFixture(_GetFixtureKey(method, path, body), response)
+
+  def GetFixture(self, method, path, body=''):
+    """Retrieves the response recorded for a request.
+
+    Args:
+      method: A string containing the HTTP method of the request.
+      path: A string containing the path of the request, with its query.
+      [optional]
+      body: A string containing the body of the request.
+
+    Returns:
+      A (status, headers, body) tuple, or None if no response was recorded.
+    """
+    return self._LoadFixture(_GetFixtureKey(method, path, body))
+
+  def _Handle(self, method, path, headers, body):
+    """Answers a request.
+
+    Args:
+      method: A string containing the HTTP method of the request.
+      path: A string containing the path of the request, with its query.
+      headers: A dict of the request's headers, keyed by lowercase names.
+      body: A string containing the body of the request.
+
+    Returns:
+      A (status, headers, body) tuple.
+    """
+    if self.latency:
+      time.sleep(self.latency)
+    with self._lock:
+      is_failed = self._random.random() < self.error_rate
+    if is_failed:
+      return self.error_status, {'Content-Type': 'text/xml'}, _INJECTED_FAULT
+
+    if path.startswith(_BATCH_JOB_UPLOAD_PATH):
+      return self._Upload(method, path, headers, body)
+
+    key = _GetFixtureKey(method, path, body)
+    if self._upstream:
+      response = self._Forward(method, path, headers, body)
+      self._SaveFixture(key, response)
+    else:
+      response = self._LoadFixture(key)
+      if response is None:
+        response = self._Synthesize(method, path, headers, body)
+
+    status, response_headers, response_body = response
+    if 'xml' in response_headers.get('Content-Type', ''):
+      response_body = self._location_pattern.sub(
+          lambda match: match.group('attribute') + self.url, response_body)
+    return status, response_headers, response_body
+
+  def _Forward(self, method, path, headers, body):
+    """Sends a request to the upstream server.
+
+    Args:
+      method: A string containing the HTTP method of the request.
+      path: A string containing the path of the request, with its query.
+      headers: A dict of the request's headers, keyed by lowercase names.
+      body: A string containing the body of the request.
+
+    Returns:
+      A (status, headers, body) tuple of the upstream server's response.
+    """
+    request = urllib2.Request(
+        self._upstream + path, data=body if method != 'GET' else None,
+        headers=dict((name, value) for name, value in headers.iteritems()
+                     if name not in _UNFORWARDED_HEADERS))
+    request.get_method = lambda: method
+    try:
+      response = urllib2.urlopen(request)
+    except urllib2.HTTPError as e:
+      response = e
+    response_headers = dict(
+        (name, response.info()[name]) for name in _RECORDED_HEADERS
+        if response.info().get(name))
+    return response.code, response_headers, response.read()
+
+  def _Synthesize(self, method, path, headers, body):
+    """Creates a response for a request which wasn't recorded.
+
+    Args:
+      method: A string containing the HTTP method of the request.
+      path: A string containing the path of the request, with its query.
+      headers: A dict of the request's headers, keyed by lowercase names.
+      body: A string containing the body of the request.
+
+    Returns:
+      A (status, headers, body) tuple.
+    """
+    if method == 'POST' and _REPORT_DOWNLOAD_PATH_PATTERN.match(path):
+      return self._SynthesizeReport(headers, body)
+    with self._lock:
+      self.missed_requests.append((method, path))
+    return (404, {'Content-Type': 'text/plain'},
+            'No response recorded for %s %s.' % (method, path))
+
+  def _SynthesizeReport(self, headers, body):
+    """Creates a report with report_rows rows of the selected fields.
+
+    Args:
+      headers: A dict of the request's headers, keyed by lowercase names.
+      body: A string containing the form encoded body of the request.
+
+    Returns:
+      A (status, headers, body) tuple.
+    """
+    form = urlparse.parse_qs(body)
+    if '__rdquery' in form:
+      match = _AWQL_SELECT_PATTERN.match(form['__rdquery'][0])
+      fields = ([field.strip() for field in match.group('fields').split(',')]
+                if match else [])
+      file_format = form.get('__fmt', [''])[0]
+    else:
+      definition = form.get('__rdxml', [''])[0]
+      fields = _REPORT_DEFINITION_FIELD_PATTERN.findall(definition)
+      file_format = ''.join(
+          _REPORT_DEFINITION_FORMAT_PATTERN.findall(definition)[:1])
+
+    if not fields or file_format not in _SYNTHESIZED_REPORT_FORMATS:
+      return (400, {'Content-Type': 'text/xml'},
+              '<reportDownloadError><ApiError><type>ReportDownloadError.'
+              'INVALID_PARAMETER</type><trigger>%s</trigger><fieldPath>'
+              '</fieldPath></ApiError></reportDownloadError>' % file_format)
+
+    separator = _SYNTHESIZED_REPORT_FORMATS[file_format]
+    lines = []
+    if headers.get('skipreportheader', 'false') != 'true':
+      lines.append('"SYNTHESIZED REPORT (%s)"' % time.strftime('%b %d, %Y'))
+    if headers.get('skipcolumnheader', 'false') != 'true':
+      lines.append(separator.join(fields))
+    for row in xrange(self.report_rows):
+      lines.append(separator.join([str(row)] * len(fields)))
+    if headers.get('skipreportsummary', 'false') != 'true':
+      lines.append(separator.join(['Total'] + ['--'] * (len(fields) - 1)))
+    report = '\n'.join(lines) + '\n'
+
+    if file_format.startswith('GZIPPED_'):
+      compressed = io.BytesIO()
+      with gzip.GzipFile(fileobj=compressed, mode='wb') as gzip_file:
+        gzip_file.write(report)
+      report = compressed.getvalue()
+    return 200, {'Content-Type': 'application/octet-stream'}, report
+
+  def _Upload(self, method, path, headers, body):
+    """Accepts a step of a resumable batch job upload.
+
+    Args:
+      method: A string containing the HTTP method of the request.
+      path: A string containing the path of the request, with its query.
+      headers: A dict of the request's headers, keyed by lowercase names.
+      body: A string containing the body of the request.
+
+    Returns:
+      A (status, headers, body) tuple.
+    """
+    upload_path = urlparse.urlparse(path).path
+    if method == 'POST' and headers.get('x-goog-resumable') == 'start':
+      with self._lock:
+        self.uploads[upload_path] = ''
+      return (201, {'Location': '%s%s?upload_id=%s' % (
+          self.url, upload_path,
+          hashlib.sha1(_ToBytes(upload_path)).hexdigest())}, '')
+
+    match = _CONTENT_RANGE_PATTERN.match(headers.get('content-range', ''))
+    if method != 'PUT' or not match:
+      return 400, {'Content-Type': 'text/plain'}, 'Invalid upload request.'
+    with self._lock:
+      self.uploads[upload_path] = self.uploads.get(upload_path, '') + body
+    if match.group('total') == '*':
+      return 308, {'Range': 'bytes=0-%s' % match.group('last')}, ''
+    return 200, {'Content-Type': 'text/plain'}, ''
+
+  def _LoadFixture(self, key):
+    """Loads a recorded (status, headers, body) response, or returns None."""
+    try:
+      with open(self._GetPath(key)) as fixture_file:
+        fixture = json.load(fixture_file)
+    except (IOError, ValueError):
+      return None
+    return (fixture['status'], fixture['headers'],
+            base64.b64decode(fixture['body']))
+
+  def _SaveFixture(self, key, response):
+    """Stores a recorded (status, headers, body) response."""
+    status, headers, body = response
+    # A partially written response is never read.
+    with googleads.common.WriteFileAtomically(
+        self._GetPath(key)) as fixture_file:
+      json.dump({'status': status, 'headers': headers,
+                 'body': base64.b64encode(body)}, fixture_file)
+
+  def _GetPath(self, key):
+    return os.path.join(self._fixture_dir, key + _FIXTURE_SUFFIX)
+
+
+def _GetFixtureKey(method, path, body):
+  """Creates the key a request's response is recorded under.
+
+  Args:
+    method: A string containing the HTTP method of the request.
+    path: A string containing the path of the request, with its query.
+    body: A string containing the body of the request.
+
+  Returns:
+    A string identifying the request.
+  """
+  request = '%s %s\n%s' % (method, path, _SOAP_HEADER_PATTERN.sub('', body))
+  return hashlib.sha256(_ToBytes(request)).hexdigest()
+
+
+def _ToBytes(value):
+  """Encodes text as UTF-8, leaving byte strings unchanged.
+
+  Args:
+    value: A byte string or unicode string.
+
+  Returns:
+    The value as a byte string.
+  """
+  if isinstance(value, bytes):
+    return value
+  return value.encode('utf-8')
+
+
+class _ThreadingHTTPServer(SocketServer.ThreadingMixIn,
+                           BaseHTTPServer.HTTPServer):
+  """An HTTP server answering each request on its own thread."""
+  daemon_threads = True
+
+
+class _ReplayRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+  """Passes the requests of a _ThreadingHTTPServer to its ReplayServer."""
+
+  protocol_version = 'HTTP/1.1'
+
+  def _HandleRequest(self):
+    body = self.rfile.read(int(self.headers.get('content-length') or 0))
+    headers = dict((name.lower(), value)
+                   for name, value in self.headers.items())
+    status, response_headers, response_body = (
+        self.server.replay_server._Handle(self.command, self.path, headers,
+                                          body))
+    self.send_response(status)
+    for name, value in response_headers.iteritems():
+      self.send_header(name, value)
+    self.send_header('Content-Length', str(len(response_body)))
+    self.end_headers()
+    self.wfile.write(response_body)
+
+  do_GET = _HandleRequest
+  do_POST = _HandleRequest
+  do_PUT = _HandleRequest
+
+  def log_message(self, format_string, *args):
+    _logger.debug(format_string, *args)
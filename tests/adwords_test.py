@@ -16,11 +16,17 @@
 
 """Unit tests to cover the adwords module."""
 
+import array
+import datetime
+import gzip
 import io
+import json
 import os
 import StringIO
 import sys
 import tempfile
+import threading
+import time
 import unittest
 import urllib
 import urllib2
@@ -452,6 +458,134 @@ class AdWordsClientTest(unittest.TestCase):
     soap_header = suds_client.factory.create.return_value
     self.assertEqual(ccid, soap_header.clientCustomerId)
 
+  def testAsCustomer(self):
+    suds_client = mock.Mock()
+    soap_header = suds_client.factory.create.return_value
+
+    with self.adwords_client.AsCustomer('scoped') as client:
+      self.assertIs(self.adwords_client, client)
+      self.header_handler.SetHeaders(suds_client)
+      self.assertEqual('scoped', soap_header.clientCustomerId)
+      self.assertEqual(
+          'scoped',
+          self.header_handler.GetReportDownloadHeaders()['clientCustomerId'])
+      with self.adwords_client.AsCustomer('nested'):
+        self.assertEqual('nested', self.adwords_client.client_customer_id)
+      self.assertEqual('scoped', self.adwords_client.client_customer_id)
+
+    self.assertEqual('client customer id',
+                     self.adwords_client.client_customer_id)
+
+  def testAsCustomer_otherThreadsUnaffected(self):
+    other_thread_ids = []
+
+    def GetClientCustomerId():
+      other_thread_ids.append(self.adwords_client.client_customer_id)
+
+    with self.adwords_client.AsCustomer('scoped'):
+      thread = threading.Thread(target=GetClientCustomerId)
+      thread.start()
+      thread.join()
+      self.assertEqual('scoped', self.adwords_client.client_customer_id)
+
+    self.assertEqual(['client customer id'], other_thread_ids)
+
+  def testCopyContext(self):
+    other_thread_ids = []
+
+    def GetClientCustomerId(context):
+      with context:
+        other_thread_ids.append(self.adwords_client.client_customer_id)
+      other_thread_ids.append(self.adwords_client.client_customer_id)
+
+    with self.adwords_client.AsCustomer('scoped'):
+      context = self.header_handler.CopyContext()
+    thread = threading.Thread(target=GetClientCustomerId, args=(context,))
+    thread.start()
+    thread.join()
+
+    self.assertEqual(['scoped', 'client customer id'], other_thread_ids)
+
+  def testForEachCustomer(self):
+    def GetCustomerId(client):
+      if client.client_customer_id == 'bad':
+        raise ValueError('bad customer')
+      return client.client_customer_id
+
+    results = self.adwords_client.ForEachCustomer(
+        ['a', 'bad', 'b', 'c'], GetCustomerId, max_workers=2)
+
+    self.assertEqual(['a', 'bad', 'b', 'c'], list(results))
+    self.assertEqual(googleads.adwords.CustomerResult('a', None), results['a'])
+    self.assertEqual('c', results['c'].result)
+    self.assertIsNone(results['bad'].result)
+    self.assertIsInstance(results['bad'].error, ValueError)
+    self.assertEqual('client customer id',
+                     self.adwords_client.client_customer_id)
+
+  def testForEachCustomer_duplicateCustomers(self):
+    calls = []
+
+    def GetCustomerId(client):
+      calls.append(client.client_customer_id)
+      return client.client_customer_id
+
+    results = self.adwords_client.ForEachCustomer(
+        ['a', 'b', 'a'], GetCustomerId, max_workers=1)
+
+    self.assertEqual(['a', 'b'], list(results))
+    self.assertEqual(['a', 'b'], calls)
+
+  def testForEachCustomer_incomplete(self):
+    def Exit(client):
+      if client.client_customer_id == 'exit':
+        raise SystemExit()
+      return client.client_customer_id
+
+    # Threads exit quietly on SystemExit.
+    results = self.adwords_client.ForEachCustomer(['a', 'exit'], Exit,
+                                                  max_workers=1)
+
+    self.assertEqual('a', results['a'].result)
+    self.assertIsNone(results['exit'].result)
+    self.assertIsInstance(results['exit'].error,
+                          googleads.errors.GoogleAdsError)
+
+  def testForEachCustomer_rateLimited(self):
+    suds_client = mock.Mock()
+    rate_limiters = []
+
+    def MakeRequests(client):
+      self.header_handler.SetHeaders(suds_client)
+      self.header_handler.GetReportDownloadHeaders()
+
+    # Each customer gets its own limiter, which only the thread running for the
+    # customer waits on, so that the mocks' call counts aren't updated
+    # concurrently.
+    def CreateRateLimiter(requests_per_second):
+      rate_limiters.append(mock.Mock())
+      return rate_limiters[-1]
+
+    with mock.patch('googleads.common.RateLimiter') as mock_limiter:
+      mock_limiter.side_effect = CreateRateLimiter
+      results = self.adwords_client.ForEachCustomer(
+          ['a', 'b'], MakeRequests, max_requests_per_second=5)
+
+    self.assertIsNone(results['a'].error)
+    self.assertIsNone(results['b'].error)
+    self.assertEqual([mock.call(5), mock.call(5)], mock_limiter.call_args_list)
+    self.assertEqual([2, 2], [rate_limiter.Wait.call_count
+                              for rate_limiter in rate_limiters])
+    # Requests made outside of ForEachCustomer are not limited.
+    self.header_handler.SetHeaders(suds_client)
+    self.assertEqual([2, 2], [rate_limiter.Wait.call_count
+                              for rate_limiter in rate_limiters])
+
+  def testForEachCustomer_invalidMaxWorkers(self):
+    self.assertRaises(
+        googleads.errors.GoogleAdsValueError,
+        self.adwords_client.ForEachCustomer, ['a'], mock.Mock(), max_workers=0)
+
 
 class BatchJobHelperTest(unittest.TestCase):
 
@@ -1287,6 +1421,20 @@ class IncrementalUploadHelperTest(unittest.TestCase):
 
     self.assertEqual(expected, dump_data)
 
+  def testInitializeURL(self):
+    with mock.patch('urllib2.Request') as mock_request:
+      with mock.patch('urllib2.OpenerDirector.open') as mock_open:
+        mock_open.return_value.headers = {'location': self.initialized_url}
+        url = self.incremental_uploader._InitializeURL(self.original_url, 0)
+
+    self.assertEqual(self.initialized_url, url)
+    mock_request.assert_called_once_with(
+        self.original_url, data='', headers={
+            'Content-Type': 'application/xml',
+            'Content-Length': 0,
+            'x-goog-resumable': 'start'})
+    mock_open.assert_called_once_with(mock_request.return_value)
+
   def testLoad(self):
     s = StringIO.StringIO(self.incremental_uploader_dump)
 
@@ -1332,6 +1480,211 @@ class IncrementalUploadHelperTest(unittest.TestCase):
             self.incremental_uploader.UploadOperations, {})
 
 
+class AccountHierarchyTest(unittest.TestCase):
+  """Tests for the googleads.adwords.AccountHierarchy class."""
+
+  def setUp(self):
+    self.adwords_client = GetAdWordsClient(ccid=1)
+    self.adwords_client.GetService = mock.Mock()
+    self.service = self.adwords_client.GetService.return_value
+    # 1 manages 2 and 3, 2 manages 4, and both 2 and 3 manage 5.
+    self.service.get.side_effect = [
+        self._CreatePage([1, 2, 3], [(1, 2), (1, 3), (2, 4)], 5),
+        self._CreatePage([4, 5], [(2, 5), (3, 5)], 5)]
+    self.cache_path = os.path.join(tempfile.mkdtemp(), 'hierarchy.json')
+
+  def tearDown(self):
+    if os.path.exists(self.cache_path):
+      os.remove(self.cache_path)
+    os.rmdir(os.path.dirname(self.cache_path))
+
+  def _CreatePage(self, customer_ids, links, total_num_entries):
+    entries = []
+    for customer_id in customer_ids:
+      entry = mock.Mock(customerId=customer_id, canManageClients=False)
+      entry.name = 'Account %d' % customer_id
+      entries.append(entry)
+    links = [mock.Mock(managerCustomerId=manager_id, clientCustomerId=client_id)
+             for manager_id, client_id in links]
+    return mock.Mock(entries=entries, links=links,
+                     totalNumEntries=total_num_entries)
+
+  def testInit(self):
+    with mock.patch('googleads.adwords._MANAGED_CUSTOMER_PAGE_SIZE', 3):
+      hierarchy = googleads.adwords.AccountHierarchy(self.adwords_client)
+
+    self.assertEqual(5, len(hierarchy))
+    self.assertEqual({'customerId': 4, 'name': 'Account 4',
+                      'canManageClients': False}, hierarchy.GetAccount(4))
+    self.assertEqual([1], hierarchy.GetRoots())
+    self.assertEqual([2, 3], hierarchy.GetChildren(1))
+    self.assertEqual([2, 3], hierarchy.GetParents(5))
+    self.assertEqual([2, 3, 4, 5], hierarchy.GetDescendants(1))
+    self.assertEqual([2, 3, 1], hierarchy.GetAncestors(5))
+    self.assertEqual([4, 5], sorted(hierarchy.GetLeaves()))
+    self.assertEqual([5], hierarchy.GetLeaves(3))
+    self.assertRaises(googleads.errors.GoogleAdsValueError,
+                      hierarchy.GetDescendants, 6)
+    self.assertEqual('3', self.service.get.call_args[0][0]['paging'][
+        'startIndex'])
+
+  def testInit_cached(self):
+    with mock.patch('googleads.adwords._MANAGED_CUSTOMER_PAGE_SIZE', 3):
+      googleads.adwords.AccountHierarchy(
+          self.adwords_client, cache_path=self.cache_path)
+    hierarchy = googleads.adwords.AccountHierarchy(
+        self.adwords_client, cache_path=self.cache_path, max_age=3600)
+
+    self.assertEqual(2, self.service.get.call_count)
+    self.assertEqual([2, 3, 4, 5], hierarchy.GetDescendants(1))
+    self.assertEqual('Account 5', hierarchy.GetAccount(5)['name'])
+
+  def testInit_cacheExpired(self):
+    with mock.patch('googleads.adwords._MANAGED_CUSTOMER_PAGE_SIZE', 3):
+      googleads.adwords.AccountHierarchy(
+          self.adwords_client, cache_path=self.cache_path)
+      self.service.get.side_effect = [
+          self._CreatePage([1], [], 1)]
+      with mock.patch('googleads.adwords.time.time',
+                      return_value=time.time() + 60):
+        hierarchy = googleads.adwords.AccountHierarchy(
+            self.adwords_client, cache_path=self.cache_path, max_age=30)
+
+    self.assertEqual(3, self.service.get.call_count)
+    self.assertEqual(1, len(hierarchy))
+
+  def testRefresh_subtree(self):
+    with mock.patch('googleads.adwords._MANAGED_CUSTOMER_PAGE_SIZE', 3):
+      hierarchy = googleads.adwords.AccountHierarchy(self.adwords_client)
+    # 4 was moved away from 2, and 6 added under it.
+    crawled_customer_ids = []
+
+    def GetPage(unused_selector):
+      crawled_customer_ids.append(self.adwords_client.client_customer_id)
+      return self._CreatePage([2, 5, 6], [(2, 5), (2, 6)], 3)
+
+    self.service.get.side_effect = GetPage
+
+    hierarchy.Refresh(2)
+
+    self.assertEqual([2], crawled_customer_ids)
+    self.assertNotIn(4, hierarchy)
+    self.assertEqual([2, 3, 5, 6], hierarchy.GetDescendants(1))
+    self.assertEqual([2, 3], hierarchy.GetParents(5))
+
+
+class ChangeTrackerTest(unittest.TestCase):
+  """Tests for the googleads.adwords.ChangeTracker class."""
+
+  def setUp(self):
+    self.adwords_client = GetAdWordsClient(ccid='1')
+    self.adwords_client.GetService = mock.Mock()
+    self.service = self.adwords_client.GetService.return_value
+    self.change_tracker = googleads.adwords.ChangeTracker(
+        self.adwords_client, batch_size=2)
+
+  def _CreateCampaignChangeData(self, campaign_id, ad_group_ids):
+    ad_groups = [mock.Mock(adGroupId=ad_group_id)
+                 for ad_group_id in ad_group_ids]
+    return mock.Mock(campaignId=campaign_id, changedAdGroups=ad_groups)
+
+  def testGetChanges(self):
+    self.service.get.side_effect = [
+        mock.Mock(changedCampaigns=[self._CreateCampaignChangeData(1, [10]),
+                                    self._CreateCampaignChangeData(2, [])],
+                  changedFeeds=[mock.Mock(feedId=5)],
+                  lastChangeTimestamp='20160102 030405'),
+        mock.Mock(changedCampaigns=[self._CreateCampaignChangeData(3, [30])],
+                  changedFeeds=[mock.Mock(feedId=5)],
+                  lastChangeTimestamp='20160102 010000')]
+
+    changes = self.change_tracker.GetChanges(
+        [1, 2, 3], since=datetime.datetime(2016, 1, 1))
+
+    self.assertEqual([1, 2, 3], sorted(changes.campaigns))
+    self.assertEqual([10, 30], sorted(changes.ad_groups))
+    self.assertEqual([5], list(changes.feeds))
+    self.assertEqual('20160102 030405', changes.last_change_timestamp)
+    self.assertEqual({'1': {'1': '20160102 030405', '2': '20160102 030405',
+                            '3': '20160102 010000'}},
+                     self.change_tracker.watermarks)
+    selectors = [call[0][0] for call in self.service.get.call_args_list]
+    self.assertEqual([[1, 2], [3]],
+                     [selector['campaignIds'] for selector in selectors])
+    self.assertEqual('20160101 000000', selectors[0]['dateTimeRange']['min'])
+
+  def testGetChanges_usesWatermark(self):
+    self.change_tracker.watermarks['1'] = {'1': '20160102 030405'}
+    self.service.get.return_value = None
+
+    with self.adwords_client.AsCustomer('2'):
+      changes = self.change_tracker.GetChanges([1])
+    self.assertNotEqual('20160102 030405', self.service.get.call_args[0][0][
+        'dateTimeRange']['min'])
+
+    changes = self.change_tracker.GetChanges([1])
+    self.assertEqual('20160102 030405', self.service.get.call_args[0][0][
+        'dateTimeRange']['min'])
+    self.assertEqual(googleads.adwords.AccountChanges({}, {}, {}, None),
+                     changes)
+    self.assertEqual({'1': {'1': '20160102 030405'}},
+                     self.change_tracker.watermarks)
+
+  def testGetChanges_watermarkPerCampaign(self):
+    self.service.get.return_value = mock.Mock(
+        changedCampaigns=[], changedFeeds=[],
+        lastChangeTimestamp='20160102 030405')
+    self.change_tracker.GetChanges([1], since=datetime.datetime(2016, 1, 1))
+
+    self.change_tracker.GetChanges([2], since=datetime.datetime(2016, 1, 1))
+    self.assertEqual('20160101 000000', self.service.get.call_args[0][0][
+        'dateTimeRange']['min'])
+    self.change_tracker.GetChanges([1])
+    self.assertEqual('20160102 030405', self.service.get.call_args[0][0][
+        'dateTimeRange']['min'])
+    self.assertEqual({'1': {'1': '20160102 030405', '2': '20160102 030405'}},
+                     self.change_tracker.watermarks)
+
+  def testGetChanges_batchesByWatermark(self):
+    self.change_tracker.watermarks['1'] = {'1': '20160103 000000',
+                                           '2': '20160101 000000',
+                                           '3': '20160103 000000'}
+    self.service.get.return_value = None
+
+    self.change_tracker.GetChanges([1, 2, 3, 4],
+                                   since=datetime.datetime(2015, 1, 1))
+
+    selectors = [call[0][0] for call in self.service.get.call_args_list]
+    self.assertEqual([([4, 2], '20150101 000000'), ([1, 3], '20160103 000000')],
+                     [(selector['campaignIds'],
+                       selector['dateTimeRange']['min'])
+                      for selector in selectors])
+
+  def testGetChanges_failureKeepsWatermarks(self):
+    self.change_tracker.watermarks['1'] = {'1': '20160102 030405'}
+    self.service.get.side_effect = [
+        mock.Mock(changedCampaigns=[], changedFeeds=[],
+                  lastChangeTimestamp='20160103 000000'),
+        suds.WebFault(mock.Mock(), mock.Mock())]
+
+    self.assertRaises(suds.WebFault, self.change_tracker.GetChanges, [1, 2, 3])
+    self.assertEqual({'1': {'1': '20160102 030405'}},
+                     self.change_tracker.watermarks)
+
+  def testGetChanges_watermarksSerializable(self):
+    self.service.get.return_value = mock.Mock(
+        changedCampaigns=[], changedFeeds=[],
+        lastChangeTimestamp='20160102 030405')
+    self.change_tracker.GetChanges([1, 2])
+
+    change_tracker = googleads.adwords.ChangeTracker(
+        self.adwords_client,
+        watermarks=json.loads(json.dumps(self.change_tracker.watermarks)))
+    change_tracker.GetChanges([2])
+    self.assertEqual('20160102 030405', self.service.get.call_args[0][0][
+        'dateTimeRange']['min'])
+
+
 class ResponseParserTest(unittest.TestCase):
   """Test suite for the ResponseParser."""
 
@@ -1414,6 +1767,209 @@ class ResponseParserTest(unittest.TestCase):
     self.assertTrue(campaign['name'] == name)
 
 
+class MutateCoalescerTest(unittest.TestCase):
+  """Tests for the googleads.adwords.MutateCoalescer class."""
+
+  def setUp(self):
+    self.adwords_client = GetAdWordsClient(ccid='1')
+    self.service = mock.Mock()
+    self.coalescer = googleads.adwords.MutateCoalescer(
+        self.adwords_client, self.service, max_operations=3, max_delay=60)
+
+  def _CreateResult(self, values, failed_indexes=()):
+    result = suds.sudsobject.Object()
+    result.value = values
+    result.partialFailureErrors = []
+    for index in failed_indexes:
+      error = suds.sudsobject.Object()
+      error.fieldPath = 'operations[%d].operand' % index
+      result.partialFailureErrors.append(error)
+    return result
+
+  def testSubmit(self):
+    self.service.mutate.return_value = self._CreateResult(
+        ['a', None, 'c'], failed_indexes=[1])
+
+    first = self.coalescer.Submit(['a'])
+    self.assertFalse(first.Done())
+    second = self.coalescer.Submit(['b', 'c'])
+
+    self.service.mutate.assert_called_once_with(['a', 'b', 'c'])
+    self.assertEqual(['a'], first.Result().value)
+    self.assertEqual([], first.Result().partialFailureErrors)
+    self.assertEqual([None, 'c'], second.Result().value)
+    self.assertEqual(['operations[0].operand'],
+                     [error.fieldPath
+                      for error in second.Result().partialFailureErrors])
+    self.assertEqual([0], second.Result().partial_failure_index.failed_indexes)
+
+  def testSubmit_sendsAfterDelay(self):
+    self.coalescer = googleads.adwords.MutateCoalescer(
+        self.adwords_client, self.service, max_delay=0.01)
+    self.service.mutate.return_value = self._CreateResult(['a'])
+
+    self.assertEqual(['a'], self.coalescer.Mutate(['a']).value)
+
+  def testSubmit_batchesPerCustomer(self):
+    customer_ids = []
+    self.service.mutate.side_effect = lambda operations: (
+        customer_ids.append(self.adwords_client.client_customer_id) or
+        self._CreateResult(operations))
+
+    first = self.coalescer.Submit(['a'])
+    with self.adwords_client.AsCustomer('2'):
+      second = self.coalescer.Submit(['b'])
+    self.coalescer.Flush()
+
+    self.assertEqual(['1', '2'], sorted(customer_ids))
+    self.assertEqual(['a'], first.Result().value)
+    self.assertEqual(['b'], second.Result().value)
+
+  def testSubmit_error(self):
+    error = suds.WebFault(None, None)
+    self.service.mutate.side_effect = error
+
+    futures = [self.coalescer.Submit(['a']), self.coalescer.Submit(['b', 'c'])]
+
+    for future in futures:
+      self.assertRaises(suds.WebFault, future.Result)
+
+  def testResult_timeout(self):
+    self.service.mutate.return_value = self._CreateResult(['a'])
+    future = self.coalescer.Submit(['a'])
+
+    self.assertRaises(googleads.errors.GoogleAdsError, future.Result, 0)
+    self.coalescer.Flush()
+
+
+class ReportFieldCatalogTest(unittest.TestCase):
+  """Tests for the googleads.adwords.ReportFieldCatalog class."""
+
+  def setUp(self):
+    self.adwords_client = mock.Mock()
+    self.service = self.adwords_client.GetService.return_value
+    self.service.getReportFields.return_value = [
+        {'fieldName': 'Cost', 'fieldType': 'Money', 'canFilter': True},
+        {'fieldName': 'Status', 'fieldType': 'CampaignStatus',
+         'canFilter': False, 'enumValues': ('ENABLED', 'PAUSED')}]
+    self.cache_dir = tempfile.mkdtemp()
+    self.catalog = googleads.adwords.ReportFieldCatalog(
+        self.adwords_client, 'https://server', max_size=2)
+
+  def tearDown(self):
+    for file_name in os.listdir(self.cache_dir):
+      os.remove(os.path.join(self.cache_dir, file_name))
+    os.rmdir(self.cache_dir)
+
+  def testLookups(self):
+    self.assertEqual({'Cost': 'Money', 'Status': 'CampaignStatus'},
+                     self.catalog.GetFieldTypes('CAMPAIGN_REPORT', 'v1'))
+    self.assertEqual(['ENABLED', 'PAUSED'],
+                     self.catalog.GetEnumValues('CAMPAIGN_REPORT', 'Status',
+                                                'v1'))
+    self.assertEqual([], self.catalog.GetEnumValues('CAMPAIGN_REPORT', 'Cost',
+                                                    'v1'))
+    self.assertTrue(self.catalog.CanFilter('CAMPAIGN_REPORT', 'Cost', 'v1'))
+    self.assertFalse(self.catalog.CanFilter('CAMPAIGN_REPORT', 'Status', 'v1'))
+    self.assertRaises(googleads.errors.GoogleAdsValueError,
+                      self.catalog.GetField, 'CAMPAIGN_REPORT', 'Nope', 'v1')
+
+    self.adwords_client.GetService.assert_called_once_with(
+        'ReportDefinitionService', 'v1', 'https://server')
+    self.service.getReportFields.assert_called_once_with('CAMPAIGN_REPORT')
+
+  def testGetFields_leastRecentlyUsedEvicted(self):
+    self.catalog.GetFields('A', 'v1')
+    self.catalog.GetFields('B', 'v1')
+    self.catalog.GetFields('A', 'v1')
+    self.catalog.GetFields('A', 'v2')
+    self.assertEqual(3, self.service.getReportFields.call_count)
+
+    self.catalog.GetFields('A', 'v1')
+    self.assertEqual(3, self.service.getReportFields.call_count)
+    self.catalog.GetFields('B', 'v1')
+    self.assertEqual(4, self.service.getReportFields.call_count)
+
+  def testGetFields_cacheDir(self):
+    catalog = googleads.adwords.ReportFieldCatalog(
+        self.adwords_client, cache_dir=self.cache_dir)
+    fields = catalog.GetFields('CAMPAIGN_REPORT', 'v1')
+
+    other_catalog = googleads.adwords.ReportFieldCatalog(
+        self.adwords_client, cache_dir=self.cache_dir)
+    self.assertEqual(fields, other_catalog.GetFields('CAMPAIGN_REPORT', 'v1'))
+    self.assertEqual(['v1_CAMPAIGN_REPORT.json'], os.listdir(self.cache_dir))
+    self.service.getReportFields.assert_called_once_with('CAMPAIGN_REPORT')
+
+
+class ReportCacheTest(unittest.TestCase):
+  """Tests for the googleads.adwords.ReportCache class."""
+
+  def setUp(self):
+    self.cache_dir = tempfile.mkdtemp()
+    self.report_cache = googleads.adwords.ReportCache(self.cache_dir)
+
+  def tearDown(self):
+    for file_name in os.listdir(self.cache_dir):
+      os.remove(os.path.join(self.cache_dir, file_name))
+    os.rmdir(self.cache_dir)
+
+  def testPutAndOpen(self):
+    self.assertIsNone(self.report_cache.Open('key'))
+    cached_report = self.report_cache.Put('key', io.BytesIO(b'a,b\n1,2\n'))
+    self.assertEqual(b'a,b\n1,2\n', cached_report.read())
+    cached_report.close()
+
+    cached_report = self.report_cache.Open('key')
+    self.assertEqual(b'a,b\n1,2\n', cached_report.read())
+    cached_report.close()
+    self.assertEqual(['key.report.gz'], os.listdir(self.cache_dir))
+
+  def testPut_readError(self):
+    stream = mock.Mock()
+    stream.read.side_effect = [b'a,b\n', IOError('Connection reset.')]
+
+    self.assertRaises(IOError, self.report_cache.Put, 'key', stream)
+    self.assertIsNone(self.report_cache.Open('key'))
+    self.assertEqual([], os.listdir(self.cache_dir))
+
+  def testPut_evictsLeastRecentlyUsed(self):
+    for key in ('first', 'second'):
+      self.report_cache.Put(key, io.BytesIO(os.urandom(1000))).close()
+    os.utime(os.path.join(self.cache_dir, 'first.report.gz'), (1, 1))
+    os.utime(os.path.join(self.cache_dir, 'second.report.gz'), (2, 2))
+    self.report_cache.Open('first').close()
+    self.report_cache._max_size = 2500
+
+    self.report_cache.Put('third', io.BytesIO(os.urandom(1000))).close()
+
+    self.assertEqual(['first.report.gz', 'third.report.gz'],
+                     sorted(os.listdir(self.cache_dir)))
+
+  def testPut_largerThanMaxSize(self):
+    report = os.urandom(5000)
+    self.report_cache = googleads.adwords.ReportCache(self.cache_dir, 100)
+    self.report_cache.Put('first', io.BytesIO(b'1,2\n')).close()
+
+    cached_report = self.report_cache.Put('second', io.BytesIO(report))
+    self.assertEqual(report, cached_report.read())
+    cached_report.close()
+
+    self.assertEqual(['second.report.gz'], os.listdir(self.cache_dir))
+    cached_report = self.report_cache.Open('second')
+    self.assertEqual(report, cached_report.read())
+    cached_report.close()
+
+  def testPut_evictedByOtherThread(self):
+    with mock.patch.object(self.report_cache, '_Evict',
+                           side_effect=lambda path: os.remove(path)):
+      cached_report = self.report_cache.Put('key', io.BytesIO(b'1,2\n'))
+
+    self.assertEqual(b'1,2\n', cached_report.read())
+    cached_report.close()
+    self.assertIsNone(self.report_cache.Open('key'))
+
+
 class ReportDownloaderTest(unittest.TestCase):
   """Tests for the googleads.adwords.ReportDownloader class."""
 
@@ -1432,11 +1988,37 @@ class ReportDownloaderTest(unittest.TestCase):
               'googleads.adwords._AdWordsHeaderHandler') as mock_handler:
             with mock.patch(
                 URL_REQUEST_PATH + '.OpenerDirector') as mock_opener:
-              mock_literal.return_value = self.marshaller
-              mock_handler.return_value = self.header_handler
-              mock_opener.return_value = self.opener
-              self.report_downloader = googleads.adwords.ReportDownloader(
-                  self.adwords_client, self.version)
+              with mock.patch.dict('googleads.adwords._REPORT_SCHEMAS',
+                                   clear=True):
+                mock_literal.return_value = self.marshaller
+                mock_handler.return_value = self.header_handler
+                mock_opener.return_value = self.opener
+                self.report_downloader = googleads.adwords.ReportDownloader(
+                    self.adwords_client, self.version)
+
+  def testInit_sharesSchema(self):
+    with mock.patch('suds.client.Client') as mock_client:
+      with mock.patch('suds.xsd.doctor'):
+        with mock.patch('suds.mx.literal.Literal') as mock_literal:
+          with mock.patch.dict('googleads.adwords._REPORT_SCHEMAS', clear=True):
+            for version in (self.version, self.version, 'v201605'):
+              googleads.adwords.ReportDownloader(self.adwords_client, version)
+
+    self.assertEqual(2, mock_client.call_count)
+    self.assertNotIn('cachingpolicy', mock_client.call_args[1])
+    self.assertEqual(3, mock_literal.call_count)
+
+  def testInit_objectCache(self):
+    self.adwords_client.cache = mock.Mock(spec=suds.cache.ObjectCache)
+    with mock.patch('suds.client.Client') as mock_client:
+      with mock.patch('suds.xsd.doctor'):
+        with mock.patch('suds.mx.literal.Literal'):
+          with mock.patch.dict('googleads.adwords._REPORT_SCHEMAS', clear=True):
+            googleads.adwords.ReportDownloader(self.adwords_client)
+
+    self.assertEqual(1, mock_client.call_args[1]['cachingpolicy'])
+    self.assertEqual(self.adwords_client.cache,
+                     mock_client.call_args[1]['cache'])
 
   def testDownloadReport(self):
     output_file = io.StringIO()
@@ -1525,6 +2107,187 @@ class ReportDownloaderTest(unittest.TestCase):
     self.header_handler.GetReportDownloadHeaders.assert_called_once_with(
         include_zero_impressions=True, use_raw_enum_values=False)
 
+  def testDownloadReportAsColumnsWithAwql(self):
+    query = ('SELECT CampaignName, Impressions, Ctr, Cost '
+             'FROM CAMPAIGN_PERFORMANCE_REPORT')
+    self.header_handler.GetReportDownloadHeaders.return_value = {}
+    self.adwords_client.GetService.return_value.getReportFields.return_value = [
+        {'fieldName': 'CampaignName', 'fieldType': 'String'},
+        {'fieldName': 'Impressions', 'fieldType': 'Long'},
+        {'fieldName': 'Ctr', 'fieldType': 'Double'},
+        {'fieldName': 'Cost', 'fieldType': 'Money'}]
+    content = u'Campaign 广告客户,10,1.50%,2000000\nOther,--,0.00%,0\n'
+    fake_request = io.BytesIO(content.encode('utf-8'))
+
+    with mock.patch('googleads.common.numpy', None):
+      with mock.patch(URL_REQUEST_PATH + '.Request'):
+        self.opener.open.return_value = fake_request
+        columns = self.report_downloader.DownloadReportAsColumnsWithAwql(
+            query, client_customer_id='1234567890')
+
+    self.assertEqual(['CampaignName', 'Impressions', 'Ctr', 'Cost'],
+                     list(columns.keys()))
+    self.assertEqual([u'Campaign 广告客户', u'Other'], columns['CampaignName'])
+    self.assertEqual('d', columns['Impressions'].typecode)
+    self.assertEqual(10, columns['Impressions'][0])
+    self.assertNotEqual(columns['Impressions'][1], columns['Impressions'][1])
+    self.assertEqual(array.array('d', [1.5, 0.0]), columns['Ctr'])
+    self.assertEqual(array.array('l', [2000000, 0]), columns['Cost'])
+    self.header_handler.GetReportDownloadHeaders.assert_called_once_with(
+        client_customer_id='1234567890', skip_report_header=True,
+        skip_column_header=True, skip_report_summary=True)
+    self.adwords_client.GetService.assert_called_once_with(
+        'ReportDefinitionService', self.version, 'https://adwords.google.com')
+    (self.adwords_client.GetService.return_value.getReportFields
+     .assert_called_once_with('CAMPAIGN_PERFORMANCE_REPORT'))
+
+  def testDownloadReportAsColumnsWithAwql_invalidQuery(self):
+    self.assertRaises(
+        googleads.errors.GoogleAdsValueError,
+        self.report_downloader.DownloadReportAsColumnsWithAwql,
+        'CampaignName FROM CAMPAIGN_PERFORMANCE_REPORT')
+
+  def _SetReportFieldTypes(self):
+    self.header_handler.GetReportDownloadHeaders.return_value = {}
+    self.adwords_client.GetService.return_value.getReportFields.return_value = [
+        {'fieldName': 'CampaignName', 'fieldType': 'String'},
+        {'fieldName': 'Impressions', 'fieldType': 'Long'},
+        {'fieldName': 'Ctr', 'fieldType': 'Double'}]
+
+  def testIterReportRows_gzippedCsv(self):
+    self._SetReportFieldTypes()
+    query = 'SELECT CampaignName, Impressions, Ctr FROM CAMPAIGN_REPORT'
+    content = u'"Campaign, 广告客户","1,000",1.50%\nOther,--,0.00%\n'
+    gzip_buffer = io.BytesIO()
+    with gzip.GzipFile(fileobj=gzip_buffer, mode='wb') as gzip_file:
+      gzip_file.write(content.encode('utf-8'))
+    gzip_buffer.seek(0)
+
+    with mock.patch('googleads.adwords._REPORT_READ_CHUNK_SIZE', 7):
+      with mock.patch(URL_REQUEST_PATH + '.Request') as mock_request:
+        self.opener.open.return_value = gzip_buffer
+        rows = list(self.report_downloader.IterReportRows(
+            query, 'GZIPPED_CSV', as_namedtuples=True))
+
+    self.assertEqual(2, len(rows))
+    self.assertEqual(u'Campaign, 广告客户', rows[0].CampaignName)
+    self.assertEqual(1000, rows[0].Impressions)
+    self.assertEqual(1.5, rows[0].Ctr)
+    self.assertEqual((u'Other', None, 0.0), tuple(rows[1]))
+    self.assertIn('GZIPPED_CSV', mock_request.call_args[0][1])
+    self.assertTrue(gzip_buffer.closed)
+
+  def testIterReportRows_tsv(self):
+    self._SetReportFieldTypes()
+    query = 'SELECT CampaignName, Impressions, Ctr FROM CAMPAIGN_REPORT'
+    content = '"Summer" sale, 50%\t10\t1.50%\n"Winter\t0\t0.00%\n'
+
+    with mock.patch(URL_REQUEST_PATH + '.Request'):
+      self.opener.open.return_value = io.BytesIO(content)
+      rows = list(self.report_downloader.IterReportRows(query, 'TSV'))
+
+    self.assertEqual([(u'"Summer" sale, 50%', 10, 1.5),
+                      (u'"Winter', 0, 0.0)], rows)
+
+  def testIterReportRows_xml(self):
+    self._SetReportFieldTypes()
+    report_definition = {
+        'reportType': 'CAMPAIGN_REPORT',
+        'downloadFormat': 'XML',
+        'selector': {'fields': ['CampaignName', 'Impressions', 'Ctr']}}
+    content = (
+        '<?xml version="1.0" standalone="yes"?><report><table><columns>'
+        '<column name="campaign" display="Campaign"/>'
+        '<column name="impressions" display="Impressions"/>'
+        '<column name="ctr" display="CTR"/></columns>'
+        '<row campaign="First" impressions="10" ctr="1.50%"/>'
+        '<row campaign="Second" impressions="0" ctr="0.00%"/>'
+        '</table></report>')
+
+    with mock.patch('googleads.adwords._REPORT_READ_CHUNK_SIZE', 16):
+      with mock.patch(URL_REQUEST_PATH + '.Request'):
+        with mock.patch.object(self.report_downloader,
+                               '_SerializeReportDefinition'):
+          self.opener.open.return_value = io.BytesIO(content)
+          rows = list(self.report_downloader.IterReportRows(report_definition))
+
+    self.assertEqual([(u'First', 10, 1.5), (u'Second', 0, 0.0)], rows)
+
+  def testIterReportRows_unsupportedFormat(self):
+    self.assertRaises(
+        googleads.errors.GoogleAdsValueError,
+        self.report_downloader.IterReportRows,
+        'SELECT CampaignName FROM CAMPAIGN_REPORT', 'CSVFOREXCEL')
+
+  def testDownloadReportAsStreamWithAwql_cached(self):
+    cache_dir = tempfile.mkdtemp()
+    self.report_downloader._report_cache = googleads.adwords.ReportCache(
+        cache_dir)
+    self.header_handler.GetReportDownloadHeaders.return_value = {
+        'clientCustomerId': '1', 'Authorization': 'token'}
+    query = 'SELECT Id FROM CRITERIA_REPORT DURING 20160101,20160131'
+
+    try:
+      with mock.patch(URL_REQUEST_PATH + '.Request'):
+        self.opener.open.side_effect = lambda _: io.BytesIO(b'1\n2\n')
+        for _ in range(2):
+          stream = self.report_downloader.DownloadReportAsStreamWithAwql(
+              query, 'CSV')
+          self.assertEqual(b'1\n2\n', stream.read())
+          stream.close()
+        self.assertEqual(1, self.opener.open.call_count)
+
+        self.report_downloader._report_cache._max_size = 1
+        self.header_handler.GetReportDownloadHeaders.return_value = {
+            'clientCustomerId': '3', 'Authorization': 'token'}
+        stream = self.report_downloader.DownloadReportAsStreamWithAwql(
+            query, 'CSV')
+        self.assertEqual(b'1\n2\n', stream.read())
+        stream.close()
+        self.report_downloader._report_cache._max_size = (
+            googleads.adwords._DEFAULT_REPORT_CACHE_MAX_SIZE)
+
+        self.header_handler.GetReportDownloadHeaders.return_value = {
+            'clientCustomerId': '2', 'Authorization': 'token'}
+        self.report_downloader.DownloadReportAsStreamWithAwql(
+            query, 'CSV').close()
+        self.assertEqual(3, self.opener.open.call_count)
+    finally:
+      for file_name in os.listdir(cache_dir):
+        os.remove(os.path.join(cache_dir, file_name))
+      os.rmdir(cache_dir)
+
+  def testIsReportFinal(self):
+    today = datetime.date.today().strftime('%Y%m%d')
+    self.assertTrue(googleads.adwords._IsReportFinal(urllib.urlencode(
+        {'__rdquery': 'SELECT Id FROM R DURING 20160101, 20160131'})))
+    self.assertFalse(googleads.adwords._IsReportFinal(urllib.urlencode(
+        {'__rdquery': 'SELECT Id FROM R DURING 20160101,%s' % today})))
+    self.assertFalse(googleads.adwords._IsReportFinal(urllib.urlencode(
+        {'__rdquery': 'SELECT Id FROM R DURING YESTERDAY'})))
+    report_xml = (
+        '<reportDefinition xmlns="https://adwords.google.com/api/adwords/cm">'
+        '<selector><dateRange><min>20160101</min><max>20160131</max>'
+        '</dateRange></selector><dateRangeType>%s</dateRangeType>'
+        '</reportDefinition>')
+    self.assertTrue(googleads.adwords._IsReportFinal(urllib.urlencode(
+        {'__rdxml': report_xml % 'CUSTOM_DATE'})))
+    self.assertFalse(googleads.adwords._IsReportFinal(urllib.urlencode(
+        {'__rdxml': report_xml % 'LAST_7_DAYS'})))
+
+  def testGetReportFieldTypes_cached(self):
+    report_definition_service = self.adwords_client.GetService.return_value
+    report_definition_service.getReportFields.return_value = [
+        {'fieldName': 'Id', 'fieldType': 'Long'}]
+
+    for _ in range(2):
+      self.assertEqual(
+          {'Id': 'Long'},
+          self.report_downloader._GetReportFieldTypes('CRITERIA_REPORT'))
+
+    report_definition_service.getReportFields.assert_called_once_with(
+        'CRITERIA_REPORT')
+
   def testDownloadReportCheckFormat_CSVStringSuccess(self):
     output_file = io.StringIO()
 
@@ -15,6 +15,13 @@
 """Unit tests to cover the common module."""
 
 
+import array
+import copy
+import io
+import os
+import tempfile
+import threading
+import time
 import unittest
 import urllib2
 import warnings
@@ -24,13 +31,74 @@ from pyfakefs import fake_filesystem
 from pyfakefs import fake_tempfile
 import mock
 import suds
+import suds.cache
+import suds.client
 import yaml
 
 import googleads.common
 import googleads.errors
+import googleads.metrics
 import googleads.oauth2
 
 
+# A WSDL with a single operation taking a SOAP header.
+_TEST_WSDL = """<?xml version="1.0" encoding="UTF-8"?>
+<wsdl:definitions xmlns:wsdl="http://schemas.xmlsoap.org/wsdl/"
+    xmlns:soap="http://schemas.xmlsoap.org/wsdl/soap/"
+    xmlns:xsd="http://www.w3.org/2001/XMLSchema"
+    xmlns:tns="https://example.com/test"
+    targetNamespace="https://example.com/test">
+  <wsdl:types>
+    <xsd:schema targetNamespace="https://example.com/test"
+        elementFormDefault="qualified">
+      <xsd:element name="header" type="xsd:string"/>
+      <xsd:element name="Get">
+        <xsd:complexType><xsd:sequence>
+          <xsd:element name="value" type="xsd:string"/>
+        </xsd:sequence></xsd:complexType>
+      </xsd:element>
+      <xsd:element name="GetResponse">
+        <xsd:complexType><xsd:sequence/></xsd:complexType>
+      </xsd:element>
+    </xsd:schema>
+  </wsdl:types>
+  <wsdl:message name="header">
+    <wsdl:part name="header" element="tns:header"/>
+  </wsdl:message>
+  <wsdl:message name="GetRequest">
+    <wsdl:part name="parameters" element="tns:Get"/>
+  </wsdl:message>
+  <wsdl:message name="GetResponse">
+    <wsdl:part name="parameters" element="tns:GetResponse"/>
+  </wsdl:message>
+  <wsdl:portType name="TestServiceInterface">
+    <wsdl:operation name="Get">
+      <wsdl:input message="tns:GetRequest"/>
+      <wsdl:output message="tns:GetResponse"/>
+    </wsdl:operation>
+  </wsdl:portType>
+  <wsdl:binding name="TestServiceSoapBinding" type="tns:TestServiceInterface">
+    <soap:binding style="document"
+        transport="http://schemas.xmlsoap.org/soap/http"/>
+    <wsdl:operation name="Get">
+      <soap:operation soapAction=""/>
+      <wsdl:input>
+        <soap:header message="tns:header" part="header" use="literal"/>
+        <soap:body use="literal"/>
+      </wsdl:input>
+      <wsdl:output><soap:body use="literal"/></wsdl:output>
+    </wsdl:operation>
+  </wsdl:binding>
+  <wsdl:service name="TestService">
+    <wsdl:port name="TestServiceInterfacePort"
+        binding="tns:TestServiceSoapBinding">
+      <soap:address location="https://example.com/test/TestService"/>
+    </wsdl:port>
+  </wsdl:service>
+</wsdl:definitions>
+"""
+
+
 class CommonTest(unittest.TestCase):
   """Tests for the googleads.common module."""
 
@@ -761,6 +829,379 @@ class CommonTest(unittest.TestCase):
     factory.create.assert_any_call('ns0:EliteCampaign')
     self.assertEqual('Sales', rval.name)
 
+  def testToColumnArray(self):
+    with mock.patch('googleads.common.numpy', None):
+      self.assertEqual(array.array(googleads.common._INT64_TYPECODE, [1, 2]),
+                       googleads.common.ToColumnArray([1, 2], 'int'))
+      self.assertEqual(array.array('b', [True, False]),
+                       googleads.common.ToColumnArray([True, False], 'bool'))
+      self.assertEqual(['a', 'b'], googleads.common.ToColumnArray(['a', 'b']))
+
+  def testToColumnArray_int64(self):
+    with mock.patch('googleads.common.numpy', None):
+      rval = googleads.common.ToColumnArray([2 ** 40, -2 ** 40], 'int')
+      self.assertEqual([2 ** 40, -2 ** 40], list(rval))
+      with mock.patch.dict(googleads.common._COLUMN_TYPECODES,
+                           {'int': ('int64', None)}):
+        self.assertEqual([2 ** 40],
+                         googleads.common.ToColumnArray([2 ** 40], 'int'))
+
+  def testToColumnArray_missingValues(self):
+    with mock.patch('googleads.common.numpy', None):
+      rval = googleads.common.ToColumnArray([1, None], 'int')
+      self.assertEqual('d', rval.typecode)
+      self.assertEqual(1.0, rval[0])
+      self.assertNotEqual(rval[1], rval[1])
+      self.assertEqual([True, None],
+                       googleads.common.ToColumnArray([True, None], 'bool'))
+
+  def testToColumnArray_numpy(self):
+    with mock.patch('googleads.common.numpy') as mock_numpy:
+      rval = googleads.common.ToColumnArray([1.5, 2.5], 'float')
+      mock_numpy.array.assert_called_once_with([1.5, 2.5], dtype='float64')
+      self.assertEqual(mock_numpy.array.return_value, rval)
+
+
+class RateLimiterTest(unittest.TestCase):
+  """Tests for the googleads.common.RateLimiter class."""
+
+  def testWait(self):
+    rate_limiter = googleads.common.RateLimiter(4)
+    with mock.patch('googleads.common.time') as mock_time:
+      mock_time.time.return_value = 100
+      rate_limiter.Wait()
+      rate_limiter.Wait()
+      rate_limiter.Wait()
+      mock_time.time.return_value = 101
+      rate_limiter.Wait()
+
+    self.assertEqual([mock.call(0.25), mock.call(0.5)],
+                     mock_time.sleep.call_args_list)
+
+  def testInit_invalidRate(self):
+    self.assertRaises(googleads.errors.GoogleAdsValueError,
+                      googleads.common.RateLimiter, 0)
+
+
+class RunConcurrentlyTest(unittest.TestCase):
+  """Tests for the googleads.common.RunConcurrently function."""
+
+  def testRunConcurrently(self):
+    error = ValueError()
+    on_outcome = mock.Mock()
+
+    def Function(item):
+      if item == 2:
+        raise error
+      return item * 10
+
+    outcomes = googleads.common.RunConcurrently(
+        Function, [1, 2, 3], 2, on_outcome=on_outcome)
+
+    self.assertEqual([(10, None), (None, error), (30, None)], outcomes)
+    self.assertEqual(
+        [mock.call(0, (10, None)), mock.call(1, (None, error)),
+         mock.call(2, (30, None))],
+        sorted(on_outcome.call_args_list, key=lambda call: call[0][0]))
+
+  def testRunConcurrently_stopOnError(self):
+    error = ValueError()
+    function = mock.Mock(side_effect=[error, 20])
+
+    outcomes = googleads.common.RunConcurrently(function, [1, 2], 1,
+                                                 stop_on_error=True)
+
+    self.assertEqual([(None, error), None], outcomes)
+    function.assert_called_once_with(1)
+
+  def testRunConcurrently_threadContext(self):
+    thread_context = mock.MagicMock()
+
+    outcomes = googleads.common.RunConcurrently(
+        lambda item: item, ['a', 'b', 'c'], 2, thread_context=thread_context)
+
+    self.assertEqual([('a', None), ('b', None), ('c', None)], outcomes)
+    self.assertEqual(2, thread_context.call_count)
+    self.assertEqual(2, thread_context.return_value.__enter__.call_count)
+
+  def testRunConcurrently_incomplete(self):
+    def Function(item):
+      if item == 1:
+        # Threads exit quietly on SystemExit.
+        raise SystemExit()
+      return item
+
+    outcomes = googleads.common.RunConcurrently(Function, [1, 2], 1)
+
+    self.assertEqual([None, None], outcomes)
+
+
+class WriteFileAtomicallyTest(unittest.TestCase):
+  """Tests for the googleads.common.WriteFileAtomically function."""
+
+  def setUp(self):
+    self.directory = tempfile.mkdtemp()
+    self.path = os.path.join(self.directory, 'file.json')
+    with open(self.path, 'w') as old_file:
+      old_file.write('old')
+
+  def tearDown(self):
+    for name in os.listdir(self.directory):
+      os.remove(os.path.join(self.directory, name))
+    os.rmdir(self.directory)
+
+  def testWriteFileAtomically(self):
+    with googleads.common.WriteFileAtomically(self.path) as new_file:
+      new_file.write('new')
+      with open(self.path) as old_file:
+        self.assertEqual('old', old_file.read())
+
+    with open(self.path) as new_file:
+      self.assertEqual('new', new_file.read())
+    self.assertEqual(['file.json'], os.listdir(self.directory))
+
+  def testWriteFileAtomically_error(self):
+    def Write():
+      with googleads.common.WriteFileAtomically(self.path) as new_file:
+        new_file.write('new')
+        raise ValueError()
+
+    self.assertRaises(ValueError, Write)
+    with open(self.path) as old_file:
+      self.assertEqual('old', old_file.read())
+    self.assertEqual(['file.json'], os.listdir(self.directory))
+
+  def testWriteFileAtomically_windows(self):
+    with mock.patch('googleads.common.os.name', 'nt'):
+      with mock.patch('googleads.common.ctypes') as mock_ctypes:
+        move_file = mock_ctypes.windll.kernel32.MoveFileExW
+        move_file.return_value = 0
+        mock_ctypes.WinError.return_value = OSError('Access is denied.')
+
+        def Write():
+          with googleads.common.WriteFileAtomically(self.path) as new_file:
+            new_file.write('new')
+
+        self.assertRaises(OSError, Write)
+
+    move_file.assert_called_once_with(mock.ANY, unicode(self.path), 1)
+    self.assertEqual(['file.json'], os.listdir(self.directory))
+
+
+class PartialFailureIndexTest(unittest.TestCase):
+  """Tests for the googleads.common.PartialFailureIndex class."""
+
+  def testPartialFailureIndex(self):
+    errors = [
+        mock.Mock(fieldPath='operations[2].operand.name',
+                  fieldPathElements=[mock.Mock(field='operations', index=2),
+                                     mock.Mock(field='operand', index=None)]),
+        mock.Mock(fieldPath='operations[2].operand.budget',
+                  fieldPathElements=None),
+        mock.Mock(fieldPath='operations[0]', fieldPathElements=None),
+        mock.Mock(fieldPath='', fieldPathElements=None)]
+
+    index = googleads.common.PartialFailureIndex(errors, 4)
+
+    self.assertEqual([True, False, True, False], index.failed)
+    self.assertTrue(index.IsFailed(2))
+    self.assertFalse(index.IsFailed(1))
+    self.assertEqual(errors[:2], index.GetErrors(2))
+    self.assertEqual([], index.GetErrors(3))
+    self.assertEqual([0, 2], index.failed_indexes)
+    self.assertEqual([1, 3], index.succeeded_indexes)
+    self.assertEqual(errors[3:], index.unindexed_errors)
+
+  def testPartialFailureIndex_noErrors(self):
+    index = googleads.common.PartialFailureIndex(None, 2)
+
+    self.assertEqual([False, False], index.failed)
+    self.assertEqual([0, 1], index.succeeded_indexes)
+
+
+class ResponseCacheTest(unittest.TestCase):
+  """Tests for the googleads.common.ResponseCache class."""
+
+  def setUp(self):
+    self.response = suds.sudsobject.Factory.object('Label')
+    self.response.id = 1
+    self.response.name = 'label'
+    self.response.tags = [suds.sudsobject.Factory.object('Tag')]
+
+  def testGetTtl(self):
+    cache = googleads.common.ResponseCache({'get': 10, 'LabelService.get': 60})
+
+    self.assertEqual(60, cache.GetTtl('LabelService', 'get'))
+    self.assertEqual(10, cache.GetTtl('CampaignService', 'get'))
+    self.assertIsNone(cache.GetTtl('LabelService', 'mutate'))
+
+  def testGet(self):
+    cache = googleads.common.ResponseCache({})
+    cache.Put('key', self.response, 60)
+
+    is_cached, response = cache.Get('key')
+
+    self.assertTrue(is_cached)
+    self.assertEqual(str(self.response), str(response))
+    self.assertIsNot(self.response, response)
+    self.assertEqual((False, None), cache.Get('other key'))
+
+  def testGet_expired(self):
+    cache = googleads.common.ResponseCache({})
+    with mock.patch('time.time', return_value=100):
+      cache.Put('key', self.response, 60)
+    with mock.patch('time.time', return_value=160):
+      self.assertEqual((False, None), cache.Get('key'))
+
+  def testGet_evictsLeastRecentlyUsed(self):
+    cache = googleads.common.ResponseCache({}, max_size=2)
+    cache.Put('a', 'A', 60)
+    cache.Put('b', 'B', 60)
+    cache.Get('a')
+    cache.Put('c', 'C', 60)
+
+    self.assertEqual((True, 'A'), cache.Get('a'))
+    self.assertEqual((False, None), cache.Get('b'))
+    self.assertEqual((True, 'C'), cache.Get('c'))
+
+  def testGet_fromDisk(self):
+    cache_dir = tempfile.mkdtemp()
+    googleads.common.ResponseCache({}, cache_dir=cache_dir).Put(
+        'key', self.response, 60)
+
+    cache = googleads.common.ResponseCache({}, cache_dir=cache_dir)
+    is_cached, response = cache.Get('key')
+
+    self.assertTrue(is_cached)
+    self.assertEqual('Label', response.__class__.__name__)
+    self.assertEqual(str(self.response), str(response))
+
+    cache.Clear()
+    self.assertEqual((False, None), cache.Get('key'))
+    os.rmdir(cache_dir)
+
+  def testGet_fromDiskIgnoresInvalidFile(self):
+    cache_dir = tempfile.mkdtemp()
+    self.addCleanup(os.rmdir, cache_dir)
+    cache = googleads.common.ResponseCache({}, cache_dir=cache_dir)
+    cache.Put('key', self.response, 60)
+    cache = googleads.common.ResponseCache({}, cache_dir=cache_dir)
+    with open(os.path.join(cache_dir, 'key.response'), 'w') as cache_file:
+      cache_file.write('cos\nsystem\n(S"echo"\ntR.')
+
+    self.assertEqual((False, None), cache.Get('key'))
+    cache.Clear()
+
+  def testPut_unserializableResponse(self):
+    cache_dir = tempfile.mkdtemp()
+    self.addCleanup(os.rmdir, cache_dir)
+    cache = googleads.common.ResponseCache({}, cache_dir=cache_dir)
+
+    cache.Put('key', object(), 60)
+
+    self.assertTrue(cache.Get('key')[0])
+    self.assertEqual([], os.listdir(cache_dir))
+
+
+class SingleFlightTest(unittest.TestCase):
+  """Tests for the googleads.common.SingleFlight class."""
+
+  def setUp(self):
+    self.single_flight = googleads.common.SingleFlight(
+        ['get', 'CampaignService.query'])
+    self.release = threading.Event()
+    self.calls = []
+
+  def _Call(self, result):
+    self.calls.append(result)
+    self.release.wait()
+    if isinstance(result, Exception):
+      raise result
+    return result
+
+  def _DoConcurrently(self, key, result, thread_count):
+    outcomes = []
+
+    def Do():
+      try:
+        outcomes.append(self.single_flight.Do(key, lambda: self._Call(result)))
+      except Exception as e:  # pylint: disable=broad-except
+        outcomes.append(e)
+
+    threads = [threading.Thread(target=Do) for _ in range(thread_count)]
+    for thread in threads:
+      thread.start()
+    # Let the other threads find the first thread's call in flight.
+    while not self.calls:
+      time.sleep(0.01)
+    time.sleep(0.05)
+    self.release.set()
+    for thread in threads:
+      thread.join()
+    return outcomes
+
+  def testIsShared(self):
+    self.assertTrue(self.single_flight.IsShared('LabelService', 'get'))
+    self.assertTrue(self.single_flight.IsShared('CampaignService', 'query'))
+    self.assertFalse(self.single_flight.IsShared('LabelService', 'query'))
+
+  def testDo(self):
+    result = ['result']
+
+    outcomes = self._DoConcurrently('key', result, 3)
+
+    self.assertEqual([result] * 3, outcomes)
+    # Each caller waiting for the call gets its own copy of the result.
+    self.assertEqual(3, len(set(id(outcome) for outcome in outcomes)))
+    self.assertEqual(1, len(self.calls))
+    self.assertEqual({}, self.single_flight._calls)
+
+  def testDo_error(self):
+    error = suds.WebFault(None, None)
+
+    outcomes = self._DoConcurrently('key', error, 3)
+
+    self.assertEqual([error] * 3, outcomes)
+    self.assertEqual(1, len(self.calls))
+
+  def testDo_interrupted(self):
+    interrupted = []
+    outcomes = []
+
+    def Interrupt():
+      interrupted.append(True)
+      self.release.wait()
+      raise KeyboardInterrupt()
+
+    def Lead():
+      try:
+        self.single_flight.Do('key', Interrupt)
+      except KeyboardInterrupt as e:
+        outcomes.append(e)
+
+    leader = threading.Thread(target=Lead)
+    leader.start()
+    while not interrupted:
+      time.sleep(0.01)
+    follower = threading.Thread(target=lambda: outcomes.append(
+        self.single_flight.Do('key', lambda: 'result')))
+    follower.start()
+    time.sleep(0.05)
+    self.release.set()
+    leader.join()
+    follower.join()
+
+    self.assertIsInstance(outcomes[0], KeyboardInterrupt)
+    self.assertEqual('result', outcomes[1])
+
+  def testDo_sequentialCalls(self):
+    self.release.set()
+
+    self.single_flight.Do('key', lambda: self._Call(1))
+    self.single_flight.Do('key', lambda: self._Call(2))
+
+    self.assertEqual([1, 2], self.calls)
+
 
 class SudsServiceProxyTest(unittest.TestCase):
   """Tests for the googleads.common.SudsServiceProxy class."""
@@ -790,6 +1231,339 @@ class SudsServiceProxyTest(unittest.TestCase):
     self.client.service.SoapMethod.assert_called_once_with('modified_test')
     self.header_handler.SetHeaders.assert_called_once_with(self.client)
 
+  def testSudsServiceProxy_perThreadClients(self):
+    thread_client = mock.Mock()
+    thread_clients = []
+
+    def CallSoapMethod():
+      thread_clients.append(self.suds_service_wrapper.suds_client)
+      self.suds_service_wrapper.SoapMethod('test')
+
+    with mock.patch('googleads.common._CloneSudsClient') as mock_clone:
+      mock_clone.return_value = thread_client
+      thread = threading.Thread(target=CallSoapMethod)
+      thread.start()
+      thread.join()
+      mock_clone.assert_called_once_with(self.client)
+
+    self.assertEqual([thread_client], thread_clients)
+    self.assertIs(self.client, self.suds_service_wrapper.suds_client)
+    self.header_handler.SetHeaders.assert_called_once_with(thread_client)
+    thread_client.service.SoapMethod.assert_called_once_with('test')
+    self.assertFalse(self.client.service.SoapMethod.called)
+
+  def testSudsServiceProxy_setSudsClient(self):
+    new_client = mock.Mock()
+    thread_clients = []
+
+    with mock.patch('googleads.common._CloneSudsClient') as mock_clone:
+      self.suds_service_wrapper.suds_client = new_client
+      thread = threading.Thread(target=lambda: thread_clients.append(
+          self.suds_service_wrapper.suds_client))
+      thread.start()
+      thread.join()
+      mock_clone.assert_called_once_with(new_client)
+
+    self.assertIs(new_client, self.suds_service_wrapper.suds_client)
+    self.assertEqual([mock_clone.return_value], thread_clients)
+
+  def testCloneSudsClient(self):
+    wsdl_file = tempfile.NamedTemporaryFile(suffix='.wsdl', delete=False)
+    self.addCleanup(os.remove, wsdl_file.name)
+    wsdl_file.write(_TEST_WSDL)
+    wsdl_file.close()
+    client = suds.client.Client('file://' + wsdl_file.name,
+                                cache=suds.cache.NoCache(), nosend=True)
+
+    clone = googleads.common._CloneSudsClient(client)
+    client.set_options(soapheaders={'header': 'original header'})
+    clone.set_options(soapheaders={'header': 'clone header'})
+
+    self.assertIsNot(client.wsdl, clone.wsdl)
+    self.assertIs(client.options.cache, clone.options.cache)
+    original_request = str(client.service.Get('value').envelope)
+    clone_request = str(clone.service.Get('value').envelope)
+    self.assertIn('original header', original_request)
+    self.assertNotIn('clone header', original_request)
+    self.assertIn('clone header', clone_request)
+    self.assertNotIn('original header', clone_request)
+
+  def testSudsServiceProxy_responseCache(self):
+    self.services.name = 'TestService'
+    self.header_handler.GetRequestScope.return_value = '1'
+    response_cache = googleads.common.ResponseCache({'SoapMethod': 60})
+    self.suds_service_wrapper = googleads.common.SudsServiceProxy(
+        self.client, self.header_handler, response_cache)
+    self.client.service.SoapMethod.return_value = 'result'
+
+    with mock.patch('googleads.common._PackForSuds') as mock_pack_for_suds:
+      results = [self.suds_service_wrapper.SoapMethod({'id': 1}),
+                 self.suds_service_wrapper.SoapMethod({'id': 1})]
+      self.header_handler.GetRequestScope.return_value = '2'
+      results.append(self.suds_service_wrapper.SoapMethod({'id': 1}))
+
+    self.assertEqual(['result'] * 3, results)
+    self.assertEqual(2, self.client.service.SoapMethod.call_count)
+    self.assertEqual(2, mock_pack_for_suds.call_count)
+
+  def testSudsServiceProxy_singleFlight(self):
+    self.services.name = 'TestService'
+    single_flight = googleads.common.SingleFlight(['SoapMethod'])
+    self.suds_service_wrapper = googleads.common.SudsServiceProxy(
+        self.client, self.header_handler, single_flight=single_flight)
+    self.client.service.SoapMethod.return_value = 'result'
+
+    with mock.patch.object(single_flight, 'Do') as mock_do:
+      mock_do.side_effect = lambda key, function: function()
+      self.assertEqual('result', self.suds_service_wrapper.SoapMethod('test'))
+
+    self.assertEqual(1, mock_do.call_count)
+    self.client.service.SoapMethod.assert_called_once_with(mock.ANY)
+
+  def _SetSoapMethod(self, side_effect):
+    # Each worker thread gets its own context, so that the mocks' call counts
+    # aren't updated concurrently.
+    self.header_contexts = []
+    self.header_handler.CopyContext.side_effect = (
+        lambda: self.header_contexts.append(mock.MagicMock()) or
+        self.header_contexts[-1])
+    soap_method = mock.Mock(side_effect=side_effect)
+    self.suds_service_wrapper._method_proxies['SoapMethod'] = soap_method
+    return soap_method
+
+  def testCallInChunks(self):
+    soap_method = self._SetSoapMethod(
+        lambda chunk: [operation * 2 for operation in chunk])
+
+    result = self.suds_service_wrapper.CallInChunks(
+        'SoapMethod', range(10), max_operations=3, max_workers=2)
+
+    self.assertEqual([operation * 2 for operation in range(10)], result)
+    self.assertEqual([[0, 1, 2], [3, 4, 5], [6, 7, 8], [9]],
+                     sorted(call[0][0] for call in soap_method.call_args_list))
+    self.assertEqual(2, len(self.header_contexts))
+    for header_context in self.header_contexts:
+      self.assertEqual(1, header_context.__enter__.call_count)
+
+  def testCallInChunks_partialFailure(self):
+    def Mutate(chunk):
+      errors = [mock.Mock(
+          fieldPath='operations[1].operand.name',
+          fieldPathElements=[mock.Mock(field='operations', index=1),
+                             mock.Mock(field='operand', index=None)])]
+      return mock.Mock(value=[operation for operation in chunk
+                              if operation != chunk[1]],
+                       partialFailureErrors=errors)
+
+    self._SetSoapMethod(Mutate)
+
+    result = self.suds_service_wrapper.CallInChunks(
+        'SoapMethod', ['a', 'b', 'c', 'd'], max_operations=2)
+
+    self.assertEqual(['a', 'c'], result.value)
+    self.assertEqual(['operations[1].operand.name',
+                      'operations[3].operand.name'],
+                     [error.fieldPath for error in result.partialFailureErrors])
+    self.assertEqual([1, 3], [error.fieldPathElements[0].index
+                              for error in result.partialFailureErrors])
+
+  def testSudsServiceProxy_attachesPartialFailureIndex(self):
+    result = suds.sudsobject.Object()
+    result.value = ['a', None]
+    result.partialFailureErrors = [
+        mock.Mock(fieldPath='operations[1].operand', fieldPathElements=None)]
+    self.client.service.SoapMethod.return_value = result
+
+    with mock.patch('googleads.common._PackForSuds') as mock_pack_for_suds:
+      mock_pack_for_suds.side_effect = lambda obj, factory: obj
+      self.suds_service_wrapper.SoapMethod(['a', 'b'])
+
+    self.assertEqual([False, True], result.partial_failure_index.failed)
+    self.assertNotIn('partial_failure_index', result.__keylist__)
+
+  def testCallInChunks_partialFailureIndex(self):
+    def Mutate(chunk):
+      result = suds.sudsobject.Object()
+      result.value = [None] + chunk[1:]
+      result.partialFailureErrors = [
+          mock.Mock(fieldPath='operations[0].operand', fieldPathElements=None)]
+      return result
+
+    self._SetSoapMethod(Mutate)
+
+    result = self.suds_service_wrapper.CallInChunks(
+        'SoapMethod', ['a', 'b', 'c', 'd'], max_operations=2)
+
+    self.assertEqual([None, 'b', None, 'd'], result.value)
+    self.assertEqual([0, 2], result.partial_failure_index.failed_indexes)
+
+  def testCallInChunks_mergesPresentFields(self):
+    def Mutate(chunk):
+      result = suds.sudsobject.Object()
+      if chunk == ['a', 'b']:
+        result.partialFailureErrors = [
+            mock.Mock(fieldPath='operations[1].operand',
+                      fieldPathElements=None)]
+      return result
+
+    self._SetSoapMethod(Mutate)
+
+    result = self.suds_service_wrapper.CallInChunks(
+        'SoapMethod', ['a', 'b', 'c', 'd'], max_operations=2)
+
+    self.assertNotIn('value', result.__keylist__)
+    self.assertEqual(['operations[1].operand'],
+                     [error.fieldPath for error in result.partialFailureErrors])
+
+  def testCallInChunks_unmergeableResults(self):
+    self._SetSoapMethod(lambda chunk: suds.sudsobject.Object())
+
+    self.assertRaises(
+        googleads.errors.GoogleAdsValueError,
+        self.suds_service_wrapper.CallInChunks, 'SoapMethod',
+        ['a', 'b', 'c', 'd'], max_operations=2)
+
+  def testSudsServiceProxy_metrics(self):
+    listener = mock.Mock()
+    googleads.metrics.AddMetricsListener(listener)
+    self.addCleanup(googleads.metrics.RemoveMetricsListener, listener)
+    self.services.name = 'CampaignService'
+    self.header_handler.GetRequestScope.return_value = '1234'
+
+    def SoapMethod(operations):
+      googleads.common._soap_message_sizes.request_bytes = 100
+      googleads.common._soap_message_sizes.response_bytes = 200
+      return operations
+
+    self.client.service.SoapMethod.side_effect = SoapMethod
+
+    with mock.patch('googleads.common._PackForSuds') as mock_pack_for_suds:
+      mock_pack_for_suds.side_effect = lambda obj, factory: obj
+      self.suds_service_wrapper.SoapMethod(['a', 'b'])
+
+    event = listener.OnCall.call_args[0][0]
+    self.assertEqual(('soap', 'CampaignService', 'SoapMethod', '1234', 100,
+                      200, 0, None, 2),
+                     (event.component, event.service, event.method,
+                      event.scope, event.request_bytes, event.response_bytes,
+                      event.retries, event.fault, event.operation_count))
+
+  def testSudsServiceProxy_metricsResponseCache(self):
+    listener = mock.Mock()
+    googleads.metrics.AddMetricsListener(listener)
+    self.addCleanup(googleads.metrics.RemoveMetricsListener, listener)
+    self.services.name = 'TestService'
+    self.header_handler.GetRequestScope.return_value = '1'
+    response_cache = googleads.common.ResponseCache({'SoapMethod': 60})
+    self.suds_service_wrapper = googleads.common.SudsServiceProxy(
+        self.client, self.header_handler, response_cache)
+    self.client.service.SoapMethod.return_value = 'result'
+
+    with mock.patch('googleads.common._PackForSuds'):
+      self.suds_service_wrapper.SoapMethod('test')
+      self.suds_service_wrapper.SoapMethod('test')
+
+    self.assertEqual([False, True],
+                     [call[0][0].cached
+                      for call in listener.OnCall.call_args_list])
+
+  def testSudsServiceProxy_metricsSingleFlight(self):
+    listener = mock.Mock()
+    googleads.metrics.AddMetricsListener(listener)
+    self.addCleanup(googleads.metrics.RemoveMetricsListener, listener)
+    self.services.name = 'TestService'
+    single_flight = googleads.common.SingleFlight(['SoapMethod'])
+    self.suds_service_wrapper = googleads.common.SudsServiceProxy(
+        self.client, self.header_handler, single_flight=single_flight)
+
+    self.client.service.SoapMethod.return_value = 'result'
+    shares = [True, False]
+
+    def Do(key, function):
+      # The first call receives the result of another, the second makes it.
+      return 'shared' if shares.pop(0) else function()
+
+    with mock.patch.object(single_flight, 'Do') as mock_do:
+      mock_do.side_effect = Do
+      with mock.patch('googleads.common._PackForSuds'):
+        self.assertEqual('shared', self.suds_service_wrapper.SoapMethod('a'))
+        self.assertEqual('result', self.suds_service_wrapper.SoapMethod('a'))
+
+    self.assertEqual([True, False],
+                     [call[0][0].cached
+                      for call in listener.OnCall.call_args_list])
+
+  def testCallInChunks_failure(self):
+    def SoapMethod(chunk):
+      if 'bad' in chunk:
+        raise suds.WebFault(None, None)
+      return chunk
+
+    self._SetSoapMethod(SoapMethod)
+
+    try:
+      self.suds_service_wrapper.CallInChunks(
+          'SoapMethod', ['a', 'bad', 'c'], max_operations=1, max_workers=1)
+      self.fail('GoogleAdsChunkedRequestError was not raised.')
+    except googleads.errors.GoogleAdsChunkedRequestError as e:
+      self.assertEqual([1], list(e.errors))
+      self.assertIsInstance(e.errors[1], suds.WebFault)
+      # Chunks after the failure are not sent.
+      self.assertEqual({0: ['a']}, e.results)
+
+  def testSplitOperations_bySize(self):
+    operations = ['a' * 10, 'b' * 10, 'c' * 30, 'd']
+
+    chunks = googleads.common._SplitOperations(operations, 3, 30)
+
+    self.assertEqual([(0, operations[:2]), (2, operations[2:3]),
+                      (3, operations[3:])], chunks)
+
+
+class SudsProxyTransportTest(unittest.TestCase):
+  """Tests for the googleads.common.ProxyConfig._SudsProxyTransport class."""
+
+  def testDeepCopy(self):
+    handler = urllib2.ProxyHandler({'https': 'myproxy.com:443'})
+    transport = googleads.common.ProxyConfig._SudsProxyTransport(
+        [handler], timeout=123)
+
+    clone = copy.deepcopy(transport)
+
+    self.assertIsInstance(
+        clone, googleads.common.ProxyConfig._SudsProxyTransport)
+    self.assertEqual(123, clone.options.timeout)
+    self.assertEqual(1, len(clone.handlers))
+    self.assertIsNot(handler, clone.handlers[0])
+    self.assertEqual(handler.proxies, clone.handlers[0].proxies)
+
+  def testSend(self):
+    transport = googleads.common.ProxyConfig._SudsProxyTransport([])
+    request = suds.transport.Request('https://test', 'request')
+
+    with mock.patch('suds.transport.http.HttpTransport.send') as mock_send:
+      mock_send.return_value = suds.transport.Reply(200, {}, 'reply body')
+      transport.send(request)
+
+    self.assertEqual(7, googleads.common._soap_message_sizes.request_bytes)
+    self.assertEqual(10, googleads.common._soap_message_sizes.response_bytes)
+
+  def testSend_transportError(self):
+    transport = googleads.common.ProxyConfig._SudsProxyTransport([])
+    request = suds.transport.Request('https://test', 'request')
+
+    with mock.patch('suds.transport.http.HttpTransport.send') as mock_send:
+      mock_send.side_effect = suds.transport.TransportError(
+          'Internal Server Error', 500, io.BytesIO(b'<soap:Fault/>'))
+      try:
+        transport.send(request)
+        self.fail('TransportError was not raised.')
+      except suds.transport.TransportError as e:
+        self.assertEqual(b'<soap:Fault/>', e.fp.read())
+
+    self.assertEqual(7, googleads.common._soap_message_sizes.request_bytes)
+    self.assertEqual(13, googleads.common._soap_message_sizes.response_bytes)
+
 
 class HeaderHandlerTest(unittest.TestCase):
   """Tests for the googleads.common.HeaderHeader class."""
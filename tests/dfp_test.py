@@ -15,17 +15,25 @@
 """Unit tests to cover the dfp module."""
 
 
+import array
+import calendar
+import os
 import StringIO
 import sys
+import tempfile
+import time
 import unittest
+import urllib2
 
 
 import mock
+import suds
 import suds.transport
 
 import googleads.dfp
 import googleads.common
 import googleads.errors
+import googleads.metrics
 
 
 class BaseValue(object):
@@ -505,6 +513,66 @@ class DataDownloaderTest(unittest.TestCase):
                        self.generic_header[1]['labelName']],
                       row1, row2], result_set)
 
+  def testConvertPqlRowsForCsv(self):
+    column_converters = []
+
+    rows = self.report_downloader._ConvertPqlRowsForCsv(
+        self.generic_rval, column_converters)
+
+    self.assertEqual(
+        [[self.report_downloader._ConvertValueForCsv(field)
+          for field in row['values']] for row in self.generic_rval], rows)
+    self.assertEqual(6, len(column_converters))
+    self.assertIs(self.report_downloader._GetPqlColumnConverter('TextValue'),
+                  column_converters[0])
+
+  def testConvertPqlRowsForCsv_emptyColumn(self):
+    column_converters = []
+    rows = [{'values': [DecideValue({'xsi_type': 'TextValue'})]},
+            {'values': [DecideValue({'xsi_type': 'TextValue'})]}]
+
+    self.assertEqual([['-'], ['-']],
+                     self.report_downloader._ConvertPqlRowsForCsv(
+                         rows, column_converters))
+    self.assertEqual([None], column_converters)
+
+  def testConvertDateTimeToOffset_cachesTimeZone(self):
+    date_time_value = {
+        'date': {'year': '2012', 'month': '11', 'day': '05'},
+        'hour': '12', 'minute': '12', 'second': '12',
+        'timeZoneID': 'PST8PDT'}
+
+    with mock.patch('pytz.timezone', wraps=googleads.dfp.pytz.timezone) as (
+        mock_timezone):
+      for _ in range(3):
+        self.assertEqual(
+            '2012-11-05T12:12:12-08:00',
+            self.report_downloader._ConvertDateTimeToOffset(date_time_value))
+      mock_timezone.assert_called_once_with('PST8PDT')
+
+  def testDownloadPqlResultToColumns(self):
+    header = [{'labelName': 'Name'}, {'labelName': 'Date'},
+              {'labelName': 'Id'}, {'labelName': 'DateTime'},
+              {'labelName': 'Count'}, {'labelName': 'Set'}]
+    self.pql_service.select.return_value = {'rows': self.generic_rval,
+                                            'columnTypes': header}
+
+    with mock.patch('googleads.common.numpy', None):
+      columns = self.report_downloader.DownloadPqlResultToColumns(
+          'SELECT Id, Name FROM Line_Item')
+
+    self.assertEqual([label['labelName'] for label in header],
+                     list(columns.keys()))
+    self.assertEqual(['Some random PQL response...',
+                      'A second row of PQL response!'], columns['Name'])
+    self.assertEqual(['1999-04-03', '2009-02-05'], columns['Date'])
+    self.assertEqual(array.array('l', [123, 345]), columns['Id'])
+    self.assertEqual(['2012-11-05T12:12:12-08:00', '2013-01-03T02:02:02Z'],
+                     columns['DateTime'])
+    self.assertEqual('d', columns['Count'].typecode)
+    self.assertNotEqual(columns['Count'][0], columns['Count'][0])
+    self.assertEqual(123456, columns['Count'][1])
+
   def testDownloadPqlResultToList_NoRows(self):
     self.pql_service.select.return_value = {}
 
@@ -525,10 +593,43 @@ class DataDownloaderTest(unittest.TestCase):
 
     with mock.patch('time.sleep') as mock_sleep:
       rval = self.report_downloader.WaitForReport(input_)
-      mock_sleep.assert_called_once_with(30)
+      mock_sleep.assert_called_once_with(
+          googleads.dfp._REPORT_POLL_INITIAL_INTERVAL)
     self.assertEqual(id_, rval)
     self.report_service.getReportJobStatus.assert_any_call(id_)
 
+  def testWaitForReports_backsOff(self):
+    statuses = {'1': ['IN_PROGRESS'] * 6 + ['COMPLETED'],
+                '2': ['IN_PROGRESS', 'FAILED']}
+    self.report_service.runReportJob.side_effect = lambda job: job
+    self.report_service.getReportJobStatus.side_effect = (
+        lambda id_: statuses[id_].pop(0))
+
+    with mock.patch('time.sleep') as mock_sleep:
+      rval = list(self.report_downloader.WaitForReports([{'id': '1'},
+                                                         {'id': '2'}]))
+
+    self.assertEqual([('2', 'FAILED'), ('1', 'COMPLETED')], rval)
+    self.assertEqual([mock.call(2), mock.call(4), mock.call(8),
+                      mock.call(16), mock.call(30), mock.call(30)],
+                     mock_sleep.call_args_list)
+
+  def testDownloadReportsToFiles(self):
+    self.report_service.runReportJob.side_effect = lambda job: job
+    self.report_service.getReportJobStatus.side_effect = (
+        lambda id_: 'COMPLETED' if id_ == '1' else 'FAILED')
+    outfile = StringIO.StringIO()
+    get_outfile = mock.Mock(return_value=outfile)
+
+    with mock.patch.object(
+        self.report_downloader, 'DownloadReportToFile') as mock_download:
+      rval = self.report_downloader.DownloadReportsToFiles(
+          [{'id': '1'}, {'id': '2'}], 'CSV', get_outfile)
+
+    self.assertEqual({'1': 'COMPLETED', '2': 'FAILED'}, rval)
+    get_outfile.assert_called_once_with('1')
+    mock_download.assert_called_once_with('1', 'CSV', outfile)
+
   def testWaitForReport_failure(self):
     self.report_service.getReportJobStatus.return_value = 'FAILED'
     self.report_service.runReportJob.return_value = {'id': '782yt97r2'}
@@ -557,6 +658,198 @@ class DataDownloaderTest(unittest.TestCase):
       mock_open.assert_called_once_with(report_download_url)
       self.assertEqual(report_contents, outfile.getvalue())
 
+  def testDownloadReportToFile_chunkSize(self):
+    fake_request = mock.Mock()
+    fake_request.read.side_effect = ['ab', 'cd', '']
+    outfile = StringIO.StringIO()
+    self.report_downloader.url_opener = mock.Mock()
+    self.report_downloader.url_opener.open.return_value = fake_request
+
+    self.report_downloader.DownloadReportToFile('1', 'CSV', outfile,
+                                                chunk_size=2)
+
+    self.assertEqual('abcd', outfile.getvalue())
+    fake_request.read.assert_called_with(2)
+
+  def _CreateRangeOpener(self, report_contents, supports_ranges=True,
+                         failures=0, truncations=0, size_known=True):
+    """Returns a mock url_opener serving the given report contents.
+
+    The first failures requests fail, and the bodies of the truncations
+    requests after them are missing their last byte. The responses opened are
+    kept in the opener's responses attribute.
+    """
+    self.report_service.getReportDownloadURL.return_value = (
+        'https://google.com/report')
+    failures = [failures]
+    truncations = [truncations]
+
+    def Open(request):
+      if failures[0]:
+        failures[0] -= 1
+        raise urllib2.URLError('Connection reset.')
+      response = mock.Mock()
+      url_opener.responses.append(response)
+      if isinstance(request, basestring):
+        response.getcode.return_value = 200
+        response.info.return_value = {}
+        response.read.side_effect = StringIO.StringIO(report_contents).read
+        return response
+      start, end = [int(offset) for offset in
+                    request.get_header('Range')[len('bytes='):].split('-')]
+      if supports_ranges:
+        response.getcode.return_value = 206
+        response.info.return_value = {'Content-Range': 'bytes %d-%d/%s' % (
+            start, end, len(report_contents) if size_known else '*')}
+        body = StringIO.StringIO(report_contents[start:end + 1])
+        if truncations[0]:
+          truncations[0] -= 1
+          body = StringIO.StringIO(report_contents[start:end])
+      else:
+        response.getcode.return_value = 200
+        response.info.return_value = {}
+        body = StringIO.StringIO(report_contents)
+      response.read.side_effect = body.read
+      return response
+
+    url_opener = mock.Mock()
+    url_opener.open.side_effect = Open
+    url_opener.responses = []
+    return url_opener
+
+  def testDownloadReportToPath(self):
+    report_contents = ''.join(chr(i % 256) for i in range(1000))
+    self.report_downloader.url_opener = self._CreateRangeOpener(
+        report_contents)
+    path = tempfile.NamedTemporaryFile(delete=False).name
+
+    try:
+      self.report_downloader.DownloadReportToPath(
+          '1', 'CSV', path, num_connections=3, range_size=64, chunk_size=10)
+      with open(path, 'rb') as report_file:
+        self.assertEqual(report_contents, report_file.read())
+    finally:
+      os.remove(path)
+    # The ranges are opened on several threads, which can race to update the
+    # mock's call_count, so count the responses instead.
+    self.assertEqual(16, len(self.report_downloader.url_opener.responses))
+    for response in self.report_downloader.url_opener.responses:
+      response.close.assert_called_once_with()
+
+  def testDownloadReportToPath_retriesRange(self):
+    report_contents = 'x' * 100
+    self.report_downloader.url_opener = self._CreateRangeOpener(
+        report_contents, failures=2)
+    path = tempfile.NamedTemporaryFile(delete=False).name
+
+    try:
+      self.report_downloader.DownloadReportToPath(
+          '1', 'CSV', path, num_connections=1, range_size=50, max_retries=2)
+      with open(path, 'rb') as report_file:
+        self.assertEqual(report_contents, report_file.read())
+    finally:
+      os.remove(path)
+
+  def testDownloadReportToPath_retriesShortRange(self):
+    report_contents = 'x' * 100
+    self.report_downloader.url_opener = self._CreateRangeOpener(
+        report_contents, truncations=2)
+    path = tempfile.NamedTemporaryFile(delete=False).name
+
+    try:
+      self.report_downloader.DownloadReportToPath(
+          '1', 'CSV', path, num_connections=1, range_size=50, max_retries=1)
+      with open(path, 'rb') as report_file:
+        self.assertEqual(report_contents, report_file.read())
+    finally:
+      os.remove(path)
+    self.assertEqual(4, self.report_downloader.url_opener.open.call_count)
+
+  def testDownloadReportToPath_shortRangeFails(self):
+    self.report_downloader.url_opener = self._CreateRangeOpener(
+        'x' * 100, truncations=3)
+    path = tempfile.NamedTemporaryFile(delete=False).name
+
+    try:
+      self.assertRaises(
+          urllib2.URLError, self.report_downloader.DownloadReportToPath,
+          '1', 'CSV', path, num_connections=1, range_size=50, max_retries=1)
+    finally:
+      os.remove(path)
+
+  def testDownloadReportToPath_rangeError(self):
+    url_opener = self._CreateRangeOpener('x' * 100)
+    open_range = url_opener.open.side_effect
+
+    def Open(request):
+      if request.get_header('Range') != 'bytes=0-49':
+        raise ValueError('Unexpected response.')
+      return open_range(request)
+
+    url_opener.open.side_effect = Open
+    self.report_downloader.url_opener = url_opener
+    path = tempfile.NamedTemporaryFile(delete=False).name
+
+    try:
+      self.assertRaises(
+          ValueError, self.report_downloader.DownloadReportToPath,
+          '1', 'CSV', path, range_size=50)
+    finally:
+      os.remove(path)
+
+  def testDownloadReportToPath_metrics(self):
+    listener = mock.Mock()
+    googleads.metrics.AddMetricsListener(listener)
+    self.addCleanup(googleads.metrics.RemoveMetricsListener, listener)
+    self.report_downloader.url_opener = self._CreateRangeOpener(
+        'x' * 100, failures=2)
+    path = tempfile.NamedTemporaryFile(delete=False).name
+
+    try:
+      self.report_downloader.DownloadReportToPath(
+          '1', 'CSV', path, num_connections=1, range_size=50, max_retries=2)
+    finally:
+      os.remove(path)
+
+    events = [call[0][0] for call in listener.OnCall.call_args_list]
+    self.assertEqual([('DataDownloader', 100, 2)],
+                     [(event.service, event.response_bytes, event.retries)
+                      for event in events])
+
+  def testDownloadReportToPath_rangesNotSupported(self):
+    report_contents = 'y' * 100
+    self.report_downloader.url_opener = self._CreateRangeOpener(
+        report_contents, supports_ranges=False)
+    path = tempfile.NamedTemporaryFile(delete=False).name
+
+    try:
+      self.report_downloader.DownloadReportToPath('1', 'CSV', path,
+                                                  range_size=10)
+      with open(path, 'rb') as report_file:
+        self.assertEqual(report_contents, report_file.read())
+    finally:
+      os.remove(path)
+    self.report_downloader.url_opener.open.assert_called_once_with(mock.ANY)
+
+  def testDownloadReportToPath_sizeUnknown(self):
+    report_contents = 'z' * 100
+    self.report_downloader.url_opener = self._CreateRangeOpener(
+        report_contents, size_known=False)
+    path = tempfile.NamedTemporaryFile(delete=False).name
+
+    try:
+      self.report_downloader.DownloadReportToPath('1', 'CSV', path,
+                                                  range_size=10)
+      with open(path, 'rb') as report_file:
+        self.assertEqual(report_contents, report_file.read())
+    finally:
+      os.remove(path)
+    self.report_downloader.url_opener.open.assert_called_with(
+        'https://google.com/report')
+    self.assertEqual(2, self.report_downloader.url_opener.open.call_count)
+    for response in self.report_downloader.url_opener.responses:
+      response.close.assert_called_once_with()
+
   def testGetReportService(self):
     self.report_downloader._dfp_client = mock.Mock()
     self.report_downloader._report_service = None
@@ -604,5 +897,204 @@ class FilterStatementTest(unittest.TestCase):
                       'values': values})
 
 
+class IterByStatementTest(unittest.TestCase):
+  """Tests for the IterByStatement function."""
+
+  def setUp(self):
+    self.statement = googleads.dfp.FilterStatement('WHERE id > 0', limit=2)
+    self.queried_offsets = []
+    self.total_result_set_size = 7
+
+  def GetByStatement(self, statement):
+    offset = int(statement['query'].rsplit(' ', 1)[1])
+    self.queried_offsets.append(offset)
+    return mock.Mock(
+        results=range(offset, min(offset + 2, self.total_result_set_size)),
+        totalResultSetSize=self.total_result_set_size)
+
+  def testIterByStatement(self):
+    results = googleads.dfp.IterByStatement(self.GetByStatement,
+                                            self.statement, max_workers=3)
+
+    self.assertEqual(7, results.total_result_set_size)
+    self.assertEqual([0], self.queried_offsets)
+    self.assertEqual(range(7), list(results))
+    self.assertEqual([0, 2, 4, 6], sorted(self.queried_offsets))
+    self.assertEqual(0, self.statement.offset)
+
+  def testIterByStatement_noResults(self):
+    results = googleads.dfp.IterByStatement(
+        mock.Mock(return_value=mock.Mock(results=None, totalResultSetSize=0)))
+
+    self.assertEqual(0, results.total_result_set_size)
+    self.assertEqual([], list(results))
+
+  def testIterByStatement_fetchesAheadBoundedly(self):
+    self.total_result_set_size = 1000
+    results = googleads.dfp.IterByStatement(self.GetByStatement,
+                                            self.statement, max_workers=1)
+
+    for result in results:
+      if result == 2:
+        break
+    time.sleep(0.1)
+    # Only the pages up to the one being iterated, plus a few ahead.
+    self.assertLess(len(self.queried_offsets), 6)
+
+  def testIterByStatement_error(self):
+    get_by_statement = mock.Mock(side_effect=[
+        mock.Mock(results=[1, 2], totalResultSetSize=4),
+        suds.WebFault(None, None)])
+    results = googleads.dfp.IterByStatement(get_by_statement, self.statement)
+
+    self.assertEqual(1, next(results))
+    self.assertEqual(2, next(results))
+    self.assertRaises(suds.WebFault, next, results)
+
+
+class EntitySyncTest(unittest.TestCase):
+  """Tests for the EntitySync class."""
+
+  def setUp(self):
+    self.dfp_client = mock.Mock(network_code='1234')
+    self.get_by_statement = (self.dfp_client.GetService.return_value
+                             .getLineItemsByStatement)
+    self.dfp_client.GetService.return_value.getCurrentNetwork.return_value = (
+        mock.Mock(timeZone='America/New_York'))
+    self.watermark_path = os.path.join(tempfile.mkdtemp(), 'watermarks.json')
+    # 2016-11-01T13:00:00 in New York.
+    time_patcher = mock.patch('time.time', return_value=calendar.timegm(
+        (2016, 11, 1, 17, 0, 0)))
+    time_patcher.start()
+    self.addCleanup(time_patcher.stop)
+
+  def tearDown(self):
+    if os.path.exists(self.watermark_path):
+      os.remove(self.watermark_path)
+    os.rmdir(os.path.dirname(self.watermark_path))
+
+  def _CreateEntity(self, entity_id, hour):
+    date_time = mock.Mock(date=mock.Mock(year=2016, month=11, day=1),
+                          hour=hour, minute=30, second=0)
+    return mock.Mock(id=entity_id, lastModifiedDateTime=date_time)
+
+  def testSync(self):
+    entities = [self._CreateEntity(1, 10), self._CreateEntity(2, 12)]
+    self.get_by_statement.return_value = mock.Mock(
+        results=entities, totalResultSetSize=2)
+    synced = []
+
+    entity_sync = googleads.dfp.EntitySync(
+        self.dfp_client, 'v201611', watermark_path=self.watermark_path)
+    self.assertEqual(2, entity_sync.Sync('LineItem', synced.append))
+
+    self.assertEqual(entities, synced)
+    self.dfp_client.GetService.assert_any_call(
+        'LineItemService', 'v201611', None)
+    self.assertEqual('ORDER BY id ASC LIMIT 500 OFFSET 0',
+                     self.get_by_statement.call_args[0][0]['query'])
+    self.assertEqual({'1234:LineItem': '2016-11-01T12:30:00'},
+                     entity_sync.watermarks)
+
+    self.get_by_statement.return_value = mock.Mock(
+        results=None, totalResultSetSize=0)
+    entity_sync = googleads.dfp.EntitySync(
+        self.dfp_client, 'v201611', watermark_path=self.watermark_path)
+    self.assertEqual(0, entity_sync.Sync('LineItem', synced.append))
+
+    statement = self.get_by_statement.call_args[0][0]
+    self.assertEqual('WHERE lastModifiedDateTime >= :lastModifiedDateTime '
+                     'ORDER BY id ASC LIMIT 500 OFFSET 0', statement['query'])
+    self.assertEqual('2016-11-01T12:25:00', statement['values'][0]['value'][
+        'value'])
+    self.assertEqual({'1234:LineItem': '2016-11-01T12:30:00'},
+                     entity_sync.watermarks)
+
+  def testSync_watermarkNotAfterSyncStart(self):
+    self.get_by_statement.return_value = mock.Mock(
+        results=[self._CreateEntity(1, 10), self._CreateEntity(2, 14)],
+        totalResultSetSize=2)
+    entity_sync = googleads.dfp.EntitySync(self.dfp_client, 'v201611')
+
+    self.assertEqual(2, entity_sync.Sync('LineItem', mock.Mock()))
+
+    self.assertEqual({'1234:LineItem': '2016-11-01T13:00:00'},
+                     entity_sync.watermarks)
+    self.dfp_client.GetService.assert_any_call(
+        'NetworkService', 'v201611', None)
+
+  def testSync_callbackFails(self):
+    self.get_by_statement.return_value = mock.Mock(
+        results=[self._CreateEntity(1, 10)], totalResultSetSize=1)
+    entity_sync = googleads.dfp.EntitySync(self.dfp_client)
+
+    self.assertRaises(ValueError, entity_sync.Sync, 'LineItem',
+                      mock.Mock(side_effect=ValueError()))
+    self.assertEqual({}, entity_sync.watermarks)
+
+  def testSync_unsupportedEntityType(self):
+    entity_sync = googleads.dfp.EntitySync(self.dfp_client)
+    self.assertRaises(googleads.errors.GoogleAdsValueError, entity_sync.Sync,
+                      'Network', mock.Mock())
+
+
+class BulkFilterStatementTest(unittest.TestCase):
+  """Tests for the BulkFilterStatement class."""
+
+  def setUp(self):
+    self.status_values = [{
+        'key': 'status',
+        'value': {'xsi_type': 'TextValue', 'value': 'READY'}
+    }]
+
+  def testToFilterStatements(self):
+    bulk_statement = googleads.dfp.BulkFilterStatement(
+        [1, 2, 3], id_field='lineItemId', where_clause='WHERE status = :status',
+        values=self.status_values, batch_size=2)
+
+    statements = [statement.ToStatement()
+                  for statement in bulk_statement.ToFilterStatements()]
+
+    self.assertEqual(2, len(statements))
+    self.assertEqual(
+        'WHERE lineItemId IN (:bulkId0, :bulkId1) AND (status = :status) '
+        'LIMIT 500 OFFSET 0', statements[0]['query'])
+    self.assertEqual(self.status_values + [
+        {'key': 'bulkId0', 'value': {'xsi_type': 'NumberValue', 'value': 1}},
+        {'key': 'bulkId1', 'value': {'xsi_type': 'NumberValue', 'value': 2}}],
+                     statements[0]['values'])
+    self.assertEqual('WHERE lineItemId IN (:bulkId0) AND (status = :status) '
+                     'LIMIT 500 OFFSET 0', statements[1]['query'])
+
+  def testRun(self):
+    def GetByStatement(statement):
+      return mock.Mock(results=[value['value']['value'] for value
+                                in statement['values']],
+                       totalResultSetSize=len(statement['values']))
+
+    bulk_statement = googleads.dfp.BulkFilterStatement(range(7), batch_size=3)
+    results = bulk_statement.Run(GetByStatement, max_workers=2)
+
+    self.assertEqual(range(7), results)
+
+  def testGetAllByStatement(self):
+    pages = [mock.Mock(results=[1, 2], totalResultSetSize=5),
+             mock.Mock(results=[3, 4], totalResultSetSize=5),
+             mock.Mock(results=[5], totalResultSetSize=5)]
+    get_by_statement = mock.Mock(side_effect=pages)
+    statement = googleads.dfp.FilterStatement('WHERE id > 0', limit=2)
+
+    self.assertEqual([1, 2, 3, 4, 5], googleads.dfp._GetAllByStatement(
+        get_by_statement, statement))
+    self.assertEqual('WHERE id > 0 LIMIT 2 OFFSET 4',
+                     get_by_statement.call_args[0][0]['query'])
+
+  def testRun_error(self):
+    get_by_statement = mock.Mock(side_effect=suds.WebFault(None, None))
+    bulk_statement = googleads.dfp.BulkFilterStatement(range(3), batch_size=1)
+
+    self.assertRaises(suds.WebFault, bulk_statement.Run, get_by_statement)
+
+
 if __name__ == '__main__':
   unittest.main()
@@ -0,0 +1,129 @@
+# Copyright 2016 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Unit tests to cover the metrics module."""
+
+import unittest
+
+
+import mock
+import suds
+import suds.sudsobject
+
+import googleads.errors
+import googleads.metrics
+
+
+class MetricsAggregatorTest(unittest.TestCase):
+  """Tests for the googleads.metrics.MetricsAggregator class."""
+
+  def setUp(self):
+    self.aggregator = googleads.metrics.MetricsAggregator(
+        latency_bounds=(0.1, 1))
+
+  def _Event(self, scope='123', latency=0.05, fault=None, retries=0,
+             cached=False):
+    return googleads.metrics.CallEvent(
+        'soap', 'CampaignService', 'mutate', scope, 100, 200, latency,
+        retries, fault, 2, cached)
+
+  def testGetSnapshot(self):
+    self.aggregator.OnCall(self._Event(latency=0.05))
+    self.aggregator.OnCall(self._Event(latency=0.5, retries=1, cached=True))
+    self.aggregator.OnCall(self._Event(scope='456', latency=5,
+                                       fault='RateExceededError'))
+
+    snapshot = self.aggregator.GetSnapshot()
+
+    self.assertEqual((0.1, 1), snapshot.latency_bounds)
+    self.assertEqual([googleads.metrics.CallMetrics(
+        'soap', 'CampaignService', 'mutate', None, 3, 1,
+        {'RateExceededError': 1}, 1, 6, 300, 600, 5.55, (1, 1, 1))],
+                     snapshot.metrics)
+
+  def testGetSnapshot_byScope(self):
+    aggregator = googleads.metrics.MetricsAggregator(by_scope=True)
+    aggregator.OnCall(self._Event(scope='123'))
+    aggregator.OnCall(self._Event(scope='456'))
+    aggregator.OnCall(self._Event(scope='456'))
+
+    snapshot = aggregator.GetSnapshot()
+
+    self.assertEqual([('123', 1), ('456', 2)],
+                     [(metrics.scope, metrics.calls)
+                      for metrics in snapshot.metrics])
+
+  def testExport_reset(self):
+    exporter = mock.Mock()
+    self.aggregator.OnCall(self._Event())
+
+    self.aggregator.Export(exporter, reset=True)
+
+    snapshot = exporter.Export.call_args[0][0]
+    self.assertEqual(1, snapshot.metrics[0].calls)
+    self.assertEqual([], self.aggregator.GetSnapshot().metrics)
+
+  def testInit_unorderedLatencyBounds(self):
+    self.assertRaises(googleads.errors.GoogleAdsValueError,
+                      googleads.metrics.MetricsAggregator, (1, 0.1))
+
+
+class MeasureCallTest(unittest.TestCase):
+  """Tests for the googleads.metrics.MeasureCall function."""
+
+  def setUp(self):
+    self.listener = mock.Mock()
+    googleads.metrics.AddMetricsListener(self.listener)
+    self.addCleanup(googleads.metrics.RemoveMetricsListener, self.listener)
+
+  def testMeasureCall(self):
+    with mock.patch('time.time') as mock_time:
+      mock_time.side_effect = [10, 12.5]
+      with googleads.metrics.MeasureCall(
+          'report_download', 'DataDownloader', 'DownloadReport',
+          '1234') as measurement:
+        measurement.response_bytes = 100
+        measurement.retries = 2
+
+    self.listener.OnCall.assert_called_once_with(googleads.metrics.CallEvent(
+        'report_download', 'DataDownloader', 'DownloadReport', '1234', None,
+        100, 2.5, 2, None, None, False))
+
+  def testMeasureCall_fault(self):
+    api_error = suds.sudsobject.Object()
+    setattr(api_error, 'ApiError.Type', 'RateExceededError.RATE_EXCEEDED')
+    error = suds.WebFault(mock.Mock(), None)
+    error.fault.detail.ApiExceptionFault.errors = [api_error]
+
+    def Call():
+      with googleads.metrics.MeasureCall('soap', 'CampaignService', 'get'):
+        raise error
+
+    self.assertRaises(suds.WebFault, Call)
+    self.assertEqual('RateExceededError.RATE_EXCEEDED',
+                     self.listener.OnCall.call_args[0][0].fault)
+
+  def testMeasureCall_listenerError(self):
+    self.listener.OnCall.side_effect = ValueError()
+
+    with googleads.metrics.MeasureCall('oauth2', 'Client', 'Refresh'):
+      pass
+
+  def testRemoveMetricsListener_notRegistered(self):
+    self.assertRaises(googleads.errors.GoogleAdsValueError,
+                      googleads.metrics.RemoveMetricsListener, mock.Mock())
+
+
+if __name__ == '__main__':
+  unittest.main()
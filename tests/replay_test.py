@@ -0,0 +1,167 @@
+# Copyright 2016 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Unit tests to cover the replay module."""
+
+
+import tempfile
+import unittest
+import urllib
+import urllib2
+
+import googleads.replay
+
+
+class ReplayServerTest(unittest.TestCase):
+  """Tests for the googleads.replay.ReplayServer class."""
+
+  WSDL = ('<definitions targetNamespace="https://adwords.google.com/api/'
+          'adwords/cm/v201609"><soap:address location="%s/api/adwords/cm/'
+          'v201609/CampaignService"/></definitions>')
+
+  def setUp(self):
+    self.fixture_dir = tempfile.mkdtemp()
+    self.server = googleads.replay.ReplayServer(self.fixture_dir).Start()
+    self.addCleanup(self.server.Stop)
+
+  def _Open(self, url, data=None, headers=None, method=None):
+    request = urllib2.Request(url, data=data, headers=headers or {})
+    if method:
+      request.get_method = lambda: method
+    try:
+      response = urllib2.urlopen(request)
+    except urllib2.HTTPError as e:
+      response = e
+    return response.code, response.info(), response.read()
+
+  def _Record(self, path, body, response_body):
+    self.server.AddFixture('POST', path,
+                           (200, {'Content-Type': 'text/xml'}, response_body),
+                           body)
+
+  def testReplay(self):
+    self.server.AddFixture(
+        'GET', '/api/adwords/cm/v201609/CampaignService?wsdl',
+        (200, {'Content-Type': 'text/xml'},
+         self.WSDL % 'https://adwords.google.com'))
+
+    status, _, body = self._Open(
+        self.server.url + '/api/adwords/cm/v201609/CampaignService?wsdl')
+
+    self.assertEqual(200, status)
+    self.assertEqual(self.WSDL % self.server.url, body)
+
+  def testReplay_ignoresSoapHeader(self):
+    self._Record('/soap', '<Envelope><soap:Header>token 1</soap:Header>'
+                 '<Body>get</Body></Envelope>', '<rval/>')
+
+    status, _, body = self._Open(
+        self.server.url + '/soap',
+        '<Envelope><soap:Header>token 2</soap:Header><Body>get</Body>'
+        '</Envelope>')
+
+    self.assertEqual((200, '<rval/>'), (status, body))
+
+  def testGetFixture(self):
+    self.assertIsNone(self.server.GetFixture('POST', '/soap', '<Body/>'))
+    self._Record('/soap', '<Body/>', '<rval/>')
+
+    self.assertEqual((200, {'Content-Type': 'text/xml'}, '<rval/>'),
+                     self.server.GetFixture('POST', '/soap', '<Body/>'))
+    self.assertIsNone(self.server.GetFixture('GET', '/soap'))
+
+  def testReplay_notRecorded(self):
+    status, _, _ = self._Open(self.server.url + '/soap', '<Body>get</Body>')
+
+    self.assertEqual(404, status)
+    self.assertEqual([('POST', '/soap')], self.server.missed_requests)
+
+  def testRecord(self):
+    self._Record('/soap', '<Body>get</Body>', '<rval/>')
+    recording_server = googleads.replay.ReplayServer(
+        tempfile.mkdtemp(), upstream=self.server.url).Start()
+    self.addCleanup(recording_server.Stop)
+
+    response = self._Open(recording_server.url + '/soap', '<Body>get</Body>')
+    # The recording is replayed once the upstream server is gone.
+    self.server.Stop()
+    replay_server = googleads.replay.ReplayServer(
+        recording_server._fixture_dir).Start()
+    self.addCleanup(replay_server.Stop)
+    replayed_response = self._Open(replay_server.url + '/soap',
+                                   '<Body>get</Body>')
+
+    self.assertEqual((200, '<rval/>'), (response[0], response[2]))
+    self.assertEqual((200, '<rval/>'),
+                     (replayed_response[0], replayed_response[2]))
+
+  def testSynthesizeReport(self):
+    self.server.report_rows = 2
+    body = urllib.urlencode({
+        '__rdquery': ('SELECT CampaignId, Clicks '
+                      'FROM CAMPAIGN_PERFORMANCE_REPORT'),
+        '__fmt': 'CSV'})
+
+    status, _, report = self._Open(
+        self.server.url + '/api/adwords/reportdownload/v201609', body,
+        {'skipReportHeader': 'true', 'skipReportSummary': 'true'})
+
+    self.assertEqual(200, status)
+    self.assertEqual('CampaignId,Clicks\n0,0\n1,1\n', report)
+
+  def testSynthesizeReport_unsupportedFormat(self):
+    body = urllib.urlencode({
+        '__rdquery': 'SELECT CampaignId FROM CAMPAIGN_PERFORMANCE_REPORT',
+        '__fmt': 'XML'})
+
+    status, _, _ = self._Open(
+        self.server.url + '/api/adwords/reportdownload/v201609', body)
+
+    self.assertEqual(400, status)
+
+  def testUpload(self):
+    upload_url = self.server.GetBatchJobUploadUrl(1)
+
+    status, headers, _ = self._Open(upload_url, '',
+                                    {'x-goog-resumable': 'start'})
+    self.assertEqual(201, status)
+    resumable_url = headers['location']
+    status, _, _ = self._Open(resumable_url, 'abc',
+                              {'Content-Range': 'bytes 0-2/*'}, 'PUT')
+    self.assertEqual(308, status)
+    status, _, _ = self._Open(resumable_url, 'de',
+                              {'Content-Range': 'bytes 3-4/5'}, 'PUT')
+    self.assertEqual(200, status)
+
+    self.assertEqual({'/batchjob/upload/1': 'abcde'}, self.server.uploads)
+
+  def testErrorInjection(self):
+    self._Record('/soap', '<Body>get</Body>', '<rval/>')
+    self.server.error_rate = 1
+
+    status, _, body = self._Open(self.server.url + '/soap', '<Body>get</Body>')
+
+    self.assertEqual(500, status)
+    self.assertIn('Injected error.', body)
+
+  def testGetFixtureKey_text(self):
+    self.assertEqual(
+        googleads.replay._GetFixtureKey('POST', '/soap',
+                                        u'<Body>\u5e7f\u544a</Body>'),
+        googleads.replay._GetFixtureKey(
+            'POST', '/soap', u'<Body>\u5e7f\u544a</Body>'.encode('utf-8')))
+
+
+if __name__ == '__main__':
+  unittest.main()